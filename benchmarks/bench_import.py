@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Measure the time to import the stage modules in a fresh
+interpreter, and which of the heavy backends get imported with
+them. Fails, if the import takes longer than --max-seconds, so it
+can be used as a check of the startup time:
+
+    python -m benchmarks.bench_import --max-seconds 0.5
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+STAGE_MODULES = [
+    'brewPipe.brewPipe',
+    'brewPipe.registry',
+    'brewPipe.data.winton',
+    'brewPipe.data.morse',
+    'brewPipe.preprocess.numpy_null',
+    'brewPipe.models.numpy_leastsquares',
+    'brewPipe.models.numpy_mean_variance',
+    'brewPipe.models.tf_leastsquares',
+    'brewPipe.models.tf_lstm_intraday',
+    'brewPipe.output.winton',
+]
+
+# imported on first use only
+HEAVY_MODULES = ['tensorflow', 'pandas', 'scipy', 'tables']
+
+_child = """
+import json, sys, time
+start = time.time()
+for m in %r:
+    __import__(m)
+print json.dumps({'seconds': time.time() - start,
+                  'loaded': [m for m in %r if m in sys.modules]})
+"""
+
+
+def measure_import(modules=STAGE_MODULES, heavy=HEAVY_MODULES):
+    """
+    Import `modules` in a new interpreter.
+    :return: dictionary with the import time in seconds and the
+        list of the `heavy` modules, that were loaded by it.
+    """
+    out = subprocess.check_output([sys.executable, '-c',
+                                   _child % (list(modules), list(heavy))])
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=None,
+                        help="fail, if the best import time is slower")
+    parser.add_argument('modules', nargs='*', default=STAGE_MODULES)
+    args = parser.parse_args()
+
+    results = [measure_import(args.modules) for _ in xrange(args.repeat)]
+    best = min(r['seconds'] for r in results)
+    loaded = sorted(set(m for r in results for m in r['loaded']))
+    print "import of %i modules: best %.3fs, mean %.3fs" % (
+        len(args.modules), best,
+        sum(r['seconds'] for r in results) / len(results))
+    print "heavy modules loaded: %s" % (', '.join(loaded) or 'none')
+    if args.max_seconds is not None and best > args.max_seconds:
+        print "slower than %.3fs" % args.max_seconds
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
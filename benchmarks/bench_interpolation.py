@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compare the vectorized row interpolation against the former
+per-row `np.apply_along_axis` implementation of WintonStockData
+on random data of the shape of the intraday returns.
+
+    python -m benchmarks.bench_interpolation --rows 40000
+"""
+
+import argparse
+import time
+import numpy as np
+from brewPipe.preprocess.interpolation import interpolate_rows
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def legacy_linear_interpolator(data):
+    def _1d_linear_interpolate(line):
+        nans, posfunc = np.isnan(line), lambda x: x.nonzero()[0]
+        line[nans] = np.interp(posfunc(nans), posfunc(~nans), line[~nans])
+        return line
+    return np.apply_along_axis(_1d_linear_interpolate, 1, data)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=40000)
+    parser.add_argument('--cols', type=int, default=119)
+    parser.add_argument('--nan-fraction', type=float, default=0.02)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    data = rng.normal(size=(args.rows, args.cols))
+    data[rng.uniform(size=data.shape) < args.nan_fraction] = np.nan
+    # the legacy implementation fails on rows without any value
+    data[:, 0] = 0.0
+
+    start = time.time()
+    expected = legacy_linear_interpolator(data.copy())
+    legacy = time.time() - start
+    start = time.time()
+    result = interpolate_rows(data)
+    vectorized = time.time() - start
+
+    print "legacy:     %8.3f s" % legacy
+    print "vectorized: %8.3f s (%.1fx)" % (vectorized, legacy / vectorized)
+    print "max. abs. difference: %g" % np.max(np.abs(result - expected))
+
+
+if __name__ == '__main__':
+    main()
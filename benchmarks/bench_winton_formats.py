@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compare the intermediate formats of WintonStockData. For every
+format the cold load (parsing the csv and persisting it), the
+warm load of a single accessor from the persisted intermediate
+and the size on the disk are measured.
+
+    python -m benchmarks.bench_winton_formats --rows 40000
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from brewPipe.data.winton import WintonStockData
+from benchmarks.synthetic import make_winton_csv
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def _time(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+def bench_format(intermediate_format, data_directory, workdir):
+    intermediates = os.path.join(workdir, intermediate_format)
+
+    def load():
+        data = WintonStockData(data_directory=data_directory,
+                               intermediate_directory=intermediates,
+                               data_source='train',
+                               intermediate_format=intermediate_format)
+        return data.intraday_120_180().data
+
+    cold = _time(load)
+    warm = _time(load)
+    objects = os.path.join(intermediates, 'objects')
+    size = sum(os.path.getsize(os.path.join(objects, f))
+               for f in os.listdir(objects))
+    return cold, warm, size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=40000)
+    parser.add_argument('--formats', nargs='+',
+                        default=['hdf5', 'hdf5_blosc', 'npy'])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        data_directory = os.path.join(workdir, 'data')
+        make_winton_csv(os.path.join(data_directory, 'train.csv'), args.rows)
+        print "%-12s %10s %10s %12s" % ('format', 'cold [s]', 'warm [s]', 'size [MB]')
+        for f in args.formats:
+            cold, warm, size = bench_format(f, data_directory, workdir)
+            print "%-12s %10.3f %10.3f %12.1f" % (f, cold, warm, size / 1e6)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compare the block writer of WintonStockDataOutput against the
+former per-value print loop on random predictions of the size
+of a submission.
+
+    python -m benchmarks.bench_winton_output --rows 120000
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from brewPipe.data import BrewPipeDataFrame
+from brewPipe.output.winton import WintonStockDataOutput
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def legacy_write(filename, data):
+    with open(filename, 'w') as f:
+        print >>f, "Id,Predicted"
+        for i in xrange(data.shape[0]):
+            for j in xrange(data.shape[1]):
+                print >>f, "%i_%i,%f" % (i+1, j+1, data[i,j])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=120000)
+    parser.add_argument('--cols', type=int, default=62)
+    args = parser.parse_args()
+
+    data = np.random.RandomState(0).normal(size=(args.rows, args.cols))
+    frame = BrewPipeDataFrame('predictions')
+    frame.data = data
+    workdir = tempfile.mkdtemp()
+    try:
+        legacy_file = os.path.join(workdir, 'legacy.csv')
+        start = time.time()
+        legacy_write(legacy_file, data)
+        legacy = time.time() - start
+        print "legacy:     %8.3f s" % legacy
+
+        for name in ['submission.csv', 'submission.csv.gz']:
+            filename = os.path.join(workdir, name)
+            out = WintonStockDataOutput(filename)
+            out.set_data(frame)
+            start = time.time()
+            out.write()
+            elapsed = time.time() - start
+            print "%-11s %8.3f s (%.1fx), %.1f MB" % (
+                name.split('.', 1)[1] + ':', elapsed, legacy / elapsed,
+                os.path.getsize(filename) / 1e6)
+        with open(legacy_file) as a, \
+                open(os.path.join(workdir, 'submission.csv')) as b:
+            print "identical output:", a.read() == b.read()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
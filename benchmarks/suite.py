@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark suite of a whole pipeline run on synthetic data with the
+schemas of the winton and morse challenge data. Every benchmark runs
+in its own (forked) process, so warm runs only profit from what is
+persisted on the disk, and the peak memory of one benchmark does
+not hide the one of the next. The results are written as JSON and
+can be compared with an earlier run:
+
+    python -m benchmarks.suite --rows 40000 --output results.json
+    python -m benchmarks.suite --rows 40000 --compare results.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import Queue
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+import numpy as np
+from brewPipe.data import BrewPipeDataFrame
+from brewPipe.data.morse import MorseData
+from brewPipe.data.winton import WintonStockData
+from brewPipe.dtypes import DtypePolicy, set_dtype_policy, memory_usage
+from brewPipe.lazy import module_available
+from brewPipe.models.numpy_leastsquares import NumpyLeastSquares
+from brewPipe.models.tf_leastsquares import TensorflowLeastSquares
+from brewPipe.output.winton import WintonStockDataOutput
+from brewPipe.preprocess.numpy_null import NumpyNullPreprocessor
+from brewPipe.trace import io_counters, peak_rss
+from benchmarks.synthetic import make_winton_csv, make_morse_dataset
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+class _Measurement(object):
+    """
+    Context manager measuring the part of a benchmark, that
+    is timed. Everything outside of it is set up.
+    """
+
+    def __init__(self):
+        self.result = {}
+
+    @contextmanager
+    def __call__(self, rows=None):
+        t = os.times()
+        cpu = t[0] + t[1]
+        read, written = io_counters()
+        rss = peak_rss()
+        start = time.time()
+        yield self.result
+        wall = time.time() - start
+        t = os.times()
+        end_read, end_written = io_counters()
+        self.result.update({'wall_time': wall,
+                            'cpu_time': t[0] + t[1] - cpu,
+                            'bytes_read': end_read - read,
+                            'bytes_written': end_written - written,
+                            'peak_rss': peak_rss(),
+                            'peak_rss_delta': peak_rss() - rss})
+        if rows is not None:
+            self.result['rows'] = rows
+            self.result['rows_per_second'] = rows / max(wall, 1e-9)
+
+
+def _winton(config, data_source='train', intermediates=None):
+    return WintonStockData(data_directory=config['winton_directory'],
+                           intermediate_directory=intermediates or
+                           config['intermediates'],
+                           data_source=data_source,
+                           intermediate_format=config['format'])
+
+
+def _preprocessed(config, data_source='train'):
+    winton = _winton(config, data_source)
+    preproc = NumpyNullPreprocessor(config['intermediates'], mmap_mode='r')
+    x = preproc.preprocess(winton.intraday_2_120())
+    if data_source == 'test':
+        return x, None
+    return x, preproc.preprocess(winton.intraday_120_180())
+
+
+def bench_winton_cold_load(config, measure):
+    # an empty store, so the csv file is parsed
+    intermediates = os.path.join(config['workdir'], 'cold')
+    if os.path.isdir(intermediates):
+        shutil.rmtree(intermediates)
+    winton = _winton(config, intermediates=intermediates)
+    with measure(rows=config['rows']):
+        winton.intraday_120_180().data
+
+
+def bench_winton_warm_load(config, measure):
+    # persist the data with another instance, so the measured one
+    # loads it from the store
+    _winton(config).intraday_120_180().data
+    winton = _winton(config)
+    with measure(rows=config['rows']):
+        winton.intraday_120_180().data
+
+
+def bench_winton_preprocess(config, measure):
+    # a new directory, so the preprocessed data is not cached yet
+    preproc = NumpyNullPreprocessor(os.path.join(config['workdir'],
+                                                 'preprocess'))
+    x = _winton(config).intraday_2_120()
+    with measure(rows=config['rows']):
+        preproc.preprocess(x).data
+
+
+def bench_frame_memory(config, measure):
+    winton = _winton(config)
+    preproc = NumpyNullPreprocessor(config['intermediates'], mmap_mode='r')
+    frames = [winton.features(), preproc.preprocess(winton.intraday_2_120()),
+              preproc.preprocess(winton.intraday_120_180()),
+              winton.returns_next_days(), winton.weights()]
+    with measure(rows=config['rows']):
+        usage = memory_usage(frames)
+    return {'frame_nbytes': usage['nbytes'],
+            'float64_nbytes': usage['float64_nbytes'],
+            'saved_nbytes': usage['saved']}
+
+
+def bench_train_numpy_leastsquares(config, measure):
+    x, y = _preprocessed(config)
+    x.data, y.data
+    lsq = NumpyLeastSquares(x.shape[1], y.shape[1],
+                            intermediate_directory=os.path.join(
+                                config['workdir'], 'parameters'))
+    lsq.set_data(x, y)
+    with measure(rows=config['rows']):
+        lsq.run()
+
+
+def bench_train_tf_leastsquares(config, measure):
+    if not module_available('tensorflow'):
+        return {'skipped': 'tensorflow is not installed'}
+    x, y = _preprocessed(config)
+    lsq = TensorflowLeastSquares(x.shape[1], y.shape[1], learn_rate=0.1,
+                                 batch_size=1000, checkpoint_interval=None,
+                                 intermediate_directory=os.path.join(
+                                     config['workdir'], 'tf_parameters'))
+    lsq.set_data(x, y)
+    with measure(rows=config['tf_steps'] * 1000):
+        lsq.run(max_steps=config['tf_steps'])
+
+
+def _trained_model(config):
+    x, y = _preprocessed(config)
+    lsq = NumpyLeastSquares(x.shape[1], y.shape[1],
+                            intermediate_directory=os.path.join(
+                                config['workdir'], 'parameters'))
+    lsq.set_data(x, y)
+    lsq.run()
+    return lsq
+
+
+def bench_inference(config, measure):
+    lsq = _trained_model(config)
+    x, _ = _preprocessed(config, 'test')
+    x.data
+    with measure(rows=config['rows']):
+        lsq.apply_model(x, chunk_rows=65536)
+
+
+def bench_output_write(config, measure):
+    lsq = _trained_model(config)
+    x, _ = _preprocessed(config, 'test')
+    y1 = lsq.apply_model(x).data
+    y = BrewPipeDataFrame('winton_output')
+    y.data = np.hstack([y1, np.zeros((y1.shape[0], 2))])
+    out = WintonStockDataOutput(os.path.join(config['workdir'],
+                                             'submission.csv'),
+                                overwrite=True)
+    out.set_data(y)
+    with measure(rows=config['rows']):
+        out.write()
+
+
+def _morse(config):
+    return MorseData(data_directory=config['morse_directory'],
+                     intermediate_directory=config['intermediates'],
+                     n_workers=config['workers'])
+
+
+def bench_morse_cold_load(config, measure):
+    morse = _morse(config)
+    with measure(rows=config['morse_files']):
+        morse.training().data
+
+
+def bench_morse_warm_load(config, measure):
+    morse = _morse(config)
+    with measure(rows=config['morse_files']):
+        clips = morse.training().data
+        # touch every clip
+        sum(len(c) for c in clips)
+
+
+# in the order they are run, later ones use what the former persisted
+BENCHMARKS = [
+    ('winton_cold_load', bench_winton_cold_load),
+    ('winton_warm_load', bench_winton_warm_load),
+    ('winton_preprocess', bench_winton_preprocess),
+    ('frame_memory', bench_frame_memory),
+    ('train_numpy_leastsquares', bench_train_numpy_leastsquares),
+    ('train_tf_leastsquares', bench_train_tf_leastsquares),
+    ('inference', bench_inference),
+    ('output_write', bench_output_write),
+    ('morse_cold_load', bench_morse_cold_load),
+    ('morse_warm_load', bench_morse_warm_load),
+]
+
+
+def _child(func, config, queue):
+    try:
+        os.chdir(config['workdir'])
+        set_dtype_policy(DtypePolicy(config.get('dtype', 'float32')))
+        measure = _Measurement()
+        extra = func(config, measure) or {}
+        result = dict(measure.result)
+        result.update(extra)
+        queue.put(result)
+    except Exception as e:
+        queue.put({'error': '%s: %s' % (e.__class__.__name__, e)})
+
+
+def run_benchmark(func, config):
+    """
+    Run the benchmark `func` in a new process.
+    :return: dictionary of the measurements, or with an 'error', if
+        the process died (e.g. killed for running out of memory) or
+        took longer than config['timeout'] seconds.
+    """
+    queue = multiprocessing.Queue()
+    p = multiprocessing.Process(target=_child, args=(func, config, queue))
+    p.start()
+    timeout = config.get('timeout')
+    start = time.time()
+    while True:
+        try:
+            result = queue.get(timeout=1)
+            break
+        except Queue.Empty:
+            pass
+        if not p.is_alive():
+            try:
+                # put right before exiting
+                result = queue.get(timeout=1)
+            except Queue.Empty:
+                result = {'error': 'benchmark process died with exit code %s'
+                                   % p.exitcode}
+            break
+        if timeout is not None and time.time() - start > timeout:
+            p.terminate()
+            result = {'error': 'timed out after %.0fs' % timeout}
+            break
+    p.join()
+    return result
+
+
+def environment():
+    import pandas
+    import scipy
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'pandas': pandas.__version__,
+            'scipy': scipy.__version__,
+            'cpus': multiprocessing.cpu_count()}
+
+
+def run_suite(config, names=None):
+    """
+    Generate the synthetic data and run the benchmarks.
+    :param names: names of the benchmarks to run, all if None.
+        Benchmarks depending on the ones before should be run
+        together with them.
+    :return: list of the results.
+    """
+    make_winton_csv(os.path.join(config['winton_directory'], 'train.csv'),
+                    config['rows'])
+    make_winton_csv(os.path.join(config['winton_directory'], 'test_2.csv'),
+                    config['rows'], test=True, seed=1)
+    make_morse_dataset(config['morse_directory'], config['morse_files'])
+
+    results = []
+    for name, func in BENCHMARKS:
+        if names and name not in names:
+            continue
+        result = run_benchmark(func, config)
+        result['name'] = name
+        results.append(result)
+        _print_result(result)
+    return results
+
+
+def _print_result(result, reference=None):
+    if 'wall_time' not in result:
+        print "%-26s %s" % (result['name'],
+                            result.get('error') or result.get('skipped'))
+        return
+    line = "%-26s %9.3fs %9.3fs %9.1fMB %9.1fMB" % (
+        result['name'], result['wall_time'], result['cpu_time'],
+        result['peak_rss_delta'] / 1e6,
+        (result['bytes_read'] + result['bytes_written']) / 1e6)
+    if 'frame_nbytes' in result:
+        line += " frames %.1fMB (%.1fMB as float64)" % (
+            result['frame_nbytes'] / 1e6, result['float64_nbytes'] / 1e6)
+    if reference is not None and reference.get('wall_time'):
+        line += " %7.2fx" % (reference['wall_time'] / max(result['wall_time'],
+                                                          1e-9))
+    print line
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=40000,
+                        help="rows of the synthetic winton train and test data")
+    parser.add_argument('--morse-files', type=int, default=50)
+    parser.add_argument('--format', default='npy',
+                        help="intermediate format of the winton data")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="workers decoding the morse data")
+    parser.add_argument('--tf-steps', type=int, default=1000)
+    parser.add_argument('--dtype', default='float32',
+                        help="floating point dtype of the pipeline")
+    parser.add_argument('--timeout', type=float, default=None,
+                        help="seconds after which a benchmark is stopped")
+    parser.add_argument('--only', nargs='+', metavar='BENCHMARK',
+                        help="run only these benchmarks")
+    parser.add_argument('--output', help="write the results as JSON")
+    parser.add_argument('--compare', metavar='JSON',
+                        help="print the speedup against an earlier run")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    config = {'rows': args.rows,
+              'morse_files': args.morse_files,
+              'format': args.format,
+              'workers': args.workers,
+              'tf_steps': args.tf_steps,
+              'dtype': args.dtype,
+              'timeout': args.timeout,
+              'workdir': workdir,
+              'winton_directory': os.path.join(workdir, 'data', 'winton'),
+              'morse_directory': os.path.join(workdir, 'data', 'morse'),
+              'intermediates': os.path.join(workdir, 'intermediates')}
+    print "%-26s %10s %10s %11s %11s" % ('benchmark', 'wall', 'cpu',
+                                         'peak rss', 'i/o')
+    try:
+        results = run_suite(config, args.only)
+    finally:
+        shutil.rmtree(workdir)
+
+    run = {'config': dict((k, v) for k, v in config.items()
+                          if not k.endswith('directory') and
+                          k not in ('workdir', 'intermediates')),
+           'environment': environment(),
+           'time': time.time(),
+           'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            reference = dict((r['name'], r) for r in json.load(f)['results'])
+        print
+        print "speedup against %s" % args.compare
+        for result in results:
+            _print_result(result, reference.get(result['name']))
+    return 0 if all('error' not in r for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import numpy as np
+import pandas as pd
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def winton_columns(test=False):
+    """
+    :return: the column names of the winton train.csv, or of
+        test_2.csv if `test` is set.
+    """
+    columns = ['Id']
+    columns += ['Feature_%i' % i for i in xrange(1, 26)]
+    columns += ['Ret_MinusTwo', 'Ret_MinusOne']
+    last_minute = 120 if test else 180
+    columns += ['Ret_%i' % i for i in xrange(2, last_minute + 1)]
+    if not test:
+        columns += ['Ret_PlusOne', 'Ret_PlusTwo',
+                    'Weight_Intraday', 'Weight_Daily']
+    return columns
+
+
+def make_winton_csv(filename, n_rows, test=False, nan_fraction=0.02, seed=0):
+    """
+    Write a csv file with the schema of the winton stock market
+    challenge data filled with random numbers. Like in the real
+    data some of the features and intraday returns are missing.
+    :param filename: Path of the csv file to write.
+    :param n_rows: Number of rows.
+    :param test: Write the schema of test_2.csv instead of train.csv.
+    :param nan_fraction: Fraction of missing feature and return values.
+    """
+    rng = np.random.RandomState(seed)
+    columns = winton_columns(test)
+    data = rng.normal(scale=0.01, size=(n_rows, len(columns)))
+    data[:, 0] = np.arange(1, n_rows + 1)
+    # features are on a different scale and some are integral
+    data[:, 1:26] = rng.normal(size=(n_rows, 25))
+    data[:, [5, 7, 13]] = rng.randint(1, 10, size=(n_rows, 3))
+    n_values = len(columns) - 1 if test else len(columns) - 3
+    nans = rng.uniform(size=(n_rows, n_values - 1)) < nan_fraction
+    data[:, 1:n_values][nans] = np.nan
+    if not test:
+        data[:, -2:] = rng.uniform(1e6, 2e6, size=(n_rows, 2))
+    directory = os.path.dirname(filename)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    pd.DataFrame(data, columns=columns).to_csv(filename, index=False,
+                                               float_format='%.8g')
+
+
+def make_morse_dataset(directory, n_files, samplerate=8000, seed=0):
+    """
+    Write a morse challenge like data set: the .wav files
+    `audio_fixed/cwNNN.wav` of random length and the
+    `sampleSubmission.csv` with the ID and Prediction columns.
+    :param directory: The data directory to create.
+    :param n_files: Number of audio files.
+    """
+    from scipy.io import wavfile
+
+    rng = np.random.RandomState(seed)
+    audio_directory = os.path.join(directory, 'audio_fixed')
+    if not os.path.isdir(audio_directory):
+        os.makedirs(audio_directory)
+    for cw_n in xrange(1, n_files + 1):
+        length = rng.randint(samplerate, 4 * samplerate)
+        t = np.arange(length) / float(samplerate)
+        keyed = rng.uniform(size=length // 400 + 1) < 0.5
+        signal = np.sin(2 * np.pi * 600 * t) * np.repeat(keyed, 400)[:length]
+        signal += rng.normal(scale=0.3, size=length)
+        data = (signal / np.abs(signal).max() * 32767 * 0.9).astype(np.int16)
+        wavfile.write(os.path.join(audio_directory, 'cw%03i.wav' % cw_n),
+                      samplerate, data)
+    letters = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 '))
+    pd.DataFrame({'ID': np.arange(1, n_files + 1),
+                  'Prediction': [''.join(rng.choice(letters, 20))
+                                 for _ in xrange(n_files)]}).to_csv(
+        os.path.join(directory, 'sampleSubmission.csv'), index=False)
@@ -1,6 +1,414 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from brewPipe.data import winton
+import cPickle as pickle
+import hashlib
+import multiprocessing
+import Queue
+from multiprocessing.pool import ThreadPool
+import numpy as np
+from .pipelineState import PipelineStateInterface
+from .data import BrewPipeDataFrame
+from .trace import get_tracer
 
 __author__ = 'Martin Kiechle <martin.kiechle@gmail.com>'
+
+
+class Node(object):
+    """
+    A stage of a `Pipeline`. It is returned by `Pipeline.add`
+    and used to refer to the result of the stage as input of
+    other stages.
+    """
+
+    def __init__(self, name, func, args, kwargs, skip_unchanged,
+                 executor='thread', memory=None):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.skip_unchanged = skip_unchanged
+        self.executor = executor
+        self.memory = memory
+
+    @property
+    def inputs(self):
+        """
+        :return: list of the nodes this node depends on.
+        """
+        return [a for a in list(self.args) + self.kwargs.values()
+                if isinstance(a, Node)]
+
+    def __repr__(self):
+        return "Node(%r)" % self.name
+
+
+def _static(value):
+    """
+    :return: a lazy BrewPipeDataFrame replaced by a frame holding
+        its evaluated data, which can be sent to another process.
+    """
+    if isinstance(value, BrewPipeDataFrame) and value.callback is not None:
+        frame = BrewPipeDataFrame(value.name)
+        frame.data = value.data
+        frame.hash = value.hash
+        return frame
+    return value
+
+
+def _call_stage(name, func, args, kwargs, static):
+    """
+    Evaluate a stage in a worker of the pool. Returned frames
+    are evaluated right away, so the work is done in parallel.
+    """
+    try:
+        with get_tracer().span(name, 'pipeline'):
+            result = func(*args, **kwargs)
+            if isinstance(result, BrewPipeDataFrame):
+                result.data
+        if static:
+            result = _static(result)
+        return True, result
+    except Exception as e:
+        return False, e
+
+
+def _fingerprint(value):
+    """
+    :return: a string identifying the content of `value` or None,
+        if it can not be identified, e.g. a frame without a hash or
+        an arbitrary object. Arrays are hashed by their content.
+    """
+    if isinstance(value, BrewPipeDataFrame):
+        return str(value.hash) if value.hash else None
+    if isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            return None
+        h = hashlib.sha1()
+        h.update(repr((value.dtype.str, value.shape)))
+        h.update(np.ascontiguousarray(value).data)
+        return h.hexdigest()
+    if value is None or isinstance(value, (bool, int, long, float, basestring)):
+        return repr(value)
+    if isinstance(value, (tuple, list)):
+        items = [_fingerprint(v) for v in value]
+    elif isinstance(value, dict):
+        items = [(_fingerprint(k), _fingerprint(v))
+                 for k, v in sorted(value.items())]
+        items = [None if None in kv else kv for kv in items]
+    else:
+        return None
+    if None in items:
+        return None
+    return repr((value.__class__.__name__, items))
+
+
+def _func_name(func):
+    name = getattr(func, '__name__', repr(func))
+    owner = getattr(func, 'im_self', None)
+    if owner is not None:
+        name = str(owner.__class__.__name__) + '.' + name
+    return name
+
+
+class Pipeline(PipelineStateInterface):
+    """
+    A pipeline of data, preprocessing, model and output stages.
+
+    Every stage is a callable, which is registered with `add`
+    together with its arguments. Arguments, which are nodes of
+    other stages, are replaced by their results when the stage
+    is evaluated; this defines the dependency graph. Usually the
+    results are (lazy) BrewPipeDataFrames, e.g.:
+
+        p = Pipeline('winton')
+        x = p.add('x', winton.intraday_2_120)
+        x_pre = p.add('x_pre', preproc.preprocess, x)
+        out = p.add('out', write_submission, x_pre, skip_unchanged=True)
+        p.run(out)
+
+    `run` only evaluates the stages the requested nodes depend on.
+    Every stage gets a hash computed from the hashes of its inputs,
+    where the hash of a stage without stage inputs is the hash of
+    the BrewPipeDataFrame it returns (arrays are hashed by their
+    content). A frame without a hash or any other object, whose
+    content can not be hashed, makes the stage and all stages
+    depending on it count as changed. Stages added with
+    `skip_unchanged=True` record their hash in the pipeline state
+    and are skipped, as long as the hash is unchanged and no other
+    evaluated stage needs their result. Only the arguments given to
+    `add` are part of the hash, not the state of bound objects.
+
+    With more than one worker, stages which do not depend on each
+    other are evaluated concurrently, each in a thread or a process
+    pool, depending on the `executor` of the stage. Threads suit
+    stages spending their time in I/O or NumPy code releasing the
+    GIL; pure Python stages need processes. Stages running in a
+    process get evaluated copies of their input frames and have to
+    be picklable, i.e. functions defined at module level. To not
+    evaluate several large frames at the same time, a new stage is
+    only started while the estimated memory of all running stages
+    stays below `max_memory`. The estimate is the `memory` given to
+    `add` or otherwise the size of the result of the previous run.
+    """
+
+    _executors = ('thread', 'process')
+
+    def __init__(self, name='pipeline', workers=1, max_memory=None):
+        """
+        :param name: Name of the pipeline, used to distinguish
+            the recorded hashes of different pipelines.
+        :param workers: Maximum number of stages evaluated at the
+            same time.
+        :param max_memory: Maximum number of bytes the results of
+            the stages running at the same time may need. A stage
+            is always started, if no other one is running.
+        """
+        super(Pipeline, self).__init__()
+
+        if workers < 1:
+            raise RuntimeError("incorrect number of workers given: %s" % (workers))
+        self._name = name
+        self._workers = workers
+        self._max_memory = max_memory
+        self._nodes = []
+        self._hashes = {}
+        self._results = {}
+        self.skipped = set()
+
+    def add(self, name, func, *args, **kwargs):
+        """
+        Register a stage.
+        :param name: Unique name of the stage.
+        :param func: Callable evaluating the stage.
+        :param args: Positional arguments of `func`. Nodes are
+            replaced by the results of their stages.
+        :param kwargs: Keyword arguments of `func`, handled like
+            `args`. The following keywords are reserved:
+            `skip_unchanged` marks stages, that can be skipped if
+            their inputs did not change since they were last run,
+            `executor` is either 'thread' or 'process' and selects
+            where the stage is run by a parallel pipeline and
+            `memory` is the estimated size of the result in bytes.
+        :return: the `Node` of the stage.
+        """
+        skip_unchanged = kwargs.pop('skip_unchanged', False)
+        executor = kwargs.pop('executor', 'thread')
+        memory = kwargs.pop('memory', None)
+        if any(n.name == name for n in self._nodes):
+            raise RuntimeError("stage '%s' already exists" % name)
+        if executor not in self._executors:
+            raise RuntimeError("incorrect executor given: %s" % (executor))
+        if executor == 'process':
+            # node arguments are checked when they are evaluated
+            try:
+                pickle.dumps((func, [a for a in args if not isinstance(a, Node)],
+                              dict((k, v) for k, v in kwargs.items()
+                                   if not isinstance(v, Node))),
+                             pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                raise RuntimeError("stage '%s' can not be run in a process, "
+                                   "it is not picklable: %s" % (name, e))
+        node = Node(name, func, args, kwargs, skip_unchanged, executor, memory)
+        for n in node.inputs:
+            if n not in self._nodes:
+                raise RuntimeError("input '%s' of stage '%s' is not part of "
+                                   "the pipeline" % (n.name, name))
+        self._nodes.append(node)
+        return node
+
+    def dependencies(self, *targets):
+        """
+        :return: list of all nodes the `targets` depend on,
+            including the targets, in an order, in which they
+            can be evaluated.
+        """
+        order = []
+        visited = set()
+
+        def visit(node):
+            if node.name in visited:
+                return
+            visited.add(node.name)
+            for n in node.inputs:
+                visit(n)
+            order.append(node)
+        for t in targets:
+            visit(t)
+        return order
+
+    def node_hash(self, node):
+        """
+        :return: the hash of the result of `node` or None, if it is
+            not known and the stage has to be treated as changed.
+            Only stages without stage inputs are evaluated to
+            compute it.
+        """
+        if node.name in self._hashes:
+            return self._hashes[node.name]
+
+        def argument_hash(a):
+            return self.node_hash(a) if isinstance(a, Node) else _fingerprint(a)
+        if not node.inputs:
+            h = [_fingerprint(self._evaluate(node))]
+        else:
+            h = [argument_hash(a) for a in node.args] + \
+                [argument_hash(v) for _, v in sorted(node.kwargs.items())]
+        if None in h:
+            h = None
+        else:
+            h = hashlib.sha1(repr((node.name, _func_name(node.func), h,
+                                   sorted(node.kwargs)))).hexdigest()
+        self._hashes[node.name] = h
+        return h
+
+    def _descriptor(self, node):
+        return self._name + '##' + node.name
+
+    def _unchanged(self, node):
+        if not node.skip_unchanged or node.name in self._results:
+            return False
+        h = self.node_hash(node)
+        return h is not None and self.get(self._descriptor(node)) == h
+
+    def _finish(self, node, result):
+        self._results[node.name] = result
+        if node.skip_unchanged:
+            self.put(self._descriptor(node), self.node_hash(node))
+
+    def _evaluate(self, node, required=True):
+        if node.name in self._results:
+            return self._results[node.name]
+        if not required and self._unchanged(node):
+            self.skipped.add(node.name)
+            return None
+
+        def resolve(a):
+            if isinstance(a, Node):
+                return self._evaluate(a)
+            return a
+        args = [resolve(a) for a in node.args]
+        kwargs = dict((k, resolve(v)) for k, v in node.kwargs.items())
+        with get_tracer().span(node.name, 'pipeline'):
+            result = node.func(*args, **kwargs)
+        self._finish(node, result)
+        return result
+
+    def _memory(self, node):
+        if node.memory is not None:
+            return node.memory
+        return self.get(self._descriptor(node) + '##nbytes') or 0
+
+    def _schedule(self, nodes):
+        """
+        Evaluate `nodes`, given in an order in which they can be
+        evaluated, with up to `workers` stages at the same time.
+        """
+        pending = [n for n in nodes if n.name not in self._results]
+        if not pending:
+            return
+        pools = {}
+        workers = {}
+        done = Queue.Queue()
+        running = {}
+        tasks = {}
+
+        def resolve(a, static):
+            if isinstance(a, Node):
+                a = self._results[a.name]
+                return _static(a) if static else a
+            return a
+
+        def submit(node):
+            static = node.executor == 'process'
+            if node.executor not in pools:
+                if static:
+                    pool = multiprocessing.Pool(self._workers)
+                    pools[node.executor] = pool
+                    workers[node.executor] = set(w.pid for w in pool._pool)
+                else:
+                    pools[node.executor] = ThreadPool(self._workers)
+            args = [resolve(a, static) for a in node.args]
+            kwargs = dict((k, resolve(v, static))
+                          for k, v in node.kwargs.items())
+            running[node.name] = self._memory(node)
+            tasks[node.name] = (node, pools[node.executor].apply_async(
+                _call_stage, (node.name, node.func, args, kwargs, static),
+                callback=lambda r: done.put((node, r))))
+
+        def wait():
+            """
+            :return: (node, (ok, result)) of the next finished stage.
+                Raise the error, if a task could not be sent to or
+                from a worker, or a worker process died, as the
+                callback of such a task is never called.
+            """
+            while True:
+                # waiting with a timeout keeps the main thread
+                # responsive to KeyboardInterrupt
+                try:
+                    return done.get(True, 0.1)
+                except Queue.Empty:
+                    pass
+                for node, task in tasks.values():
+                    if task.ready() and not task.successful():
+                        task.get()
+                for executor, pids in workers.items():
+                    # the workers never exit on their own, a dead
+                    # one is replaced by the pool and its task is lost
+                    pool = pools[executor]
+                    if set(w.pid for w in pool._pool) != pids or \
+                            any(w.exitcode is not None for w in pool._pool):
+                        raise RuntimeError(
+                            "a worker process died while running the "
+                            "stages: %s" % ', '.join(sorted(
+                                n.name for n, _ in tasks.values()
+                                if n.executor == executor)))
+
+        try:
+            while pending or running:
+                for node in list(pending):
+                    if len(running) >= self._workers:
+                        break
+                    if any(n.name not in self._results for n in node.inputs):
+                        continue
+                    if running and self._max_memory is not None and \
+                            sum(running.values()) + self._memory(node) > \
+                            self._max_memory:
+                        continue
+                    pending.remove(node)
+                    submit(node)
+                node, (ok, result) = wait()
+                del running[node.name]
+                del tasks[node.name]
+                if not ok:
+                    raise result
+                self._finish(node, result)
+                if isinstance(result, BrewPipeDataFrame) and \
+                        hasattr(result.data, 'nbytes'):
+                    self.put(self._descriptor(node) + '##nbytes',
+                             result.data.nbytes)
+        finally:
+            for pool in pools.values():
+                pool.terminate()
+                pool.join()
+
+    def run(self, *targets):
+        """
+        Evaluate the `targets` and the stages they depend on.
+        :return: list of the results of the targets, None for
+            skipped targets.
+        """
+        self.skipped = set()
+        if self._workers > 1:
+            self._schedule(self.dependencies(
+                *[t for t in targets if not self._unchanged(t)]))
+        return [self._evaluate(t, required=False) for t in targets]
+
+    def reset(self):
+        """
+        Forget the results and hashes of the current process,
+        e.g. after input files changed.
+        """
+        self._hashes = {}
+        self._results = {}
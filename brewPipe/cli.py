@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import datetime
+import sys
+from .pipelineState import ArtifactStore
+from . import registry
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+_size_units = {'': 1, 'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30, 't': 1 << 40}
+
+
+def parse_size(size):
+    """
+    Parse a size given as e.g. '500M' or '10G' into bytes.
+    """
+    size = size.strip().lower().rstrip('b')
+    unit = ''
+    if size and size[-1] in _size_units:
+        unit = size[-1]
+        size = size[:-1]
+    return int(float(size) * _size_units[unit])
+
+
+def format_size(n):
+    for unit in ['B', 'K', 'M', 'G']:
+        if n < 1024:
+            return "%.1f%s" % (n, unit)
+        n /= 1024.0
+    return "%.1fT" % n
+
+
+def _cache_ls(store, args):
+    print "%-40s %10s %-19s %s" % ('key', 'size', 'last used', 'stage')
+    for key, entry in store.entries():
+        atime = datetime.datetime.fromtimestamp(entry['atime'])
+        print "%-40s %10s %-19s %s" % (key, format_size(entry['size']),
+                                      atime.strftime('%Y-%m-%d %H:%M:%S'),
+                                      entry['stage'] or '')
+    print "total: %s" % format_size(store.disk_usage())
+
+
+def _cache_gc(store, args):
+    max_bytes = store.max_bytes
+    if args.max_size is not None:
+        max_bytes = parse_size(args.max_size)
+    before = store.disk_usage()
+    evicted = store.gc(max_bytes)
+    print "evicted %i artifacts, %s -> %s" % (len(evicted), format_size(before),
+                                            format_size(store.disk_usage()))
+
+
+def _cache_limit(store, args):
+    if args.size.lower() == 'none':
+        store.set_max_bytes(None)
+    else:
+        store.set_max_bytes(parse_size(args.size))
+
+
+def _stages(args):
+    for name in registry.stage_names():
+        print "%-24s %s" % (name, registry.stage_path(name))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='brewpipe')
+    commands = parser.add_subparsers()
+
+    cache = commands.add_parser('cache', help='manage the intermediate artifacts')
+    cache.add_argument('-d', '--directory', default='intermediates',
+                       help='the intermediate directory')
+    cache_commands = cache.add_subparsers()
+    ls = cache_commands.add_parser('ls', help='list the stored artifacts')
+    ls.set_defaults(func=_cache_ls)
+    gc = cache_commands.add_parser('gc', help='delete unused files and evict '
+                                              'the least recently used artifacts')
+    gc.add_argument('--max-size', default=None,
+                    help='evict until the store is smaller, e.g. 10G')
+    gc.set_defaults(func=_cache_gc)
+    limit = cache_commands.add_parser('limit', help='set the size limit, which '
+                                                    'is enforced on every write')
+    limit.add_argument('size', help="e.g. 10G or 'none'")
+    limit.set_defaults(func=_cache_limit)
+
+    stages = commands.add_parser('stages', help='list the stages, that can '
+                                                'be referenced by name')
+    stages.set_defaults(func=_stages, directory=None)
+
+    args = parser.parse_args(argv)
+    if args.directory is None:
+        args.func(args)
+    else:
+        args.func(ArtifactStore(args.directory), args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
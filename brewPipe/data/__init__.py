@@ -1,9 +1,30 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import time
+import weakref
+import numpy as np
+from ..trace import get_tracer
+
 __author__ = 'Dominik Meyer <meyerd@mytum.de>'
 
 
+def frame_schema(value, hash=None, columns=None):
+    """
+    :return: dictionary with the shape, dtype, size in bytes and
+        column names of `value`, and the `hash` of the frame it
+        belongs to, or None, if `value` is not array-like.
+    """
+    shape = getattr(value, 'shape', None)
+    if shape is None:
+        return None
+    return {'shape': tuple(shape),
+            'dtype': str(getattr(value, 'dtype', '')),
+            'nbytes': getattr(value, 'nbytes', None),
+            'columns': list(columns) if columns is not None else None,
+            'hash': hash}
+
+
 class BrewPipeDataFrame(object):
     """
     The brewPipeDataFrame class is used to encapsulate
@@ -13,7 +34,8 @@ class BrewPipeDataFrame(object):
     derived classes).
     """
 
-    def __init__(self, name, lazy_frame=False, hash=None, callback=None):
+    def __init__(self, name, lazy_frame=False, hash=None, callback=None,
+                 weak_cache=False, schema=None):
         """
         The class is to be used in the following way:
             - Instantiate the dataframe object with a name
@@ -35,6 +57,14 @@ class BrewPipeDataFrame(object):
             has to accept as the first argument the name of the
             dataframe data, of which the hash then can be looked
             up by the dataclass that is to be encapsulated
+        :param weak_cache: Only keep a weak reference to the
+            result of the callback. The result can then be reclaimed
+            by the garbage collector as soon as no one else uses it
+            and will be re-evaluated on the next access.
+        :param schema: The schema (see `frame_schema`) of the data
+            of a lazy frame, if it is known from an earlier
+            evaluation. It is used by `shape`, `dtype`, `nbytes` and
+            `columns`, as long as it belongs to the current hash.
         """
         self.name = name
         self._static_data = None
@@ -49,11 +79,155 @@ class BrewPipeDataFrame(object):
             self.callback = callback
         self._lazy_frame = lazy_frame
 
+        self._weak_cache = weak_cache
+        self._cached_data = None
+        self._cached_ref = None
+        self._cached_hash = None
+        self._schema = schema
+        self.hits = 0
+        self.misses = 0
+        self.evaluation_time = 0.0
+
+    def _lookup_cache(self):
+        if self._cached_hash is None or self._cached_hash != self.hash:
+            return None
+        if self._cached_data is not None:
+            return self._cached_data
+        if self._cached_ref is not None:
+            return self._cached_ref()
+        return None
+
+    def _store_cache(self, value):
+        self._cached_data = None
+        self._cached_ref = None
+        self._cached_hash = self.hash
+        if value is None:
+            return
+        if not self._weak_cache:
+            self._cached_data = value
+            return
+        try:
+            self._cached_ref = weakref.ref(value)
+        except TypeError:
+            # objects without weak reference support are
+            # kept alive like in the normal mode
+            self._cached_data = value
+
+    def invalidate(self):
+        """
+        Drop the cached result of the callback, so that the
+        next access to the data property evaluates it again.
+        """
+        self._cached_data = None
+        self._cached_ref = None
+        self._cached_hash = None
+
+    def release(self):
+        """
+        Release the strong reference to the cached result. As long
+        as the data is still referenced somewhere else it will be
+        served from the cache, otherwise it is re-evaluated.
+        """
+        if self._cached_data is None:
+            return
+        try:
+            self._cached_ref = weakref.ref(self._cached_data)
+        except TypeError:
+            self._cached_ref = None
+            self._cached_hash = None
+        self._cached_data = None
+
+    @property
+    def stats(self):
+        """
+        :return: dictionary with the cache hits, misses and the
+            accumulated evaluation time of the callback in seconds.
+        """
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evaluation_time': self.evaluation_time}
+
+    @property
+    def schema(self):
+        """
+        :return: the schema (see `frame_schema`) of the data, if it
+            is known without evaluating a lazy frame, else None.
+        """
+        if not self._lazy_frame:
+            return frame_schema(self._static_data, self.hash)
+        if self._schema is not None and self._schema.get('hash') == self.hash:
+            return self._schema
+        value = self._lookup_cache()
+        if value is not None:
+            return frame_schema(value, self.hash)
+        return None
+
+    def _schema_value(self, key):
+        schema = self.schema
+        if schema is None:
+            # unknown, evaluating the frame records it
+            data = self.data
+            schema = self.schema
+            if schema is None:
+                schema = frame_schema(data, self.hash)
+            if schema is None:
+                raise AttributeError("data of frame '%s' has no %s" %
+                                     (self.name, key))
+        return schema[key]
+
+    @property
+    def shape(self):
+        return self._schema_value('shape')
+
+    @property
+    def dtype(self):
+        dtype = self._schema_value('dtype')
+        return np.dtype(dtype) if dtype else None
+
+    @property
+    def nbytes(self):
+        return self._schema_value('nbytes')
+
+    @property
+    def columns(self):
+        """
+        :return: list of the column names or None, if they are not
+            known.
+        """
+        return self._schema_value('columns')
+
+    def iter_chunks(self, chunk_rows):
+        """
+        Iterate over the data in blocks of `chunk_rows` rows. For
+        memory-mapped data only the current block is read from
+        the disk.
+        """
+        data = self.data
+        for start in xrange(0, data.shape[0], chunk_rows):
+            yield data[start:start + chunk_rows]
+
     @property
     def data(self):
         if not self._lazy_frame:
             return self._static_data
-        return self.callback(self.name)
+        value = self._lookup_cache()
+        tracer = get_tracer()
+        if value is not None:
+            self.hits += 1
+            tracer.instant(self.name, 'frame', cache='hit')
+            return value
+        self.misses += 1
+        start = time.time()
+        with tracer.span(self.name, 'frame', cache='miss', hash=str(self.hash)):
+            value = self.callback(self.name)
+        self.evaluation_time += time.time() - start
+        self._store_cache(value)
+        schema = self._schema
+        columns = None
+        if schema is not None and schema.get('hash') == self.hash:
+            columns = schema.get('columns')
+        self._schema = frame_schema(value, self.hash, columns)
+        return value
 
     @data.setter
     def data(self, value):
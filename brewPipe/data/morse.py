@@ -2,23 +2,40 @@
 # -*- coding: utf-8 -*-
 
 import os
-import pandas as pd
+import sys
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
 import numpy as np
-from scipy.io import wavfile
-from ..pipelineState import PipelineStateInterface
-from ..data import BrewPipeDataFrame
+from ..pipelineState import PipelineStateInterface, ArtifactStore, Fingerprinter
+from ..lazy import LazyModule
+from .ragged import RaggedArray
 
 __author__ = 'Dominik Meyer <meyerd@mytum.de>'
 
+# only needed to decode the input files, not to load the intermediates
+pd = LazyModule('pandas')
+wavfile = LazyModule('scipy.io.wavfile')
+
+
+def _read_wav(filename):
+    # module level function, so it can be used by a process pool
+    return wavfile.read(filename)
+
 
 class MorseData(PipelineStateInterface):
     """
-    Load the morse code learning challenge
-    data into pandas dataframe.
+    Load the morse code learning challenge data. The audio
+    clips are persisted packed into a single sample buffer
+    with an offsets array (see `RaggedArray`), which is
+    memory-mapped when loading.
     """
+    # the files the data is persisted in, the packed audio
+    # samples and one array per column of meta data
+    _parts = ('values', 'offsets', 'id', 'prediction', 'samplerate')
     def __init__(self, data_directory=os.path.join("data", "morse"),
                  intermediate_directory="intermediates",
-                 data_source="audio_fixed"):
+                 data_source="audio_fixed", n_workers=1, executor='thread',
+                 silent=True, content_hash=False):
         """
         Initialize the MorseData source.
         :param data_directory: Directory, where train.csv and
@@ -28,6 +45,15 @@ class MorseData(PipelineStateInterface):
             to.
         :param data_source: Can be only 'audio_fixed' for now
             to load .wav files from the 'audio_fixed' directory.
+        :param n_workers: Number of workers decoding the .wav files
+            in parallel on the first load.
+        :param executor: Either 'thread' or 'process' to decode the
+            files in a thread or in a process pool.
+        :param silent: Report the progress of the first load if
+            set to False.
+        :param content_hash: Detect changes of the input files by
+            hashing samples of their content instead of only looking
+            at their size and modification time.
         """
         super(MorseData, self).__init__()
 
@@ -35,105 +61,193 @@ class MorseData(PipelineStateInterface):
         self._intermediate_directory = intermediate_directory
         if not os.path.isdir(self._intermediate_directory):
             os.makedirs(self._intermediate_directory)
+        self._store = ArtifactStore(self._intermediate_directory)
         if not (data_source == 'audio_fixed'):
             raise RuntimeError("incorrect data_source given: %s" % (data_source))
         self._data_source = data_source
-        self._train_df = None
-        self._dfptr = None
+        if executor not in ('thread', 'process'):
+            raise RuntimeError("incorrect executor given: %s" % (executor))
+        self._n_workers = n_workers
+        self._executor = executor
+        self._silent = silent
+        self._content_hash = content_hash
+        self._loaded_key = None
+        self._clips = None
+        self._meta = None
 
-    def _build_df_name(self, name):
-        return "df##" + name
+    def _part_key(self, part):
+        return self.artifact_key({'data_source': self._data_source,
+                                  'part': part},
+                                 [self._input_hash])
+
+    def _check_and_load_df(self):
+        """
+        :return: tuple of the `RaggedArray` of the audio clips and
+            a dictionary of the meta data or None, if nothing is
+            persisted yet.
+        """
+        paths = {}
+        for part in self._parts:
+            paths[part] = self._store.path(self._part_key(part))
+            if paths[part] is None:
+                return None
+        clips = RaggedArray.load(paths['values'], paths['offsets'])
+        meta = dict((part, np.load(paths[part]))
+                    for part in ('id', 'prediction', 'samplerate'))
+        return clips, meta
 
-    def _persist_df(self, dfptr, dfpath):
-        dfptr.to_hdf(dfpath, 'w', complevel=9,
-                     complib='bzip2')
-        return True
+    def _persist_to_store(self, clips, meta):
+        paths = dict((part, self._store.new_path('.npy'))
+                     for part in self._parts)
+        RaggedArray.save_arrays(paths['values'], paths['offsets'], clips)
+        for part, values in meta.items():
+            np.save(paths[part], np.array(values))
+        keys = dict((part, self._part_key(part)) for part in self._parts)
+        for part in self._parts:
+            # committing a part must not evict the ones committed before
+            self._store.commit(keys[part], paths[part],
+                               stage=str(self.__class__.__name__) + '##' +
+                               self._data_source + '##' + part,
+                               keep=keys.values())
 
-    def _load_df(self, dfpath):
+    def _read_wavs(self, filenames):
+        """
+        Decode the .wav files with the configured number of workers.
+        :return: iterator over the (samplerate, data) tuples in the
+            order of `filenames`.
+        """
+        if self._n_workers > 1:
+            pool_class = ThreadPool if self._executor == 'thread' else Pool
+            pool = pool_class(self._n_workers)
+            chunksize = max(1, len(filenames) // (4 * self._n_workers))
+            results = pool.imap(_read_wav, filenames, chunksize)
+        else:
+            pool = None
+            results = (_read_wav(f) for f in filenames)
         try:
-            dfptr = pd.read_hdf(dfpath)
-        except IOError:
-            return None
-        return dfptr
-
-    def _check_and_load_df(self, name):
-        dfpath = self.get(self._build_df_name(name))
-        if not dfpath:
-            if self._data_source == 'audio_fixed':
-                dfpath = os.path.join(self._intermediate_directory, 'audio_fixed.hdf5')
-            else:
-                raise RuntimeError("invalid data source")
-            self.put(self._build_df_name(name), dfpath)
-        return self._load_df(dfpath)
+            for i, result in enumerate(results):
+                if not self._silent and \
+                        ((i + 1) % 100 == 0 or i + 1 == len(filenames)):
+                    print "\rloaded %i/%i audio files" % (i + 1, len(filenames)),
+                    sys.stdout.flush()
+                yield result
+            if not self._silent:
+                print
+        finally:
+            if pool is not None:
+                pool.terminate()
 
     def _load_csv_if_no_df(self):
         """
-        Set self._dfptr to the corresponding dfptr for
-        pandas.DataFrame and load data if there is no
-        persisted data. Otherwise load that.
+        Set self._clips and self._meta to the persisted data
+        and load the data if there is no persisted data.
         """
-        if self._data_source == 'audio_fixed':
-            datapath = os.path.join(self._data_directory, 'audio_fixed')
-            self._dfptr = self._train_df
-        else:
+        if self._data_source != 'audio_fixed':
             raise RuntimeError("invalid data source")
+        key = self._part_key('values')
+        if self._loaded_key == key:
+            return
 
-        self._dfptr = self._check_and_load_df(self._data_source)
-        if self._dfptr is None:
-            #self._dfptr = pd.read_csv(filename, sep=",")
+        loaded = self._check_and_load_df()
+        if loaded is None:
             tmpdfptr = pd.read_csv(os.path.join(self._data_directory, 'sampleSubmission.csv'))
             tmpdfptr = tmpdfptr.fillna('')
-            d = {'id': [],
-                 'prediction': [],
-                 'samplerate': [],
-                 'data': []}
+            clips = []
+            meta = {'id': [],
+                    'prediction': [],
+                    'samplerate': []}
+            files = []
             for f in os.listdir(os.path.join(self._data_directory, 'audio_fixed')):
                 if f.endswith('.wav'):
-                    cw_n = int(f[2:5])
-                    prediction = tmpdfptr['Prediction'][cw_n-1]
-                    id = tmpdfptr['ID'][cw_n-1]
-                    samplerate, data = wavfile.read(os.path.join(self._data_directory,
-                                                                 'audio_fixed', f))
-                    d['id'].append(id)
-                    d['prediction'].append(prediction)
-                    d['samplerate'].append(samplerate)
-                    d['data'].append(data)
-
-            self._dfptr = pd.DataFrame(d)
-            self._persist_df(self._dfptr, self.get(self._build_df_name(self._data_source)))
+                    files.append((int(f[2:5]), f))
+            files.sort()
+            cw_ns = [cw_n for cw_n, _ in files]
+            filenames = [os.path.join(self._data_directory, 'audio_fixed', f)
+                         for _, f in files]
+            for cw_n, (samplerate, data) in zip(cw_ns, self._read_wavs(filenames)):
+                meta['id'].append(tmpdfptr['ID'][cw_n-1])
+                meta['prediction'].append(tmpdfptr['Prediction'][cw_n-1])
+                meta['samplerate'].append(samplerate)
+                clips.append(data)
+
+            self._persist_to_store(clips, meta)
+            del clips
+            loaded = self._check_and_load_df()
+            if loaded is None:
+                raise RuntimeError("the persisted morse data was evicted from "
+                                   "%s right after loading it, the size limit "
+                                   "of the store is probably too small"
+                                   % self._intermediate_directory)
+        self._clips, self._meta = loaded
+        self._loaded_key = key
 
     @property
     def _input_hash(self):
         """
         :return: The hash of the input data. In this case
-            we use the hash of the modification date of the input
-            files to detect if the files have changed and have to
-            be reread.
+            we use the fingerprint of the input files to detect
+            if the files have changed and have to be reread.
         """
-        hstr = ''
-        hash_over = []
-        if self._data_source == 'audio_fixed':
-            for f in os.listdir(os.path.join(self._data_directory, 'audio_fixed')):
-                if f.endswith('.wav'):
-                    hash_over.append(os.path.join(self._data_directory, 'audio_fixed', f))
-            hash_over.append(os.path.join(self._data_directory, 'sampleSubmission.csv'))
-        for ds in hash_over:
-            filename = os.path.join(ds)
-            mtime = os.path.getmtime(filename)
-            hstr += str(mtime)
-        return hash(hstr)
+        return Fingerprinter().fingerprint_directory(
+            os.path.join(self._data_directory, 'audio_fixed'), suffix='.wav',
+            extra_files=[os.path.join(self._data_directory, 'sampleSubmission.csv')],
+            content=self._content_hash)
 
     def training(self):
         """
-        :return: training data
+        :return: training data, a `RaggedArray` of the audio clips
+            ordered by their ID. Single clips, ranges or batches of
+            clips are sliced out of the memory-mapped buffer
+            without copying.
         """
         dataname = 'morse##' + self._data_source + '##training'
         def cb(name):
             obj = self
             obj._load_csv_if_no_df()
-            tmp = np.zeros(0)
-            return tmp
+            return obj._clips
+
+        h = self._input_hash
+        r = self.lazy_frame(dataname, h, cb)
+        return r
+
+    def ids(self):
+        """
+        :return: the IDs of the audio clips
+        """
+        dataname = 'morse##' + self._data_source + '##ids'
+        def cb(name):
+            obj = self
+            obj._load_csv_if_no_df()
+            return obj._meta['id']
+
+        h = self._input_hash
+        r = self.lazy_frame(dataname, h, cb)
+        return r
+
+    def predictions(self):
+        """
+        :return: the predictions of the sample submission
+        """
+        dataname = 'morse##' + self._data_source + '##predictions'
+        def cb(name):
+            obj = self
+            obj._load_csv_if_no_df()
+            return obj._meta['prediction']
+
+        h = self._input_hash
+        r = self.lazy_frame(dataname, h, cb)
+        return r
+
+    def samplerates(self):
+        """
+        :return: the sample rates of the audio clips
+        """
+        dataname = 'morse##' + self._data_source + '##samplerates'
+        def cb(name):
+            obj = self
+            obj._load_csv_if_no_df()
+            return obj._meta['samplerate']
 
         h = self._input_hash
-        r = BrewPipeDataFrame(dataname, lazy_frame=True, hash=h, callback=cb)
+        r = self.lazy_frame(dataname, h, cb)
         return r
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+class RaggedArray(object):
+    """
+    A sequence of 1D arrays of different lengths, which are packed
+    into a single buffer. The i-th array is
+    `values[offsets[i]:offsets[i + 1]]`, so single arrays or ranges
+    of arrays can be sliced out without copying. Both the values
+    and the offsets can be memory-mapped.
+    """
+
+    def __init__(self, values, offsets):
+        """
+        :param values: 1D array of all arrays concatenated.
+        :param offsets: 1D integer array with one more entry than
+            there are arrays, marking the start of every array and
+            the end of the last one.
+        """
+        self.values = values
+        self.offsets = offsets
+
+    @classmethod
+    def from_arrays(cls, arrays, dtype=None):
+        """
+        Pack a list of 1D arrays into a new ragged array.
+        """
+        offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(a) for a in arrays])
+        if dtype is None:
+            dtype = np.result_type(*arrays) if arrays else np.float64
+        values = np.empty(offsets[-1], dtype=dtype)
+        cls._fill(values, offsets, arrays)
+        return cls(values, offsets)
+
+    @staticmethod
+    def _fill(values, offsets, arrays):
+        for i, a in enumerate(arrays):
+            values[offsets[i]:offsets[i + 1]] = a
+
+    @classmethod
+    def save_arrays(cls, values_file, offsets_file, arrays, dtype=None):
+        """
+        Write a list of 1D arrays to .npy files in the packed
+        layout, without building the packed buffer in memory.
+        """
+        offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(a) for a in arrays])
+        if dtype is None:
+            dtype = np.result_type(*arrays) if arrays else np.float64
+        values = np.lib.format.open_memmap(values_file, mode='w+',
+                                           dtype=dtype, shape=(offsets[-1],))
+        cls._fill(values, offsets, arrays)
+        values.flush()
+        del values
+        np.save(offsets_file, offsets)
+
+    @classmethod
+    def load(cls, values_file, offsets_file, mmap_mode='r'):
+        return cls(np.load(values_file, mmap_mode=mmap_mode),
+                   np.load(offsets_file))
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    @property
+    def shape(self):
+        return (len(self),)
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.offsets.nbytes
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def __getitem__(self, item):
+        """
+        An integer returns a view of a single array, a slice with
+        step 1 a `RaggedArray` sharing the buffer and a list of
+        indices a list of views.
+        """
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                return [self[i] for i in xrange(start, stop, step)]
+            return RaggedArray(self.values,
+                               self.offsets[start:max(start, stop) + 1])
+        if isinstance(item, (list, tuple, np.ndarray)):
+            return [self[i] for i in item]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("index %i out of range" % item)
+        return self.values[self.offsets[item]:self.offsets[item + 1]]
+
+    def padded(self, indices=None, fill_value=0):
+        """
+        :return: the arrays `indices` (all by default) as a matrix
+            with one row per array, padded with `fill_value` to
+            the length of the longest array.
+        """
+        arrays = list(self) if indices is None else self[indices]
+        length = max([len(a) for a in arrays] or [0])
+        out = np.empty((len(arrays), length), dtype=self.values.dtype)
+        out.fill(fill_value)
+        for i, a in enumerate(arrays):
+            out[i, :len(a)] = a
+        return out
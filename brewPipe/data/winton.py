@@ -2,22 +2,66 @@
 # -*- coding: utf-8 -*-
 
 import os
-import pandas as pd
+import threading
 import numpy as np
-from ..pipelineState import PipelineStateInterface
-from ..data import BrewPipeDataFrame
+from ..pipelineState import PipelineStateInterface, ArtifactStore, Fingerprinter
+from ..preprocess.interpolation import interpolate_rows
+from ..lazy import LazyModule
+from ..dtypes import get_dtype_policy, dtype_hash
 
 __author__ = 'Dominik Meyer <meyerd@mytum.de>'
 
+# pandas and PyTables are only needed to parse the csv files and
+# for the hdf5 formats
+pd = LazyModule('pandas')
+
 
 class WintonStockData(PipelineStateInterface):
     """
     Load the winton stock market challenge data
     into the pandas dataframe.
     """
+    # file suffix and pandas.to_hdf arguments of the
+    # supported intermediate formats
+    _formats = {
+        'npy': ('.npy', None),
+        'hdf5': ('.hdf5', {'complevel': 9, 'complib': 'bzip2'}),
+        'hdf5_blosc': ('.hdf5', {'complevel': 5, 'complib': 'blosc'}),
+    }
+    # column ranges and dtypes of the column groups of the csv
+    # files, None is the floating point dtype of the block
+    _column_groups = [
+        ('id', 0, 1, np.int64),
+        ('features', 1, 26, None),
+        ('returns_last_days', 26, 28, None),
+        ('intraday_2_120', 28, 147, None),
+        ('intraday_120_180', 147, 207, None),
+        ('returns_next_days', 207, 209, None),
+        ('weights', 209, 211, None),
+    ]
+
+    # column ranges of the accessors
+    _group_ranges = {
+        'features': (1, 26),
+        'returns_last_days': (26, 27),
+        'intraday_2_120': (28, 147),
+        'intraday_120_180': (147, 207),
+        'returns_next_days': (207, 209),
+        'weights': (209, 210),
+    }
+    # transformations of the accessors, which return copies
+    _transforms = {
+        'features': np.nan_to_num,
+        # linearly interpolate missing time-series data
+        'intraday_2_120': interpolate_rows,
+    }
+    # column groups only available in the training data
+    _train_only = ('intraday_120_180', 'returns_next_days', 'weights')
+
     def __init__(self, data_directory=os.path.join("data", "winton"),
                  intermediate_directory="intermediates",
-                 data_source="train"):
+                 data_source="train", intermediate_format="npy",
+                 chunksize=None, content_hash=False):
         """
         Initialize the WintonStockData source.
         :param data_directory: Directory, where train.csv and
@@ -27,6 +71,24 @@ class WintonStockData(PipelineStateInterface):
             to.
         :param data_source: Can be either 'train' or
             'test' to load from either train.csv or test.csv.
+        :param intermediate_format: Format of the persisted data.
+            'npy' stores all columns as one column-major float
+            matrix, which is memory-mapped, so every accessor only
+            reads its own columns from the disk. 'hdf5' is the bzip2
+            compressed pandas HDF5 format (small, but slow) and
+            'hdf5_blosc' a much faster to decompress HDF5 variant.
+        :param chunksize: If given, the csv file is parsed in chunks
+            of that many rows, which are written to the intermediate
+            file right away (only for the 'npy' format). This bounds
+            the memory needed while loading.
+        :param content_hash: Detect changes of the input files by
+            hashing samples of their content instead of only looking
+            at their size and modification time.
+
+        The data is parsed, persisted and handed out in the dtypes
+        of the dtype policy (see `brewPipe.dtypes`) of the frames
+        of the accessors, e.g. 'winton##train##weights'. The
+        columns are kept in one block of the widest of them.
         """
         super(WintonStockData, self).__init__()
 
@@ -34,55 +96,325 @@ class WintonStockData(PipelineStateInterface):
         self._intermediate_directory = intermediate_directory
         if not os.path.isdir(self._intermediate_directory):
             os.makedirs(self._intermediate_directory)
+        self._store = ArtifactStore(self._intermediate_directory)
         if not (data_source == 'train' or data_source == 'test'):
             raise RuntimeError("incorrect data_source given: %s" % (data_source))
         self._data_source = data_source
-        self._train_df = None
-        self._test_df = None
+        if intermediate_format not in self._formats:
+            raise RuntimeError("incorrect intermediate_format given: %s" %
+                               (intermediate_format))
+        self._intermediate_format = intermediate_format
+        self._chunksize = chunksize
+        self._content_hash = content_hash
+        self._loaded_key = None
         self._dfptr = None
+        self._header_cache = None
+        # accessors of one source may be evaluated concurrently
+        # by a parallel pipeline
+        self._load_lock = threading.RLock()
+
+    def _dtype(self, *groups):
+        """
+        :return: the dtype of the column `groups` according to the
+            dtype policy, all groups if none are given.
+        """
+        policy = get_dtype_policy()
+        prefix = 'winton##' + self._data_source + '##'
+        return np.result_type(*[policy.dtype(prefix + group)
+                                for group in groups or self._group_ranges])
 
-    def _build_df_name(self, name):
-        return "df##" + name
+    def _frame_hash(self, *groups):
+        return dtype_hash(self._input_hash, self._dtype(*groups))
 
     def _persist_df(self, dfptr, dfpath):
-        dfptr.to_hdf(dfpath, 'w', complevel=9,
-                     complib='bzip2')
+        with self.trace('persist', format=self._intermediate_format):
+            if self._intermediate_format == 'npy':
+                np.save(dfpath, np.asfortranarray(dfptr.values,
+                                                  dtype=self._dtype()))
+            else:
+                dfptr.to_hdf(dfpath, 'w',
+                             **self._formats[self._intermediate_format][1])
         return True
 
     def _load_df(self, dfpath):
         try:
-            dfptr = pd.read_hdf(dfpath)
+            with self.trace('load', format=self._intermediate_format):
+                if self._intermediate_format == 'npy':
+                    return np.load(dfpath, mmap_mode='r')
+                dfptr = pd.read_hdf(dfpath)
         except IOError:
             return None
         return dfptr
 
-    def _check_and_load_df(self, name):
-        dfpath = self.get(self._build_df_name(name))
+    def _df_key(self):
+        return self.artifact_key({'data_source': self._data_source,
+                                  'format': self._intermediate_format,
+                                  'dtype': self._dtype().str},
+                                 [self._input_hash])
+
+    def _check_and_load_df(self):
+        dfpath = self._store.path(self._df_key())
         if not dfpath:
-            if self._data_source == 'train':
-                dfpath = os.path.join(self._intermediate_directory, 'winton_train.hdf5')
-            else:
-                dfpath = os.path.join(self._intermediate_directory, 'winton_test.hdf5')
-            self.put(self._build_df_name(name), dfpath)
+            return None
         return self._load_df(dfpath)
 
+    def _persist_df_to_store(self, dfptr):
+        dfpath = self._store.new_path(self._formats[self._intermediate_format][0])
+        self._persist_df(dfptr, dfpath)
+        return self._store.commit(self._df_key(), dfpath,
+                                  stage=str(self.__class__.__name__) +
+                                  '##' + self._data_source)
+
+    def _csv_filename(self):
+        if self._data_source == 'train':
+            return os.path.join(self._data_directory, 'train.csv')
+        return os.path.join(self._data_directory, 'test_2.csv')
+
+    def _header(self):
+        """
+        :return: list of the column names of the csv file.
+        """
+        key = self._input_hash
+        if self._header_cache is None or self._header_cache[0] != key:
+            with open(self._csv_filename(), 'rb') as f:
+                header = f.readline().strip().split(',')
+            self._header_cache = (key, [c.strip('"') for c in header])
+        return self._header_cache[1]
+
+    def _csv_dtypes(self, filename):
+        """
+        :return: dictionary of the dtype of every column, so pandas
+            does not have to infer them.
+        """
+        header = self._header()
+        dtypes = {}
+        for _, start, stop, dtype in self._column_groups:
+            for column in header[start:stop]:
+                dtypes[column] = dtype or self._dtype()
+        return dtypes
+
+    @staticmethod
+    def _count_rows(filename):
+        n_lines = 0
+        last = '\n'
+        with open(filename, 'rb') as f:
+            while True:
+                buf = f.read(1 << 20)
+                if not buf:
+                    break
+                n_lines += buf.count('\n')
+                last = buf[-1]
+        if last != '\n':
+            n_lines += 1
+        # the header line
+        return n_lines - 1
+
+    def _iter_csv(self, chunksize):
+        """
+        Parse the csv file chunk by chunk, persist it and yield
+        every chunk as numpy matrix as soon as it is parsed. For
+        the 'npy' format the chunks are written to the memory-mapped
+        intermediate file directly, otherwise they are collected
+        and persisted in the end. If the generator is not run to
+        the end, nothing is persisted.
+        """
+        filename = self._csv_filename()
+        dtypes = self._csv_dtypes(filename)
+        reader = pd.read_csv(filename, sep=",", dtype=dtypes,
+                             chunksize=chunksize)
+        if self._intermediate_format != 'npy':
+            chunks = []
+            for chunk in reader:
+                chunks.append(chunk)
+                # in the dtype of the persisted block, as on later runs
+                yield chunk.values.astype(self._dtype())
+            self._persist_df_to_store(pd.concat(chunks, ignore_index=True))
+            return
+
+        dfpath = self._store.new_path('.npy')
+        block = np.lib.format.open_memmap(dfpath, mode='w+', dtype=self._dtype(),
+                                          shape=(self._count_rows(filename),
+                                                 len(dtypes)),
+                                          fortran_order=True)
+        try:
+            row = 0
+            overflow = None
+            for chunk in reader:
+                values = chunk.values.astype(block.dtype)
+                if overflow is None and row + len(values) > block.shape[0]:
+                    # more rows than lines were counted
+                    overflow = [np.array(block[:row])]
+                if overflow is None:
+                    block[row:row + len(values)] = values
+                else:
+                    overflow.append(values)
+                row += len(values)
+                yield values
+            if row != block.shape[0]:
+                # the line count did not match the parsed rows (e.g.
+                # blank lines, quoted newlines or a file changed while
+                # parsing), persist the parsed rows instead of the
+                # partially filled block
+                if overflow is None:
+                    overflow = [np.array(block[:row])]
+                del block
+                os.remove(dfpath)
+                dfpath = self._store.new_path('.npy')
+                with self.trace('persist', format=self._intermediate_format):
+                    np.save(dfpath, np.asfortranarray(np.vstack(overflow)))
+            else:
+                block.flush()
+                del block
+            self._store.commit(self._df_key(), dfpath,
+                               stage=str(self.__class__.__name__) +
+                               '##' + self._data_source)
+        finally:
+            if os.path.exists(dfpath):
+                os.remove(dfpath)
+
     def _load_csv_if_no_df(self):
         """
-        Set self._dfptr to the corresponding dfptr for
-        pandas.DataFrame and load data if there is no
-        persisted data. Otherwise load that.
+        Set self._dfptr to the column-major float matrix of
+        all columns and load data if there is no persisted
+        data. Otherwise load that. For the 'npy' format it is
+        memory-mapped.
         """
-        if self._data_source == 'train':
-            filename = os.path.join(self._data_directory, 'train.csv')
-            self._dfptr = self._train_df
-        else:
-            filename = os.path.join(self._data_directory, 'test_2.csv')
-            self._dfptr = self._test_df
+        key = self._df_key()
+        if self._loaded_key == key:
+            return
+
+        with self._load_lock:
+            if self._loaded_key == key:
+                return
+            dfptr = self._check_and_load_df()
+            if dfptr is None:
+                if self._chunksize:
+                    for _ in self._iter_csv(self._chunksize):
+                        pass
+                    dfptr = self._check_and_load_df()
+                else:
+                    filename = self._csv_filename()
+                    with self.trace('read_csv'):
+                        dfptr = pd.read_csv(filename, sep=",",
+                                            dtype=self._csv_dtypes(filename))
+                    dfpath = self._persist_df_to_store(dfptr)
+                    if self._intermediate_format == 'npy':
+                        dfptr = self._load_df(dfpath)
+            if not isinstance(dfptr, np.ndarray):
+                # one column-major block, so the column groups
+                # can be handed out as contiguous views
+                dfptr = np.asfortranarray(dfptr.values, dtype=self._dtype())
+            self._dfptr = dfptr
+            self._loaded_key = key
+
+    def iter_rows(self, chunksize=10000):
+        """
+        Generator over blocks of `chunksize` rows of the input data,
+        each a numpy matrix with all columns at the same positions
+        as in the csv file. If the data has not been persisted yet,
+        the csv file is parsed chunk by chunk and every block is
+        handed out right after it is parsed, so processing can start
+        before the whole file is loaded. Other loads of this source
+        wait until the generator is finished.
+        """
+        key = self._df_key()
+        if self._loaded_key != key:
+            with self._load_lock:
+                if self._loaded_key != key and self._store.path(key) is None:
+                    for block in self._iter_csv(chunksize):
+                        yield block
+                    return
+        self._load_csv_if_no_df()
+        data = self._dfptr
+        for start in xrange(0, data.shape[0], chunksize):
+            yield data[start:start + chunksize]
+
+    def _columns(self, start, stop, dtype=None):
+        """
+        :return: the columns `start` up to (excluding) `stop` of
+            the input data as numpy matrix. This is a (read-only
+            for the 'npy' format) view, not a copy, unless a `dtype`
+            other than the one of the block is requested.
+        """
+        self._load_csv_if_no_df()
+        data = self._dfptr[:, start:stop]
+        if dtype is not None and data.dtype != dtype:
+            data = data.astype(dtype)
+        return data
 
-        self._dfptr = self._check_and_load_df(self._data_source)
-        if self._dfptr is None:
-            self._dfptr = pd.read_csv(filename, sep=",")
-            self._persist_df(self._dfptr, self.get(self._build_df_name(self._data_source)))
+    def _group_columns(self, groups):
+        """
+        :return: the columns of the column `groups` side by side in
+            one matrix. Adjacent groups without transformation are
+            returned as a single view, otherwise the groups are
+            written into one newly allocated matrix.
+        """
+        ranges = []
+        for group in groups:
+            start, stop = self._group_ranges[group]
+            if ranges and ranges[-1][1] == start and \
+                    group not in self._transforms and \
+                    ranges[-1][2] is None:
+                ranges[-1] = (ranges[-1][0], stop, None)
+            else:
+                ranges.append((start, stop, self._transforms.get(group)))
+        dtype = self._dtype(*groups)
+        if len(ranges) == 1:
+            start, stop, transform = ranges[0]
+            data = self._columns(start, stop, dtype)
+            return data if transform is None else transform(data)
+
+        self._load_csv_if_no_df()
+        n_columns = sum(stop - start for start, stop, _ in ranges)
+        out = np.empty((self._dfptr.shape[0], n_columns), dtype=dtype,
+                       order='F')
+        column = 0
+        for start, stop, transform in ranges:
+            data = self._columns(start, stop)
+            if transform is not None:
+                data = transform(data)
+            out[:, column:column + stop - start] = data
+            column += stop - start
+        return out
+
+    def _column_names(self, *groups):
+        """
+        :return: function returning the names of the columns of the
+            column `groups` from the header of the csv file.
+        """
+        def names():
+            header = self._header()
+            columns = []
+            for group in groups:
+                start, stop = self._group_ranges[group]
+                columns.extend(header[start:stop])
+            return columns
+        return names
+
+    def columns(self, *groups):
+        """
+        :param groups: names of column groups, i.e. the names of the
+            other accessors. Groups which are only available in the
+            training data fail in test mode.
+        :return: the column groups side by side as one frame, e.g.
+            columns('intraday_120_180', 'returns_next_days'). The
+            groups contain the same data as their accessors.
+        """
+        for group in groups:
+            if group not in self._group_ranges:
+                raise RuntimeError("unknown column group given: %s" % (group))
+            if group in self._train_only:
+                self._fail_if_testmode()
+        dataname = 'winton##' + self._data_source + '##' + '+'.join(groups)
+
+        def cb(name):
+            obj = self
+            return obj._group_columns(groups)
+
+        h = self._frame_hash(*groups)
+        r = self.lazy_frame(dataname, h, cb,
+                            columns=self._column_names(*groups))
+        return r
 
     def _fail_if_testmode(self):
         if self._data_source == 'test':
@@ -92,30 +424,11 @@ class WintonStockData(PipelineStateInterface):
     def _input_hash(self):
         """
         :return: The hash of the input data. In this case
-            we use the hash of the modification date of the input
-            files to detect if the files have changed and have to
-            be reread.
+            we use the fingerprint of the input file to detect
+            if the file has changed and has to be reread.
         """
-        hstr = ''
-        hash_over = []
-        if self._data_source == 'train':
-            hash_over.append('train')
-        if self._data_source == 'test':
-            hash_over.append('test_2')
-        for ds in hash_over:
-            filename = os.path.join(self._data_directory, ds + '.csv')
-            mtime = os.path.getmtime(filename)
-            hstr += str(mtime)
-        return hash(hstr)
-
-    @staticmethod
-    def _own_linear_interpolator(data):
-        def _1d_linear_interpolate(line):
-            # https://stackoverflow.com/questions/6518811/interpolate-nan-values-in-a-numpy-array
-            nans, posfunc = np.isnan(line), lambda x: x.nonzero()[0]
-            line[nans] = np.interp(posfunc(nans), posfunc(~nans), line[~nans])
-            return line
-        return np.apply_along_axis(_1d_linear_interpolate, 1, data)
+        return Fingerprinter().fingerprint([self._csv_filename()],
+                                           content=self._content_hash)
 
     def features(self):
         """
@@ -124,13 +437,13 @@ class WintonStockData(PipelineStateInterface):
         dataname = 'winton##' + self._data_source + '##features'
         def cb(name):
             obj = self
-            obj._load_csv_if_no_df()
-            data = obj._dfptr.ix[:, 1:26].as_matrix()
+            data = obj._columns(1, 26, obj._dtype('features'))
             tmp = np.nan_to_num(data)
             return tmp
 
-        h = self._input_hash
-        r = BrewPipeDataFrame(dataname, lazy_frame=True, hash=h, callback=cb)
+        h = self._frame_hash('features')
+        r = self.lazy_frame(dataname, h, cb,
+                            columns=self._column_names('features'))
         return r
 
     def intraday_2_120(self):
@@ -141,17 +454,16 @@ class WintonStockData(PipelineStateInterface):
 
         def cb(name):
             obj = self
-            obj._load_csv_if_no_df()
-            data = obj._dfptr.ix[:, 28:147].as_matrix()
+            data = obj._columns(28, 147, obj._dtype('intraday_2_120'))
             # linearly interpolate missing time-series data
-            # TODO: pandas still doesn't remove the NaNs
-            # tmp = np.apply_along_axis(lambda x: pd.Series(x).interpolate(method='linear', limit_direction='both').values, 1, data)
-            tmp = obj._own_linear_interpolator(data)
+            with obj.trace('interpolate'):
+                tmp = interpolate_rows(data)
             self.put(name, self._input_hash)
             return tmp
 
-        h = self._input_hash
-        r = BrewPipeDataFrame(dataname, lazy_frame=True, hash=h, callback=cb)
+        h = self._frame_hash('intraday_2_120')
+        r = self.lazy_frame(dataname, h, cb,
+                            columns=self._column_names('intraday_2_120'))
         return r
 
     def intraday_120_180(self):
@@ -163,13 +475,13 @@ class WintonStockData(PipelineStateInterface):
 
         def cb(name):
             obj = self
-            obj._load_csv_if_no_df()
-            tmp = obj._dfptr.ix[:, 147:207].as_matrix()
+            tmp = obj._columns(147, 207, obj._dtype('intraday_120_180'))
             self.put(name, self._input_hash)
             return tmp
 
-        h = self._input_hash
-        r = BrewPipeDataFrame(dataname, lazy_frame=True, hash=h, callback=cb)
+        h = self._frame_hash('intraday_120_180')
+        r = self.lazy_frame(dataname, h, cb,
+                            columns=self._column_names('intraday_120_180'))
         return r
 
     def returns_last_days(self):
@@ -180,12 +492,12 @@ class WintonStockData(PipelineStateInterface):
 
         def cb(name):
             obj = self
-            obj._load_csv_if_no_df()
-            tmp = obj._dfptr.ix[:, 26:27].as_matrix()
+            tmp = obj._columns(26, 27, obj._dtype('returns_last_days'))
             return tmp
 
-        h = self._input_hash
-        r = BrewPipeDataFrame(dataname, lazy_frame=True, hash=h, callback=cb)
+        h = self._frame_hash('returns_last_days')
+        r = self.lazy_frame(dataname, h, cb,
+                            columns=self._column_names('returns_last_days'))
         return r
 
     def returns_next_days(self):
@@ -197,12 +509,12 @@ class WintonStockData(PipelineStateInterface):
 
         def cb(name):
             obj = self
-            obj._load_csv_if_no_df()
-            tmp = obj._dfptr.ix[:, 207:209].as_matrix()
+            tmp = obj._columns(207, 209, obj._dtype('returns_next_days'))
             return tmp
 
-        h = self._input_hash
-        r = BrewPipeDataFrame(dataname, lazy_frame=True, hash=h, callback=cb)
+        h = self._frame_hash('returns_next_days')
+        r = self.lazy_frame(dataname, h, cb,
+                            columns=self._column_names('returns_next_days'))
         return r
 
     def weights(self):
@@ -214,10 +526,10 @@ class WintonStockData(PipelineStateInterface):
 
         def cb(name):
             obj = self
-            obj._load_csv_if_no_df()
-            tmp = obj._dfptr.ix[:, 209:210].as_matrix(dataname)
+            tmp = obj._columns(209, 210, obj._dtype('weights'))
             return tmp
 
-        h = self._input_hash
-        r = BrewPipeDataFrame(dataname, lazy_frame=True, hash=h, callback=cb)
+        h = self._frame_hash('weights')
+        r = self.lazy_frame(dataname, h, cb,
+                            columns=self._column_names('weights'))
         return r
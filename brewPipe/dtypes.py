@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import threading
+import numpy as np
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+class DtypePolicy(object):
+    """
+    The floating point dtype, in which the data of the pipeline
+    is held, persisted and fed to the models.
+
+    By default every floating point frame is float32, which halves
+    the memory and the size of the intermediates compared to float64
+    and matches the tensorflow models, so batches need no cast.
+    Frames needing more precision can be kept in float64 with an
+    override, e.g.
+
+        set_dtype_policy(DtypePolicy(np.float32,
+                                     {'returns_next_days': np.float64}))
+
+    Overrides are looked up by the full frame name (e.g.
+    'winton##train##weights') and then by its last '##' separated
+    part (e.g. 'weights'). Frames of integer data (e.g. audio clips)
+    are not touched.
+    """
+
+    def __init__(self, default=np.float32, overrides=None):
+        """
+        :param default: dtype of the floating point frames.
+        :param overrides: dictionary of frame names and their dtypes.
+        """
+        self.default = self._floating(default)
+        self.overrides = dict((name, self._floating(dtype))
+                              for name, dtype in (overrides or {}).items())
+
+    @staticmethod
+    def _floating(dtype):
+        dtype = np.dtype(dtype)
+        if dtype.kind != 'f':
+            raise RuntimeError("the dtype policy only supports floating "
+                               "point dtypes, given: %s" % (dtype))
+        return dtype
+
+    def dtype(self, name=None):
+        """
+        :return: the dtype of the frame `name`.
+        """
+        if name is None:
+            return self.default
+        if name in self.overrides:
+            return self.overrides[name]
+        return self.overrides.get(name.split('##')[-1], self.default)
+
+    def cast(self, name, value):
+        """
+        :return: `value` in the dtype of the frame `name`. Floating
+            point arrays already in that dtype and other values are
+            returned unchanged.
+        """
+        dtype = getattr(value, 'dtype', None)
+        if dtype is None or dtype.kind != 'f':
+            return value
+        target = self.dtype(name)
+        if dtype == target:
+            return value
+        return value.astype(target)
+
+    def __repr__(self):
+        return "DtypePolicy(%s, %r)" % (self.default.name,
+                                        dict((k, v.name) for k, v in
+                                             self.overrides.items()))
+
+
+_policy = DtypePolicy()
+_policy_lock = threading.Lock()
+
+
+def dtype_hash(hash, dtype):
+    """
+    :return: the hash of a frame holding the data of the input
+        with the given `hash` in `dtype`, so cached results of
+        another dtype are not reused. A hash of 0 (unknown) is kept.
+    """
+    if not hash:
+        return hash
+    return hashlib.sha1('%s##%s' % (hash, np.dtype(dtype).str)).hexdigest()
+
+
+def get_dtype_policy():
+    """
+    :return: the dtype policy of the process.
+    """
+    return _policy
+
+
+def set_dtype_policy(policy):
+    """
+    Replace the dtype policy of the process, e.g. with
+    DtypePolicy(np.float64) to restore full precision everywhere.
+    Stages look the policy up when their frames are created.
+    :return: the former policy.
+    """
+    global _policy
+    with _policy_lock:
+        former = _policy
+        _policy = policy
+    return former
+
+
+def memory_usage(frames):
+    """
+    Account the memory of the data of `frames` (BrewPipeDataFrames)
+    and what it would take as float64. Frames whose schema is known
+    are not evaluated.
+    :return: dictionary with a dictionary of the dtype, nbytes and
+        float64_nbytes of every frame name under 'frames', the sums
+        of both sizes and the bytes saved.
+    """
+    result = {'frames': {}, 'nbytes': 0, 'float64_nbytes': 0}
+    for frame in frames:
+        dtype = frame.dtype
+        nbytes = frame.nbytes or 0
+        float64_nbytes = nbytes
+        if dtype is not None and dtype.kind == 'f':
+            float64_nbytes = nbytes // dtype.itemsize * 8
+        result['frames'][frame.name] = {'dtype': str(dtype),
+                                        'nbytes': nbytes,
+                                        'float64_nbytes': float64_nbytes}
+        result['nbytes'] += nbytes
+        result['float64_nbytes'] += float64_nbytes
+    result['saved'] = result['float64_nbytes'] - result['nbytes']
+    return result
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import importlib
+import pkgutil
+import types
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module, which is only imported when one of its
+    attributes is used the first time, e.g.
+
+        tf = LazyModule('tensorflow')
+
+    at the top of a stage module keeps importing the stage cheap,
+    as long as the stage is not used. A missing module raises the
+    ImportError on first use instead of at import.
+    """
+
+    def __init__(self, name):
+        super(LazyModule, self).__init__(name)
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__['_module'] = module
+        return module
+
+    @property
+    def loaded(self):
+        """
+        :return: whether the module has been imported.
+        """
+        return self.__dict__['_module'] is not None
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __repr__(self):
+        return "<lazy module '%s'%s>" % (self.__name__,
+                                         '' if self.loaded else ' (not loaded)')
+
+
+def module_available(name):
+    """
+    :return: whether the module `name` can be imported, without
+        importing it.
+    """
+    try:
+        return pkgutil.find_loader(name) is not None
+    except ImportError:
+        return False
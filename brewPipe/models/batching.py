@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import threading
+import Queue
+import numpy as np
+from ..data import BrewPipeDataFrame
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+class BatchGenerator(object):
+    """
+    Endless iterator over mini-batches of the rows of several
+    arrays (e.g. inputs and outputs of a model), which all have
+    the same number of rows.
+
+    Every epoch visits every row once. With shuffling, the order
+    is a new permutation of the rows each epoch. The rows of a
+    batch are gathered in ascending order, so batches read from
+    memory-mapped intermediates only touch the pages they need
+    and in file order. With `prefetch` > 0 the batches are
+    assembled on a background thread, while the model is busy
+    with the previous ones.
+    """
+
+    def __init__(self, arrays, batch_size, shuffle=True, seed=None,
+                 prefetch=2, start=0):
+        """
+        :param arrays: list of numpy arrays or BrewPipeDataFrames.
+            Memory-mapped arrays are not loaded as a whole.
+        :param batch_size: Number of rows of a batch. The last batch
+            of an epoch is smaller, if the rows do not divide evenly.
+        :param shuffle: Visit the rows in random order.
+        :param seed: Seed of the shuffling, for reproducible runs.
+        :param prefetch: Number of batches prepared in advance on a
+            background thread. 0 assembles them on the calling thread.
+        :param start: Number of batches to skip, e.g. to resume a
+            training at the step of a checkpoint. With the same seed
+            the following batches are the same as without skipping.
+            The skipped batches are not assembled.
+        """
+        self._arrays = [a.data if isinstance(a, BrewPipeDataFrame) else a
+                        for a in arrays]
+        if not self._arrays:
+            raise RuntimeError("at least one array has to be given")
+        self._n_samples = self._arrays[0].shape[0]
+        if any(a.shape[0] != self._n_samples for a in self._arrays):
+            raise RuntimeError("There have to be the same number of samples")
+        if self._n_samples <= 0:
+            raise RuntimeError("Data has to be set first.")
+        if batch_size < 1:
+            raise RuntimeError("incorrect batch_size given: %s" % (batch_size))
+        if start < 0:
+            raise RuntimeError("incorrect start given: %s" % (start))
+        self._batch_size = batch_size
+        self._shuffle = shuffle
+        self._random = np.random.RandomState(seed)
+        self._prefetch = prefetch
+        self._queue = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._error = None
+        batches_per_epoch = -(-self._n_samples // batch_size)
+        self.epoch, skip = divmod(start, batches_per_epoch)
+        if shuffle:
+            # draw the orders of the skipped epochs
+            for _ in xrange(self.epoch):
+                self._random.permutation(self._n_samples)
+        self._batches = self._generate(skip)
+
+    @property
+    def n_samples(self):
+        return self._n_samples
+
+    def _epoch_batches(self, skip=0):
+        if self._shuffle:
+            order = self._random.permutation(self._n_samples)
+        for start in xrange(skip * self._batch_size, self._n_samples,
+                            self._batch_size):
+            stop = min(start + self._batch_size, self._n_samples)
+            if self._shuffle:
+                rows = np.sort(order[start:stop])
+                yield tuple(a[rows] for a in self._arrays)
+            else:
+                # contiguous rows are copied as one slice
+                yield tuple(np.array(a[start:stop]) for a in self._arrays)
+
+    def _generate(self, skip=0):
+        while True:
+            for batch in self._epoch_batches(skip):
+                yield batch
+            skip = 0
+            self.epoch += 1
+
+    def _put(self, item):
+        """
+        Put `item` into the queue, as soon as there is room.
+        :return: False, if the generator was closed meanwhile.
+        """
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, True, 0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def _producer(self):
+        try:
+            for batch in self._batches:
+                if not self._put((True, batch)):
+                    return
+        except Exception:
+            self._put((False, sys.exc_info()))
+
+    def _start(self):
+        self._queue = Queue.Queue(maxsize=self._prefetch)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._producer)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        """
+        :return: tuple with one batch of every array.
+        """
+        if self._error is not None:
+            # the producer has stopped, fail again instead of waiting
+            raise self._error[0], self._error[1], self._error[2]
+        if not self._prefetch:
+            return next(self._batches)
+        if self._thread is None:
+            self._start()
+        ok, batch = self._queue.get()
+        if not ok:
+            self._error = batch
+            raise batch[0], batch[1], batch[2]
+        return batch
+
+    __next__ = next
+
+    def close(self):
+        """
+        Stop the prefetching thread.
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._queue = None
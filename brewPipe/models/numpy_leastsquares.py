@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+from ..pipelineState import PipelineStateInterface
+from ..data import BrewPipeDataFrame
+from .parameters import ParameterStore
+from ..lazy import LazyModule
+from ..dtypes import get_dtype_policy
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+scipy_linalg = LazyModule('scipy.linalg')
+
+
+class NumpyLeastSquares(PipelineStateInterface):
+    """
+    Linear least squares regression y = x W + b solved in closed
+    form. It has the same interface as TensorflowLeastSquares, but
+    computes the exact solution instead of running gradient descent.
+    Rows with missing values (NaN) are left out of the fit, which
+    is always solved in float64. Predictions are made in the dtype
+    of the dtype policy (see `brewPipe.dtypes`) for the frame 'y'.
+    """
+
+    _solvers = ('lstsq', 'qr', 'normal')
+
+    def __init__(self, input_dimension, output_dimension, solver='lstsq',
+                 chunk_rows=None, regularization=0.0, silent=True,
+                 intermediate_directory="intermediates"):
+        """
+        :param solver: 'lstsq' (SVD based, most robust), 'qr' or
+            'normal' (solves the normal equations, fastest, but
+            less accurate for badly conditioned data).
+        :param chunk_rows: If given, the data is never loaded as a
+            whole. Instead xᵀx and xᵀy are accumulated over chunks
+            of that many rows and the normal equations are solved,
+            regardless of `solver`. This works for memory-mapped
+            data larger than the main memory.
+        :param regularization: Ridge regularization added to the
+            diagonal of xᵀx (not to the bias) by the 'normal' solver.
+        :param intermediate_directory: Directory, where the learned
+            parameters are persisted to, so `run` only solves again,
+            if the hashes of the input frames changed.
+        """
+        super(NumpyLeastSquares, self).__init__()
+
+        if solver not in self._solvers:
+            raise RuntimeError("incorrect solver given: %s" % (solver))
+        self._input_dimension = input_dimension
+        self._output_dimension = output_dimension
+        self._solver = solver
+        self._chunk_rows = chunk_rows
+        self._regularization = regularization
+        self._x = None
+        self._y = None
+        self._n_samples = 0
+        self._silent = silent
+        self.throughput = None
+        self._parameters = ParameterStore(intermediate_directory)
+
+        self._result_W = np.zeros((self._input_dimension, self._output_dimension))
+        self._result_b = np.zeros((self._output_dimension))
+
+    @classmethod
+    def from_coefficients(cls, W, b):
+        """
+        :return: a model predicting x W + b, e.g. to use
+            parameters learned by another model.
+        """
+        W = np.asarray(W)
+        model = cls(W.shape[0], W.shape[1])
+        model._result_W = W
+        model._result_b = np.asarray(b)
+        return model
+
+    def set_data(self, x, y):
+        """
+        :param x: BrewPipeDataFrame of the inputs.
+        :param y: BrewPipeDataFrame of the outputs.
+        """
+        x_samples = x.shape[0]
+        y_samples = y.shape[0]
+        if x_samples != y_samples:
+            raise RuntimeError("There have to be the same number of samples")
+        self._x = x
+        self._y = y
+        self._n_samples = x_samples
+
+    @staticmethod
+    def _complete_rows(x, y):
+        """
+        :return: the rows of `x` and `y` without missing values.
+        """
+        valid = np.isfinite(x).all(axis=1) & np.isfinite(y).all(axis=1)
+        if valid.all():
+            return x, y
+        return x[valid], y[valid]
+
+    @staticmethod
+    def _fail_if_no_rows(n_rows):
+        if n_rows == 0:
+            raise RuntimeError("There are no samples without missing values")
+
+    @staticmethod
+    def _with_bias(x):
+        xb = np.empty((x.shape[0], x.shape[1] + 1))
+        xb[:, :-1] = x
+        xb[:, -1] = 1.0
+        return xb
+
+    def _normal_equations(self, chunks):
+        """
+        Solve the normal equations accumulated over the
+        (x, y) blocks in `chunks`.
+        """
+        d = self._input_dimension + 1
+        xtx = np.zeros((d, d))
+        xty = np.zeros((d, self._output_dimension))
+        n_rows = 0
+        for x, y in chunks:
+            x, y = self._complete_rows(x, y)
+            n_rows += x.shape[0]
+            xb = self._with_bias(x)
+            xtx += np.dot(xb.T, xb)
+            xty += np.dot(xb.T, y)
+        self._fail_if_no_rows(n_rows)
+        xtx[np.arange(d - 1), np.arange(d - 1)] += self._regularization
+        try:
+            return scipy_linalg.solve(xtx, xty, sym_pos=True)
+        except np.linalg.LinAlgError:
+            # singular xᵀx, e.g. constant columns
+            return scipy_linalg.lstsq(xtx, xty)[0]
+
+    def run(self):
+        if self._n_samples <= 0:
+            raise RuntimeError("Data has to be set first.")
+
+        key = self._parameters.key(self, {'input_dimension': self._input_dimension,
+                                          'output_dimension': self._output_dimension,
+                                          'solver': self._solver,
+                                          'chunk_rows': self._chunk_rows,
+                                          'regularization': self._regularization},
+                                   [self._x, self._y])
+        stored = self._parameters.load(key)
+        if stored is not None:
+            self._result_W = stored['W']
+            self._result_b = stored['b']
+            return
+
+        if self._chunk_rows:
+            coefficients = self._normal_equations(
+                zip(self._x.iter_chunks(self._chunk_rows),
+                    self._y.iter_chunks(self._chunk_rows)))
+        elif self._solver == 'normal':
+            coefficients = self._normal_equations([(self._x.data,
+                                                    self._y.data)])
+        else:
+            x, y = self._complete_rows(self._x.data, self._y.data)
+            self._fail_if_no_rows(x.shape[0])
+            xb = self._with_bias(x)
+            if self._solver == 'qr':
+                q, r = scipy_linalg.qr(xb, mode='economic')
+                coefficients = scipy_linalg.solve_triangular(r, np.dot(q.T, y))
+            else:
+                coefficients = scipy_linalg.lstsq(xb, y)[0]
+
+        self._result_W = coefficients[:-1]
+        self._result_b = coefficients[-1]
+        self._parameters.save(key, self, W=self._result_W, b=self._result_b)
+
+        if not self._silent:
+            print "Result: "
+            print self._result_W, self._result_b
+
+    def apply_model(self, x, chunk_rows=None):
+        """
+        :param chunk_rows: If given, predict blocks of that many
+            rows at a time to bound the temporary memory.
+        """
+        chunk_rows = chunk_rows or self._chunk_rows
+        dtype = get_dtype_policy().dtype('y')
+        # in the output dtype, so float32 data is not upcast
+        W = self._result_W.astype(dtype)
+        b = self._result_b.astype(dtype)
+        data = x.data
+        start_time = time.time()
+        if not chunk_rows:
+            tmp = (np.dot(data, W) + b).astype(dtype, copy=False)
+        else:
+            tmp = np.empty((data.shape[0], self._output_dimension), dtype=dtype)
+            for start in xrange(0, data.shape[0], chunk_rows):
+                stop = start + chunk_rows
+                tmp[start:stop] = np.dot(data[start:stop], W)
+                tmp[start:stop] += b
+        elapsed = time.time() - start_time
+        self.throughput = data.shape[0] / max(elapsed, 1e-9)
+        if not self._silent:
+            print "Predicted %d rows in %.3fs (%.0f rows/s)" % \
+                (data.shape[0], elapsed, self.throughput)
+
+        ret = BrewPipeDataFrame('y')
+        ret.data = tmp
+        return ret
@@ -4,6 +4,7 @@
 import numpy as np
 from ..pipelineState import PipelineStateInterface
 from ..data import BrewPipeDataFrame
+from ..dtypes import get_dtype_policy
 
 __author__ = 'Dominik Meyer <meyerd@mytum.de>'
 
@@ -13,27 +14,70 @@ class RandomMeanVariance(PipelineStateInterface):
     This is an implementation that records the mean and variance
     of each feature separately. Afterwards, new data can be sampled
     from normal distributions with that means and variances.
+
+    The statistics are updated chunk by chunk (Welford's algorithm
+    in the pairwise form of Chan et al.), so the input can be
+    larger than the main memory. Missing values (NaN) are ignored.
+    The statistics are kept in float64, the samples are returned in
+    the dtype of the dtype policy (see `brewPipe.dtypes`).
     """
 
-    def __init__(self, input_dimension, silent=True):
+    def __init__(self, input_dimension, silent=True, seed=None,
+                 chunk_rows=65536):
+        """
+        :param seed: Seed of the random numbers of `apply_model`.
+        :param chunk_rows: Number of rows `run` reads from the input
+            frame at a time.
+        """
         super(RandomMeanVariance, self).__init__()
 
         self._input_dimension = input_dimension
-        self._x_data = None
+        self._x = None
         self._n_samples = 0
-        self._sample_size = 0
-        self._means = None
-        self._variances = None
+        self._sample_size = input_dimension
+        self._chunk_rows = chunk_rows
+        # numpy.random.RandomState, as numpy.random.Generator
+        # does not exist in the numpy versions supported
+        self._random = np.random.RandomState(seed)
         self._silent = silent
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the statistics collected so far.
+        """
+        self._counts = np.zeros(self._sample_size)
+        self._means = np.zeros(self._sample_size)
+        self._m2 = np.zeros(self._sample_size)
+        self._variances = np.zeros(self._sample_size)
 
     def set_data(self, x):
-        self._x_data = x.data
-        x_samples = self._x_data.shape[0]
-        x_sample_size = self._x_data.shape[1]
-        self._means = np.zeros(x_sample_size)
-        self._variances = np.zeros(x_sample_size)
-        self._n_samples = x_samples
-        self._sample_size = x_sample_size
+        x_shape = x.shape
+        self._x = x
+        self._n_samples = x_shape[0]
+        if x_shape[1] != self._sample_size:
+            self._sample_size = x_shape[1]
+            self.reset()
+
+    def partial_fit(self, chunk):
+        """
+        Update the means and variances with the rows of `chunk`.
+        """
+        chunk = np.asarray(chunk, dtype=np.float64)
+        valid = ~np.isnan(chunk)
+        counts = valid.sum(axis=0)
+        n = np.maximum(counts, 1)
+        means = np.where(valid, chunk, 0.0).sum(axis=0) / n
+        m2 = (np.where(valid, chunk - means, 0.0) ** 2).sum(axis=0)
+
+        total = self._counts + counts
+        delta = means - self._means
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self._means += np.where(total > 0, delta * counts / total, 0.0)
+            self._m2 += m2 + np.where(total > 0, delta ** 2 * self._counts *
+                                      counts / total, 0.0)
+            self._counts = total
+            self._variances = np.where(total > 0, self._m2 / total, 0.0)
 
     def apply_model(self, n_samples):
         """
@@ -41,23 +85,20 @@ class RandomMeanVariance(PipelineStateInterface):
         data with previously estimated parameters.
         :param n_samples: number of samples to draw
         """
-        rdata = np.zeros((n_samples, self._sample_size))
-
-        for column in xrange(self._sample_size):
-            rdata[:, column] = np.random.normal(loc=self._means[column],
-                                                scale=self._variances[column],
-                                                size=n_samples)
+        rdata = self._random.normal(loc=self._means,
+                                    scale=np.sqrt(self._variances),
+                                    size=(n_samples, self._sample_size))
 
         ret = BrewPipeDataFrame('RandomMeanVarianceSamples')
-        ret.data = rdata
+        ret.data = get_dtype_policy().cast(ret.name, rdata)
         return ret
 
     def run(self):
-        x = self._x_data
-
-        self._means = np.mean(x, axis=1)
-        self._variances = np.std(x, axis=1)
+        self.reset()
+        for chunk in self._x.iter_chunks(self._chunk_rows):
+            self.partial_fit(chunk)
 
-        print "Results: "
-        print " Means: ", self._means
-        print " Variances: ", self._variances
+        if not self._silent:
+            print "Results: "
+            print " Means: ", self._means
+            print " Variances: ", self._variances
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from ..pipelineState import ArtifactStore
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+class ParameterStore(object):
+    """
+    Persists the learned parameters of model stages as .npz
+    files in the intermediate store, keyed by the model class,
+    its hyperparameters and the hashes of its input frames, so
+    a model does not have to be trained again for the same data.
+    """
+
+    def __init__(self, intermediate_directory="intermediates"):
+        self._store = ArtifactStore(intermediate_directory)
+
+    @staticmethod
+    def key(stage, params, frames, partial=False):
+        """
+        :param stage: The model stage.
+        :param params: Dictionary of the hyperparameters.
+        :param frames: The input BrewPipeDataFrames.
+        :param partial: Key of the checkpoints of an unfinished
+            training instead of the final parameters.
+        :return: the key of the parameters or None, if a frame has
+            no hash (frames with static data), so the parameters
+            can not be looked up.
+        """
+        hashes = [f.hash for f in frames]
+        if not all(hashes):
+            return None
+        params = dict(params)
+        if partial:
+            params['__partial__'] = True
+        return ArtifactStore.make_key(str(stage.__class__.__name__),
+                                      params, hashes)
+
+    def load(self, key):
+        """
+        :return: dictionary of the arrays stored under `key` or
+            None, if there are none.
+        """
+        if key is None:
+            return None
+        path = self._store.path(key)
+        if path is None:
+            return None
+        f = np.load(path)
+        try:
+            return dict((k, f[k]) for k in f.files)
+        finally:
+            f.close()
+
+    def save(self, key, stage, **arrays):
+        """
+        Store the `arrays` under `key`.
+        """
+        if key is None:
+            return
+        path = self._store.new_path('.npz')
+        np.savez(path, **arrays)
+        self._store.commit(key, path, stage=str(stage.__class__.__name__))
+
+    def remove(self, key):
+        if key is not None:
+            self._store.remove(key)
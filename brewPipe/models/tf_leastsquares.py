@@ -1,13 +1,20 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import tensorflow as tf
+import time
 import numpy as np
 from ..pipelineState import PipelineStateInterface
+from ..lazy import LazyModule
 from ..data import BrewPipeDataFrame
+from .batching import BatchGenerator
+from .numpy_leastsquares import NumpyLeastSquares
+from .parameters import ParameterStore
+from ..dtypes import get_dtype_policy
 
 __author__ = 'Dominik Meyer <meyerd@mytum.de>'
 
+tf = LazyModule('tensorflow')
+
 
 class TensorflowLeastSquares(PipelineStateInterface):
     """
@@ -16,86 +23,210 @@ class TensorflowLeastSquares(PipelineStateInterface):
     """
 
     def __init__(self, input_dimension, output_dimension, learn_rate=0.1,
-                 batch_size=1, silent=True):
+                 batch_size=1, silent=True, shuffle=True, seed=None,
+                 inference_batch_size=65536,
+                 intermediate_directory="intermediates",
+                 checkpoint_interval=10000, dtype=None):
+        """
+        :param shuffle: Train on the rows in a new random order
+            every epoch.
+        :param seed: Seed of the shuffling.
+        :param inference_batch_size: Number of rows `apply_model`
+            feeds to the graph at a time.
+        :param intermediate_directory: Directory, where the learned
+            parameters are persisted to. If the model was already
+            trained with the same hyperparameters on input frames
+            with the same hashes, `run` loads them instead.
+        :param checkpoint_interval: Persist the parameters every
+            that many steps, so an interrupted training resumes from
+            the last checkpoint. None disables the checkpoints.
+        :param dtype: Floating point dtype of the graph, defaults to
+            the one of the dtype policy (see `brewPipe.dtypes`). The
+            data is converted once, when `run` starts training, not
+            per batch.
+        """
         super(TensorflowLeastSquares, self).__init__()
 
         self._input_dimension = input_dimension
         self._output_dimension = output_dimension
         self._learn_rate = learn_rate
         self._batch_size = batch_size
-        self._x_data = None
-        self._y_data = None
         self._n_samples = 0
         self._silent = silent
+        self._inference_batch_size = inference_batch_size
+        self._session = None
+        self.throughput = None
 
-        self._data_ptr = 0
+        self._shuffle = shuffle
+        self._seed = seed
+        self._batches = None
+        self._frames = []
+        self._parameters = ParameterStore(intermediate_directory)
+        self._checkpoint_interval = checkpoint_interval
+        self._dtype = np.dtype(dtype or get_dtype_policy().default)
 
-        self._result_W = np.zeros((self._input_dimension, self._output_dimension))
-        self._result_b = np.zeros((self._output_dimension))
+        self._result_W = np.zeros((self._input_dimension, self._output_dimension),
+                                  dtype=self._dtype)
+        self._result_b = np.zeros((self._output_dimension), dtype=self._dtype)
 
+        tf_dtype = tf.as_dtype(self._dtype)
         self._graph = tf.Graph()
         with self._graph.as_default():
-            self._x = tf.placeholder(tf.float32, shape=[None, self._input_dimension])
-            self._y_ = tf.placeholder(tf.float32, shape=[None, self._output_dimension])
+            self._x = tf.placeholder(tf_dtype, shape=[None, self._input_dimension])
+            self._y_ = tf.placeholder(tf_dtype, shape=[None, self._output_dimension])
 
             # linear least squares, fit for every element of the
             # output vector one line
-            self._b = tf.Variable(tf.zeros_like(self._result_b, dtype=tf.float32))
+            self._b = tf.Variable(tf.zeros_like(self._result_b, dtype=tf_dtype))
             self._W = tf.Variable(tf.random_uniform([self._result_W.shape[0],
                                                      self._result_W.shape[1]], -1.0, 1.0,
-                                                    dtype=tf.float32))
+                                                    dtype=tf_dtype))
 
             self._y = tf.matmul(self._x, self._W) + self._b
 
             self._loss = tf.reduce_mean(tf.square(self._y - self._y_))
             self._optimizer = tf.train.GradientDescentOptimizer(self._learn_rate).minimize(self._loss)
 
+            # restore parameters of a checkpoint
+            self._W_in = tf.placeholder(tf_dtype, shape=self._result_W.shape)
+            self._b_in = tf.placeholder(tf_dtype, shape=self._result_b.shape)
+            self._restore = [self._W.assign(self._W_in),
+                             self._b.assign(self._b_in)]
+
     def _generate_batch(self):
-        if self._n_samples <= 0:
+        if self._batches is None:
             raise RuntimeError("Data has to be set first.")
-
-        # TODO: make this more robust and shuffle data
-        if self._data_ptr >= self._n_samples:
-            self._data_ptr = 0
-        data_from = self._data_ptr
-        data_to = self._data_ptr + self._batch_size
-        self._data_ptr = data_to
-
-        return (self._x_data[data_from:data_to, :],
-                self._y_data[data_from:data_to, :])
+        return next(self._batches)
 
     def set_data(self, x, y):
-        self._x_data = x.data
-        self._y_data = y.data
-        x_samples = self._x_data.shape[0]
-        y_samples = self._y_data.shape[0]
+        """
+        :param x: BrewPipeDataFrame of the inputs.
+        :param y: BrewPipeDataFrame of the outputs. The data of
+            both is only loaded, if `run` has to train.
+        """
+        x_samples = x.shape[0]
+        y_samples = y.shape[0]
         if x_samples != y_samples:
             raise RuntimeError("There have to be the same number of samples")
         self._n_samples = x_samples
+        self._frames = [x, y]
+        if self._batches is not None:
+            self._batches.close()
+            self._batches = None
 
-    def apply_model(self, x):
-        x = x.data
+    def _start_batches(self, seed, first_step=0):
+        """
+        Convert the data to the dtype of the graph and start
+        batching it with the batch of `first_step`.
+        """
+        if self._batches is not None:
+            # left over by an interrupted run
+            self._batches.close()
+        arrays = [np.asarray(f.data, dtype=self._dtype) for f in self._frames]
+        self._batches = BatchGenerator(arrays, self._batch_size,
+                                       shuffle=self._shuffle, seed=seed,
+                                       start=first_step)
 
-        tmp = np.zeros((1,1))
-        with tf.Session(graph=self._graph) as sess:
-            tf.initialize_all_tables().run()
+    def _inference_session(self):
+        """
+        :return: the session used by `apply_model`. It is kept
+            open, so repeated predictions do not pay the setup.
+        """
+        if self._session is None:
+            self._session = tf.Session(graph=self._graph)
+        return self._session
+
+    def close(self):
+        """
+        Close the inference session.
+        """
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def numpy_predictor(self):
+        """
+        :return: a NumpyLeastSquares model with the learned
+            parameters, which predicts without tensorflow.
+        """
+        return NumpyLeastSquares.from_coefficients(self._result_W,
+                                                   self._result_b)
 
-            feed_dict = {self._x: x,
+    def apply_model(self, x, batch_size=None):
+        """
+        :param batch_size: Number of rows fed to the graph at
+            a time, defaults to `inference_batch_size`.
+        """
+        batch_size = batch_size or self._inference_batch_size
+        sess = self._inference_session()
+        data = x.data
+
+        start = time.time()
+        tmp = np.empty((data.shape[0], self._output_dimension), dtype=self._dtype)
+        row = 0
+        for batch in x.iter_chunks(batch_size):
+            feed_dict = {self._x: np.asarray(batch, dtype=self._dtype),
                          self._W: self._result_W,
                          self._b: self._result_b}
-
-            tmp = sess.run(self._y, feed_dict=feed_dict)
+            tmp[row:row + len(batch)] = sess.run(self._y, feed_dict=feed_dict)
+            row += len(batch)
+        elapsed = time.time() - start
+        self.throughput = data.shape[0] / max(elapsed, 1e-9)
+        if not self._silent:
+            print "Predicted %d rows in %.3fs (%.0f rows/s)" % \
+                (data.shape[0], elapsed, self.throughput)
 
         ret = BrewPipeDataFrame('y')
         ret.data = tmp
         return ret
 
+    def _parameters_key(self, max_steps, partial=False):
+        params = {'input_dimension': self._input_dimension,
+                  'output_dimension': self._output_dimension,
+                  'learn_rate': self._learn_rate,
+                  'batch_size': self._batch_size,
+                  'shuffle': self._shuffle,
+                  'seed': self._seed,
+                  'max_steps': max_steps,
+                  'dtype': self._dtype.str}
+        return self._parameters.key(self, params, self._frames, partial)
+
     def run(self, max_steps=1000):
+        if self._n_samples <= 0:
+            raise RuntimeError("Data has to be set first.")
+
+        key = self._parameters_key(max_steps)
+        partial_key = self._parameters_key(max_steps, partial=True)
+        stored = self._parameters.load(key)
+        if stored is not None:
+            self._result_W = stored['W']
+            self._result_b = stored['b']
+            if not self._silent:
+                print "Loaded the trained parameters."
+            return
+
         with tf.Session(graph=self._graph) as sess:
             tf.initialize_all_variables().run()
 
+            first_step = 0
+            # the seed of the batch order is saved with the checkpoints,
+            # so a resumed training continues with the same batches
+            batch_seed = self._seed
+            if batch_seed is None:
+                batch_seed = np.random.randint(2 ** 31 - 1)
+            checkpoint = self._parameters.load(partial_key)
+            if checkpoint is not None:
+                sess.run(self._restore, feed_dict={self._W_in: checkpoint['W'],
+                                                   self._b_in: checkpoint['b']})
+                first_step = int(checkpoint['step'])
+                batch_seed = int(checkpoint['seed'])
+                if not self._silent:
+                    print "Resuming training at step ", first_step
+
+            self._start_batches(batch_seed, first_step)
+
             average_loss = 0.0
-            for step in xrange(max_steps):
+            for step in xrange(first_step, max_steps):
                 batch_x, batch_y = self._generate_batch()
                 feed_dict = {self._x: batch_x, self._y_: batch_y}
 
@@ -111,8 +242,21 @@ class TensorflowLeastSquares(PipelineStateInterface):
                         average_loss = 0
                         print sess.run(self._W), sess.run(self._b)
 
+                if self._checkpoint_interval and step > first_step and \
+                        step % self._checkpoint_interval == 0:
+                    self._parameters.save(partial_key, self,
+                                          W=sess.run(self._W),
+                                          b=sess.run(self._b),
+                                          step=step + 1, seed=batch_seed)
+
             self._result_W = sess.run(self._W)
             self._result_b = sess.run(self._b)
+        # stop prefetching batches
+        self._batches.close()
+        self._batches = None
+
+        self._parameters.save(key, self, W=self._result_W, b=self._result_b)
+        self._parameters.remove(partial_key)
 
         print "Result: "
         print self._result_W, self._result_b
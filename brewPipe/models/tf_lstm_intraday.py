@@ -1,13 +1,16 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import tensorflow as tf
 import numpy as np
 from ..pipelineState import PipelineStateInterface
+from ..lazy import LazyModule
 from ..data import BrewPipeDataFrame
+from .batching import BatchGenerator
 
 __author__ = 'Dominik Meyer <meyerd@mytum.de>'
 
+tf = LazyModule('tensorflow')
+
 # TODO: non functional yet
 
 class TensorflowLSTMIntraday(PipelineStateInterface):
@@ -19,7 +22,7 @@ class TensorflowLSTMIntraday(PipelineStateInterface):
     """
 
     def __init__(self, input_dimension, output_dimension, learn_rate=0.1,
-                 batch_size=1, silent=True):
+                 batch_size=1, silent=True, shuffle=True, seed=None):
         self._input_dimension = input_dimension
         self._output_dimension = output_dimension
         self._hidden_size = 100
@@ -33,7 +36,9 @@ class TensorflowLSTMIntraday(PipelineStateInterface):
         self._n_samples = 0
         self._silent = silent
 
-        self._data_ptr = 0
+        self._shuffle = shuffle
+        self._seed = seed
+        self._batches = None
 
         self._lstm_cell = tf.models.rnn.rnn_cell.BasicLSTMCell(
             self._hidden_size,
@@ -68,27 +73,24 @@ class TensorflowLSTMIntraday(PipelineStateInterface):
             self._optimizer = tf.train.GradientDescentOptimizer(self._learn_rate).minimize(self._loss)
 
     def _generate_batch(self):
-        if self._n_samples <= 0:
+        if self._batches is None:
             raise RuntimeError("Data has to be set first.")
-
-        # TODO: make this more robust and shuffle data
-        if self._data_ptr >= self._n_samples:
-            self._data_ptr = 0
-        data_from = self._data_ptr
-        data_to = self._data_ptr + self._batch_size
-        self._data_ptr = data_to
-
-        return (self._x_data[data_from:data_to, :],
-                self._y_data[data_from:data_to, :])
+        return next(self._batches)
 
     def set_data(self, x, y):
-        self._x_data = x.data
-        self._y_data = y.data
+        # in the dtype of the graph, so the batches are fed as they are
+        self._x_data = np.asarray(x.data, dtype=np.float32)
+        self._y_data = np.asarray(y.data, dtype=np.float32)
         x_samples = self._x_data.shape[0]
         y_samples = self._y_data.shape[0]
         if x_samples != y_samples:
             raise RuntimeError("There have to be the same number of samples")
         self._n_samples = x_samples
+        if self._batches is not None:
+            self._batches.close()
+        self._batches = BatchGenerator([self._x_data, self._y_data],
+                                       self._batch_size, shuffle=self._shuffle,
+                                       seed=self._seed)
 
     def apply_model(self, x):
         x = x.data
@@ -130,6 +132,8 @@ class TensorflowLSTMIntraday(PipelineStateInterface):
 
             self._result_W = sess.run(self._W)
             self._result_b = sess.run(self._b)
+        # stop prefetching batches
+        self._batches.close()
 
         print "Result: "
         print self._result_W, self._result_b
@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import gzip
 import os
+import numpy as np
 from ..pipelineState import PipelineStateInterface
 
 __author__ = 'Dominik Meyer <meyerd@mytum.de>'
@@ -12,18 +14,29 @@ class WintonStockDataOutput(PipelineStateInterface):
     Output the fitted data in the winton stock market
     challenge output format.
     """
-    def __init__(self, output_file, overwrite=False):
+    def __init__(self, output_file, overwrite=False, compress=None,
+                 block_rows=1000):
         """
         Initialize the output writer
         :param output_file: The path to the output .csv file to
             be written.
         :param overwrite: Overwrite the output file if it already
             exists.
+        :param compress: Write a gzip compressed file (with the
+            fastest compression level, which still shrinks the file
+            to a third). By default the output is compressed if
+            `output_file` ends with '.gz'.
+        :param block_rows: Number of samples formatted at once.
+            Only one block of formatted text is kept in memory.
         """
         super(WintonStockDataOutput, self).__init__()
 
         self._output_file = output_file
         self._overwrite = overwrite
+        if compress is None:
+            compress = output_file.endswith('.gz')
+        self._compress = compress
+        self._block_rows = block_rows
 
         if os.path.exists(self._output_file) and not self._overwrite:
             raise RuntimeError("output '%s' already exists" % \
@@ -46,11 +59,24 @@ class WintonStockDataOutput(PipelineStateInterface):
         self._n_samples = self._data.shape[0]
         self._prediction_size = self._data.shape[1]
 
+    def _open(self):
+        if self._compress:
+            return gzip.open(self._output_file, 'wb', compresslevel=1)
+        return open(self._output_file, 'w')
+
     def write(self):
-        with open(self._output_file, 'w') as f:
-            print >>f, "Id,Predicted"
-            for i in xrange(self._n_samples):
-                for j in xrange(self._prediction_size):
-                    print >>f, "%i_%i,%f" % (i+1, j+1, self._data[i,j])
+        # format string of all values of one sample, the sample
+        # id is filled in by text replacement, which is much
+        # cheaper than formatting it for every value
+        sample_format = ''.join('#_%i,%%f\n' % (j + 1)
+                                for j in xrange(self._prediction_size))
+        with self._open() as f:
+            f.write("Id,Predicted\n")
+            for start in xrange(0, self._n_samples, self._block_rows):
+                block = np.asarray(self._data[start:start + self._block_rows],
+                                   dtype=np.float64)
+                block_format = ''.join([sample_format.replace('#', str(i + 1))
+                                        for i in xrange(start, start + block.shape[0])])
+                f.write(block_format % tuple(block.ravel().tolist()))
 
         return True
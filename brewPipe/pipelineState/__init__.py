@@ -1,17 +1,46 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from state import PipelineState
+from state import PipelineState, StateStore
+from backend import StateBackend, PickleBackend, AppendLogBackend
+from lock import FileLock
+from artifacts import ArtifactStore
+from fingerprint import Fingerprinter
+from ..data import BrewPipeDataFrame, frame_schema
+from ..trace import get_tracer
 
 __author__ = 'Dominik Meyer <meyerd@mytum.de>'
 
 
+class _TracedStage(type):
+    """
+    Metaclass recording the calls of the stage methods named in
+    `_traced_methods` as spans of the tracer.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        methods = namespace.get('_traced_methods')
+        if methods is None:
+            methods = getattr(bases[0], '_traced_methods', ())
+        for method in methods:
+            if callable(namespace.get(method)):
+                namespace[method] = get_tracer().traced(
+                    name + '.' + method, 'stage')(namespace[method])
+        return super(_TracedStage, mcs).__new__(mcs, name, bases, namespace)
+
+
 class PipelineStateInterface(object):
     """
     The actual pipeline state interface definition. If you
     implement any stage object, then inherit from this class
     and you can easily save and load pipeline parameters.
+    The calls of the usual stage methods are traced (see
+    `brewPipe.trace`), further parts can be traced with `trace`.
     """
+    __metaclass__ = _TracedStage
+
+    _traced_methods = ('preprocess', 'set_data', 'run', 'apply_model',
+                       'partial_fit', 'write')
 
     def __init__(self):
         self._ps = PipelineState()
@@ -36,3 +65,65 @@ class PipelineStateInterface(object):
             '##' + descriptor
         return self._ps[stage_descriptor]
 
+    def update(self, descriptor, func):
+        """
+        Atomically replace a stored value by `func(old_value)`,
+        also with respect to other processes using the same
+        pipeline state.
+        """
+        stage_descriptor = str(self.__class__.__name__) + \
+            '##' + descriptor
+        return self._ps.update(stage_descriptor, func)
+
+    def artifact_key(self, params=None, upstream=None):
+        """
+        Build the key of an intermediate artifact of this stage
+        in the `ArtifactStore` from the stage parameters and the
+        hashes of the upstream data.
+        """
+        return ArtifactStore.make_key(str(self.__class__.__name__),
+                                      params, upstream)
+
+    def lazy_frame(self, name, hash, callback, columns=None):
+        """
+        Create a lazy BrewPipeDataFrame, whose schema (shape, dtype,
+        size and column names) is recorded in the pipeline state,
+        when it is evaluated. Later frames with the same name and
+        hash know their schema without being evaluated.
+        :param columns: Optional function returning the column
+            names, called when the frame is evaluated.
+        """
+        descriptor = name + '##schema'
+
+        def cb(n):
+            value = callback(n)
+            schema = frame_schema(value, hash,
+                                  columns() if columns is not None else None)
+            if schema is not None:
+                r._schema = schema
+                if self.get(descriptor) != schema:
+                    self.put(descriptor, schema)
+            return value
+
+        schema = self.get(descriptor)
+        if schema is not None and schema.get('hash') != hash:
+            schema = None
+        r = BrewPipeDataFrame(name, lazy_frame=True, hash=hash, callback=cb,
+                              schema=schema)
+        return r
+
+    def trace(self, name, **args):
+        """
+        Context manager recording the enclosed code as a span
+        named after the stage and `name`.
+        """
+        return get_tracer().span(str(self.__class__.__name__) + '.' + name,
+                                 'stage', **args)
+
+    def transaction(self):
+        """
+        Context manager to batch several `put` calls into a
+        single write of the pipeline state.
+        """
+        return self._ps.transaction()
+
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import shutil
+import time
+import uuid
+from state import StateStore
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def _file_digest(filename, blocksize=1 << 20):
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        while True:
+            block = f.read(blocksize)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+class ArtifactStore(object):
+    """
+    Content addressed store for the intermediate files of all
+    pipeline stages in one intermediate directory.
+
+    Artifacts are looked up by a key built from the stage class,
+    the stage parameters and the hashes of the upstream data (see
+    `make_key`), so every combination of parameters keeps its own
+    version. The files themselves are stored under the digest of
+    their content, so identical outputs are only stored once.
+    The index is kept in `artifacts.index` next to the files and
+    remembers when each artifact was used last, which is used to
+    evict the least recently used artifacts once the store grows
+    beyond its size limit.
+    """
+
+    _config_key = '__config__'
+    _tmp_max_age = 24 * 60 * 60
+
+    def __init__(self, directory="intermediates", max_bytes=None):
+        """
+        :param directory: The intermediate directory.
+        :param max_bytes: Size limit of the store in bytes. If
+            None, the limit stored with `set_max_bytes` is used.
+            Without any limit nothing is evicted automatically.
+        """
+        self._directory = directory
+        self._objects_directory = os.path.join(directory, 'objects')
+        self._tmp_directory = os.path.join(directory, 'tmp')
+        for d in (self._objects_directory, self._tmp_directory):
+            if not os.path.isdir(d):
+                try:
+                    os.makedirs(d)
+                except OSError:
+                    # created concurrently by another process
+                    if not os.path.isdir(d):
+                        raise
+        self._index = StateStore(os.path.join(directory, 'artifacts.index'))
+        self._max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(stage, params=None, upstream=None):
+        """
+        Build the key of an artifact.
+        :param stage: Name of the stage producing the artifact,
+            usually the class name.
+        :param params: Dictionary of the parameters of the stage,
+            that have an influence on the artifact.
+        :param upstream: List of the hashes of the input data.
+        :return: hex digest identifying the artifact.
+        """
+        params = sorted((params or {}).items())
+        upstream = list(upstream or [])
+        return hashlib.sha1(repr((stage, params, upstream))).hexdigest()
+
+    @property
+    def max_bytes(self):
+        if self._max_bytes is not None:
+            return self._max_bytes
+        config = self._index[self._config_key] or {}
+        return config.get('max_bytes')
+
+    def set_max_bytes(self, max_bytes):
+        """
+        Persist the size limit of the store in its index, so it
+        is applied by every user of the intermediate directory.
+        """
+        self._index[self._config_key] = {'max_bytes': max_bytes}
+
+    def _object_path(self, entry):
+        return os.path.join(self._objects_directory, entry['object'])
+
+    def path(self, key):
+        """
+        :return: path of the file stored under `key` or None if
+            there is no such artifact. The artifact is marked as
+            used.
+        """
+        with self._index.transaction():
+            entry = self._index[key]
+            if entry is None:
+                return None
+            if not os.path.exists(self._object_path(entry)):
+                del self._index[key]
+                return None
+            entry = dict(entry)
+            entry['atime'] = time.time()
+            self._index[key] = entry
+        return self._object_path(entry)
+
+    def new_path(self, suffix=''):
+        """
+        :return: a unique temporary path inside the store, where
+            a stage can write an artifact to before it is added
+            to the store with `commit`.
+        """
+        return os.path.join(self._tmp_directory, uuid.uuid4().hex + suffix)
+
+    def commit(self, key, tmp_path, stage=None, keep=()):
+        """
+        Move the file `tmp_path` into the store and register it
+        under `key`. If the same content is already stored, the
+        existing file is re-used.
+        :param stage: optional description shown by `ls`.
+        :param keep: keys of further artifacts, which must not be
+            evicted by this commit, e.g. the other parts of a result
+            stored in several files.
+        :return: the final path of the artifact.
+        """
+        suffix = os.path.splitext(tmp_path)[1]
+        obj = _file_digest(tmp_path) + suffix
+        obj_path = os.path.join(self._objects_directory, obj)
+        size = os.path.getsize(tmp_path)
+        with self._index.transaction():
+            if os.path.exists(obj_path):
+                os.remove(tmp_path)
+            else:
+                os.rename(tmp_path, obj_path)
+            now = time.time()
+            self._index[key] = {'object': obj,
+                                'size': size,
+                                'stage': stage,
+                                'ctime': now,
+                                'atime': now}
+        if self.max_bytes is not None:
+            # the caller is about to use the new artifact
+            self.gc(self.max_bytes, keep=[key] + list(keep))
+        return obj_path
+
+    def remove(self, key):
+        """
+        Remove the artifact `key` from the store. The file
+        is deleted, once no other artifact refers to it.
+        """
+        with self._index.transaction():
+            del self._index[key]
+            self._remove_unreferenced()
+
+    def entries(self):
+        """
+        :return: list of (key, entry) pairs of all artifacts,
+            ordered from the least to the most recently used one.
+        """
+        entries = [(k, v) for k, v in self._index.items()
+                   if k != self._config_key]
+        return sorted(entries, key=lambda kv: kv[1]['atime'])
+
+    def disk_usage(self):
+        """
+        :return: number of bytes occupied by the stored files.
+        """
+        objects = {}
+        for _, entry in self.entries():
+            objects[entry['object']] = entry['size']
+        return sum(objects.values())
+
+    def _remove_unreferenced(self):
+        referenced = set(e['object'] for _, e in self.entries())
+        for obj in os.listdir(self._objects_directory):
+            if obj not in referenced:
+                os.remove(os.path.join(self._objects_directory, obj))
+        now = time.time()
+        for tmp in os.listdir(self._tmp_directory):
+            tmp_path = os.path.join(self._tmp_directory, tmp)
+            if now - os.path.getmtime(tmp_path) > self._tmp_max_age:
+                if os.path.isdir(tmp_path):
+                    shutil.rmtree(tmp_path)
+                else:
+                    os.remove(tmp_path)
+
+    def gc(self, max_bytes=None, keep=()):
+        """
+        Delete unreferenced and left over temporary files and
+        evict the least recently used artifacts until the store
+        is not larger than `max_bytes`.
+        :param keep: keys of artifacts, which are never evicted,
+            even if the store stays larger than `max_bytes`.
+        :return: list of the keys of the evicted artifacts.
+        """
+        evicted = []
+        with self._index.transaction():
+            if max_bytes is not None:
+                entries = self.entries()
+                kept = [(k, e) for k, e in entries if k in keep]
+                candidates = [(k, e) for k, e in entries if k not in keep]
+                usage = self.disk_usage()
+                while candidates and usage > max_bytes:
+                    key, entry = candidates.pop(0)
+                    del self._index[key]
+                    evicted.append(key)
+                    if all(e['object'] != entry['object']
+                           for _, e in candidates + kept):
+                        usage -= entry['size']
+            self._remove_unreferenced()
+        return evicted
@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import cPickle as pickle
+import os
+import pickletools
+import uuid
+import warnings
+from lock import FileLock
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def _atomic_dump(objs, filename):
+    """
+    Pickle all `objs` to a temporary file next to `filename` and
+    rename it over the original afterwards, so that a crash
+    while writing never leaves a half written state file behind.
+    """
+    tmpname = filename + '.tmp'
+    with open(tmpname, 'wb') as f:
+        for obj in objs:
+            pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmpname, filename)
+
+
+def _stat_signature(filename):
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime
+
+
+class StateBackend(object):
+    """
+    Interface of the storage backends of the pipeline state.
+    The pipeline state keeps the whole state in memory and hands
+    every change to the backend as a list of records, which are
+    either ('set', key, value) or ('del', key) tuples.
+
+    Several processes may use the same state file. They have to
+    hold `lock()` while accessing it and call `refresh()` to pick
+    up the changes of the other processes before reading or
+    modifying the state.
+    """
+
+    def __init__(self, state_file):
+        self._state_file = state_file
+        self.lock = FileLock(state_file + '.lock')
+
+    def load(self):
+        """
+        :return: the persisted state as dictionary.
+        """
+        raise NotImplementedError()
+
+    def refresh(self, state):
+        """
+        Update `state` in place with the changes other processes
+        made to the persisted state since the last load, refresh
+        or write.
+        """
+        raise NotImplementedError()
+
+    def write(self, records, state):
+        """
+        Persist a batch of changes.
+        :param records: list of change records in the order
+            they were applied to `state`.
+        :param state: the complete state after the changes.
+        """
+        raise NotImplementedError()
+
+
+class PickleBackend(StateBackend):
+    """
+    The original storage format: the whole state dictionary is
+    re-pickled on every change. Only feasible for small states.
+    """
+
+    def __init__(self, state_file):
+        super(PickleBackend, self).__init__(state_file)
+        self._signature = None
+
+    def load(self):
+        self._signature = _stat_signature(self._state_file)
+        if self._signature is None:
+            return {}
+        with open(self._state_file, 'rb') as f:
+            return pickle.load(f)
+
+    def refresh(self, state):
+        if _stat_signature(self._state_file) == self._signature:
+            return
+        new_state = self.load()
+        state.clear()
+        state.update(new_state)
+
+    def write(self, records, state):
+        _atomic_dump([state], self._state_file)
+        self._signature = _stat_signature(self._state_file)
+
+
+class AppendLogBackend(StateBackend):
+    """
+    Append every change as a pickled record to the end of the
+    state file. From time to time, when the log has grown much
+    larger than the actual state, it is compacted into a single
+    snapshot record, which is written with an atomic rename.
+
+    Every log starts with a ('gen', token) record, which changes
+    on every compaction. This way other processes notice that
+    the log has been replaced, even if the file system re-uses
+    the inode number. A state file written by the PickleBackend
+    is just a log consisting of one snapshot and can be read
+    as well.
+
+    Only a record cut off by the end of the file is treated as the
+    remains of a crashed writer and overwritten. A complete record,
+    which can not be unpickled (e.g. an instance of a class only
+    defined in the __main__ module of another process), is skipped
+    and kept in the log, which is then not compacted anymore. Data,
+    which is not a valid pickle before the end of the file, raises
+    a RuntimeError.
+    """
+
+    def __init__(self, state_file, compact_ratio=4, compact_min_records=1000):
+        """
+        :param state_file: Path of the log file.
+        :param compact_ratio: Compact the log once it contains
+            more than `compact_ratio` times as many records as
+            there are keys in the state.
+        :param compact_min_records: Never compact logs with fewer
+            records than that.
+        """
+        super(AppendLogBackend, self).__init__(state_file)
+        self._compact_ratio = compact_ratio
+        self._compact_min_records = compact_min_records
+        self._n_records = 0
+        self._offset = 0
+        self._generation = None
+        self._signature = None
+        # (offset, error) of the records, that could not be unpickled
+        self.undecodable = []
+
+    @staticmethod
+    def _apply(state, record):
+        if isinstance(record, dict):
+            state.clear()
+            state.update(record)
+        elif record[0] == 'set':
+            state[record[1]] = record[2]
+        elif record[0] == 'del':
+            state.pop(record[1], None)
+
+    @staticmethod
+    def _read_generation(f):
+        try:
+            record = pickle.load(f)
+        except Exception:
+            return None
+        if isinstance(record, tuple) and record[0] == 'gen':
+            return record[1]
+        return None
+
+    @staticmethod
+    def _record_end(f, size):
+        """
+        Find the end of the record starting at the position of `f`
+        by only parsing its opcodes, which works without the classes
+        of the pickled objects.
+        :return: the offset after the record or None, if the file
+            ends before the record is complete.
+        """
+        start = f.tell()
+        try:
+            for _ in pickletools.genops(f):
+                pass
+        except ValueError:
+            if f.tell() >= size:
+                return None
+            raise RuntimeError("the state file %s is corrupt at offset %i"
+                               % (f.name, start))
+        return f.tell()
+
+    def _read_records(self, state):
+        """
+        Apply all complete records after the current offset
+        to `state`. A partially written record at the end
+        is ignored and will be overwritten by the next write.
+        """
+        size = os.path.getsize(self._state_file)
+        with open(self._state_file, 'rb') as f:
+            if self._offset == 0:
+                self._generation = self._read_generation(f)
+                f.seek(0)
+            f.seek(self._offset)
+            while self._offset < size:
+                try:
+                    record = pickle.load(f)
+                except Exception as e:
+                    f.seek(self._offset)
+                    end = self._record_end(f, size)
+                    if end is None:
+                        # partially written by a crashed writer
+                        break
+                    self.undecodable.append((self._offset, repr(e)))
+                    warnings.warn("skipping the record at offset %i of the "
+                                  "state file %s, which can not be "
+                                  "unpickled: %r" % (self._offset,
+                                                     self._state_file, e))
+                    self._n_records += 1
+                    self._offset = end
+                    f.seek(end)
+                    continue
+                self._apply(state, record)
+                self._n_records += 1
+                self._offset = f.tell()
+        self._signature = _stat_signature(self._state_file)
+
+    def load(self):
+        state = {}
+        self._n_records = 0
+        self._offset = 0
+        self._generation = None
+        self._signature = None
+        self.undecodable = []
+        if os.path.isfile(self._state_file):
+            self._read_records(state)
+        return state
+
+    def _is_replaced(self, signature):
+        if signature[1] < self._offset:
+            return True
+        with open(self._state_file, 'rb') as f:
+            return self._read_generation(f) != self._generation
+
+    def refresh(self, state):
+        signature = _stat_signature(self._state_file)
+        if signature == self._signature:
+            return
+        if signature is None or self._is_replaced(signature):
+            # the log was compacted or removed by another process
+            new_state = self.load()
+            state.clear()
+            state.update(new_state)
+        else:
+            self._read_records(state)
+
+    def write(self, records, state):
+        with open(self._state_file, 'ab') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size != self._offset:
+                with open(self._state_file, 'rb') as tail:
+                    tail.seek(self._offset)
+                    if self._record_end(tail, size) is not None:
+                        raise RuntimeError("the state file %s has records "
+                                           "after offset %i, which were not "
+                                           "read" % (self._state_file,
+                                                     self._offset))
+                # drop the remains of a crashed writer
+                f.truncate(self._offset)
+                f.seek(self._offset)
+            if self._offset == 0:
+                self._generation = uuid.uuid4().hex
+                pickle.dump(('gen', self._generation), f,
+                            pickle.HIGHEST_PROTOCOL)
+            for record in records:
+                pickle.dump(record, f, pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            self._offset = f.tell()
+        self._signature = _stat_signature(self._state_file)
+        self._n_records += len(records)
+        # a snapshot would drop the records, that could not be read
+        if not self.undecodable and \
+                self._n_records > self._compact_min_records and \
+                self._n_records > self._compact_ratio * len(state):
+            self.compact(state)
+
+    def compact(self, state):
+        """
+        Replace the log by a single snapshot of `state`.
+        """
+        generation = uuid.uuid4().hex
+        _atomic_dump([('gen', generation), dict(state)], self._state_file)
+        self._generation = generation
+        self._n_records = 1
+        self._offset = os.path.getsize(self._state_file)
+        self._signature = _stat_signature(self._state_file)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import threading
+from state import PipelineState, Singleton
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+# content hashes sample N_BLOCKS blocks of BLOCK_SIZE bytes evenly
+# spread over a file, smaller files are hashed completely
+BLOCK_SIZE = 1 << 16
+N_BLOCKS = 8
+
+
+def _new_hash():
+    if xxhash is not None:
+        return xxhash.xxh64()
+    return hashlib.sha1()
+
+
+class Fingerprinter(object):
+    """
+    Compute fingerprints of input files, which change whenever
+    the files change and are used as the hashes of the data
+    sources.
+
+    By default a file is identified by its size, modification
+    time and inode. Optionally a content hash over sampled blocks
+    of the file is used, which also detects files, that were
+    copied with preserved modification times. Content hashes are
+    remembered in the pipeline state together with the size,
+    modification time, inode and status change time of the file,
+    which can not be preserved by copying, so they are only
+    computed again if the file changed.
+
+    The fingerprint of a set of files is computed once per
+    process and then served from memory, until `invalidate`
+    is called.
+    """
+    __metaclass__ = Singleton
+
+    _descriptor_prefix = 'Fingerprinter##'
+
+    def __init__(self):
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def _content_digest(self, filename, size):
+        h = _new_hash()
+        h.update(str(size))
+        with open(filename, 'rb') as f:
+            if size <= BLOCK_SIZE * N_BLOCKS:
+                h.update(f.read())
+            else:
+                step = (size - BLOCK_SIZE) // (N_BLOCKS - 1)
+                for i in xrange(N_BLOCKS):
+                    f.seek(i * step)
+                    h.update(f.read(BLOCK_SIZE))
+        return h.hexdigest()
+
+    def file_digest(self, filename, content=False):
+        """
+        :return: the fingerprint of a single file.
+        """
+        st = os.stat(filename)
+        if not content:
+            return '%i-%r-%i' % (st.st_size, st.st_mtime, st.st_ino)
+        signature = (st.st_size, st.st_mtime, st.st_ino, st.st_ctime)
+        descriptor = self._descriptor_prefix + os.path.abspath(filename)
+        ps = PipelineState()
+        cached = ps[descriptor]
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        digest = self._content_digest(filename, st.st_size)
+        ps[descriptor] = (signature, digest)
+        return digest
+
+    def fingerprint(self, filenames, content=False):
+        """
+        :param filenames: list of the input files.
+        :param content: Use content hashes instead of the file
+            metadata.
+        :return: hex digest over all files.
+        """
+        key = (tuple(filenames), content)
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+        h = hashlib.sha1()
+        with PipelineState().transaction():
+            for filename in filenames:
+                h.update(filename)
+                h.update(self.file_digest(filename, content))
+        digest = h.hexdigest()
+        with self._lock:
+            self._memo[key] = digest
+        return digest
+
+    def fingerprint_directory(self, directory, suffix='', extra_files=(),
+                              content=False):
+        """
+        Fingerprint all files in `directory` ending with `suffix`
+        and the `extra_files`. The directory is only listed once
+        per process.
+        """
+        key = (directory, suffix, tuple(extra_files), content)
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+        filenames = sorted(os.path.join(directory, f)
+                           for f in os.listdir(directory) if f.endswith(suffix))
+        digest = self.fingerprint(filenames + list(extra_files), content)
+        with self._lock:
+            self._memo[key] = digest
+        return digest
+
+    def invalidate(self):
+        """
+        Forget all fingerprints computed by this process, so
+        changes to the files are picked up.
+        """
+        with self._lock:
+            self._memo.clear()
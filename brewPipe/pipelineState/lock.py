@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+class FileLock(object):
+    """
+    Re-entrant advisory lock on a lock file, which is used to
+    synchronize several processes accessing the same files.
+    Threads of the same process are serialized as well. On
+    platforms without `fcntl` only the threads are synchronized.
+    """
+
+    def __init__(self, lock_file):
+        self._lock_file = lock_file
+        self._fd = None
+        self._count = 0
+        self._exclusive = False
+        self._owner_pid = None
+        self._thread_lock = threading.RLock()
+
+    def _acquire(self, shared):
+        if self._owner_pid != os.getpid():
+            # the lock was inherited by a forked child, which
+            # has to open its own file descriptor
+            self._fd = None
+            self._count = 0
+            self._owner_pid = os.getpid()
+        if self._count > 0:
+            if not shared and not self._exclusive:
+                raise RuntimeError("cannot upgrade a shared lock on '%s'" %
+                                   self._lock_file)
+            self._count += 1
+            return
+        if fcntl is not None:
+            self._fd = os.open(self._lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        self._exclusive = not shared
+        self._count = 1
+
+    def _release(self):
+        self._count -= 1
+        if self._count > 0:
+            return
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    @contextmanager
+    def __call__(self, shared=False):
+        """
+        :param shared: Acquire a shared (read) lock instead
+            of an exclusive one.
+        """
+        with self._thread_lock:
+            self._acquire(shared)
+            try:
+                yield
+            finally:
+                self._release()
@@ -1,9 +1,9 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import cPickle as pickle
-import os
 import threading
+from contextlib import contextmanager
+from backend import AppendLogBackend
 
 __author__ = 'Dominik Meyer <meyerd@mytum.de>'
 
@@ -22,48 +22,99 @@ class Singleton(type):
         return cls._instances[cls]
 
 
-class PipelineState(object):
+class StateStore(object):
     """
-    Store and load the state of the whole pipeline to/from disk.
-    This is essential in order to not pre-process the input data
-    data every time the pipeline is run.
+    Dictionary like store of pickleable values, which is persisted
+    to a state file on every change.
 
-    The idea is, that at every time a specific part e.g. the data
-    loader, which reads the input files and stores the data into
-    pandas dataframes, finishes and persists the data to the disk,
-    the location and type of data is added to the pipeline state.
-    Subsequent runs then can skip the parts that are already finished.
+    How the state is written to the disk is up to the backend
+    (see `backend.py`). By default every change is appended to
+    a log file, which is compacted from time to time.
+
+    Several processes can share the same state file. Every access
+    takes a lock on the state file and first reads the changes of
+    the other processes, so no entries are lost.
     """
-    __metaclass__ = Singleton
 
-    def __init__(self, state_file='pipelinestate.pickle'):
+    def __init__(self, state_file, backend=None):
+        """
+        :param state_file: Path of the state file.
+        :param backend: A `StateBackend` instance. Defaults to an
+            `AppendLogBackend` writing to `state_file`.
+        """
         self._state_file = state_file
-        self._state = self._load_state()
-        self._lock = threading.Lock()
-
-    def _load_state(self):
-        if not os.path.isfile(self._state_file):
-            return {}
-        with open(self._state_file, 'r') as f:
-            return pickle.load(f)
-
-    def _save_state(self):
-        with open(self._state_file, 'w') as f:
-            pickle.dump(self._state, f)
+        if backend is None:
+            backend = AppendLogBackend(state_file)
+        self._backend = backend
+        self._lock = threading.RLock()
+        with self._backend.lock():
+            self._state = self._backend.load()
+        self._pending = None
+
+    @contextmanager
+    def _synchronized(self, shared=False):
+        with self._lock:
+            with self._backend.lock(shared=shared):
+                self._backend.refresh(self._state)
+                yield
+
+    def _write(self, record):
+        if self._pending is not None:
+            self._pending.append(record)
+        else:
+            self._backend.write([record], self._state)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Batch all changes done inside the `with` block and write
+        them to the backend at once when the block is left. The
+        state is locked for other threads during the transaction.
+        Transactions can be nested, only the outermost one writes.
+        Other processes are locked out of the state file as well.
+        """
+        with self._synchronized():
+            outermost = self._pending is None
+            if outermost:
+                self._pending = []
+            try:
+                yield self
+            finally:
+                if outermost:
+                    # changes are already applied to the in-memory
+                    # state, so they are persisted even on errors
+                    records, self._pending = self._pending, None
+                    if records:
+                        self._backend.write(records, self._state)
 
     def __setitem__(self, stage, value):
         """
         Put a stage descriptor into the pipeline state file.
-        The pickle file is written right after the element is
-        set. Since PipelineState is a singleton object, we have
-        to take care for parallelism and locking.
+        The change is written right after the element is set
+        (or at the end of the current transaction). Since
+        PipelineState is a singleton object, we have to take
+        care for parallelism and locking.
         """
-        with self._lock:
+        with self._synchronized():
+            self._state[stage] = value
+            self._write(('set', stage, value))
+
+    def update(self, stage, func):
+        """
+        Atomically replace the value of a stage descriptor by
+        `func(old_value)`, where `old_value` is None if nothing is
+        stored yet. No other thread or process can modify the
+        state in between reading and writing the value.
+        :return: the new value
+        """
+        with self._synchronized():
+            value = func(self._state.get(stage))
             self._state[stage] = value
-            self._save_state()
+            self._write(('set', stage, value))
+            return value
 
     def __getitem__(self, stage):
-        with self._lock:
+        with self._synchronized(shared=True):
             rval = None
             try:
                 rval = self._state[stage]
@@ -76,19 +127,43 @@ class PipelineState(object):
         return None
 
     def __delitem__(self, stage):
-        with self._lock:
-            try:
+        with self._synchronized():
+            if stage in self._state:
                 del self._state[stage]
-            except KeyError:
-                pass
+                self._write(('del', stage))
+
+    def items(self):
+        """
+        :return: list of all (stage, value) pairs.
+        """
+        with self._synchronized(shared=True):
+            return list(self._state.items())
 
     def __len__(self):
-        with self._lock:
+        with self._synchronized(shared=True):
             return len(self._state)
 
     def __contains__(self, stage):
-        with self._lock:
+        with self._synchronized(shared=True):
             rval = False
             if stage in self._state:
                 rval = True
             return rval
+
+
+class PipelineState(StateStore):
+    """
+    Store and load the state of the whole pipeline to/from disk.
+    This is essential in order to not pre-process the input data
+    data every time the pipeline is run.
+
+    The idea is, that at every time a specific part e.g. the data
+    loader, which reads the input files and stores the data into
+    pandas dataframes, finishes and persists the data to the disk,
+    the location and type of data is added to the pipeline state.
+    Subsequent runs then can skip the parts that are already finished.
+    """
+    __metaclass__ = Singleton
+
+    def __init__(self, state_file='pipelinestate.pickle', backend=None):
+        super(PipelineState, self).__init__(state_file, backend=backend)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+_edge_policies = ('nearest', 'zero', 'nan')
+
+
+def interpolate_rows(data, edges='nearest', chunk_rows=8192):
+    """
+    Linearly interpolate the missing (NaN) values of every row of
+    a 2D matrix, e.g. of time series with one series per row.
+    All rows are processed at once in blocks of `chunk_rows` rows.
+    Instead of scanning every row, the runs of consecutive missing
+    values are located, so the work after the NaN detection only
+    depends on the number of missing values.
+    :param data: 2D matrix, which is not modified.
+    :param edges: What to do with leading and trailing missing
+        values, which have no valid value on one side. 'nearest'
+        repeats the first or last valid value (like `numpy.interp`),
+        'zero' sets them to zero and 'nan' leaves them missing.
+        Rows without any valid value are set to zero, unless
+        'nan' is given.
+    :param chunk_rows: Number of rows processed at once.
+    :return: a new matrix with the interpolated values.
+    """
+    if edges not in _edge_policies:
+        raise RuntimeError("incorrect edges policy given: %s" % (edges))
+    data = np.asarray(data)
+    dtype = data.dtype if data.dtype.kind == 'f' else np.float64
+    out = np.array(data, dtype=dtype)
+    n_cols = out.shape[1]
+
+    for start in xrange(0, out.shape[0], chunk_rows):
+        block = out[start:start + chunk_rows]
+        rows, nan_cols = np.nonzero(np.isnan(block))
+        if len(rows) == 0:
+            continue
+        # split the missing cells into runs of consecutive columns
+        # in the same row, the neighbours of a run are its previous
+        # and next valid value
+        run_start = np.ones(len(rows), dtype=bool)
+        run_start[1:] = (rows[1:] != rows[:-1]) | \
+            (nan_cols[1:] != nan_cols[:-1] + 1)
+        run_end = np.ones(len(rows), dtype=bool)
+        run_end[:-1] = run_start[1:]
+        run = np.cumsum(run_start) - 1
+        prev = (nan_cols[run_start] - 1)[run]
+        nxt = (nan_cols[run_end] + 1)[run]
+        has_prev = prev >= 0
+        has_next = nxt < n_cols
+        prev_val = block[rows, np.maximum(prev, 0)]
+        next_val = block[rows, np.minimum(nxt, n_cols - 1)]
+
+        values = np.zeros(len(rows), dtype=dtype)
+        inner = has_prev & has_next
+        weight = (nan_cols[inner] - prev[inner]) / \
+            (nxt[inner] - prev[inner]).astype(dtype)
+        values[inner] = prev_val[inner] + \
+            (next_val[inner] - prev_val[inner]) * weight
+        if edges == 'nearest':
+            leading = ~has_prev & has_next
+            trailing = has_prev & ~has_next
+            values[leading] = next_val[leading]
+            values[trailing] = prev_val[trailing]
+        elif edges == 'nan':
+            values[~inner] = np.nan
+        block[rows, nan_cols] = values
+    return out
@@ -2,9 +2,12 @@
 # -*- coding: utf-8 -*-
 
 import os
+import threading
+import weakref
 import numpy as np
-from ..pipelineState import PipelineStateInterface
+from ..pipelineState import PipelineStateInterface, ArtifactStore
 from ..data import BrewPipeDataFrame
+from ..dtypes import get_dtype_policy
 
 __author__ = 'Dominik Meyer <meyerd@mytum.de>'
 
@@ -17,57 +20,88 @@ class NumpyNullPreprocessor(PipelineStateInterface):
     just a testcase to get some interface definitions going.
     """
 
-    def __init__(self, intermediate_directory="intermediates"):
+    # arrays loaded by any instance, so that several consumers
+    # of the same intermediate share a single copy
+    _loaded = weakref.WeakValueDictionary()
+    _loaded_lock = threading.Lock()
+
+    def __init__(self, intermediate_directory="intermediates", mmap_mode=None):
         """
         :param intermediate_directory: Directory, where the
             intermediate pandas dataframe should be persisted
             to.
+        :param mmap_mode: If set (e.g. to 'r'), the intermediates
+            are memory-mapped instead of being read into memory.
+            Cache hits are then nearly free, the pages are shared
+            with other processes through the page cache and the
+            data is only read from the disk, when it is accessed.
+            See `numpy.load` for the possible modes.
+
+        Floating point data is persisted and returned in the dtype
+        the dtype policy (see `brewPipe.dtypes`) gives for the name
+        of the input frame.
         """
         super(NumpyNullPreprocessor, self).__init__()
 
         self._intermediate_directory = intermediate_directory
-        self._cached = False
-        self._cached_object = None
+        self._store = ArtifactStore(self._intermediate_directory)
+        self._mmap_mode = mmap_mode
 
-    def _persist_numpy(self, arr, name):
-        filename = os.path.join(self._intermediate_directory,
-                                'NumpyNullPreprocessor' + name)
-        with open(filename, 'w') as f:
+    def _key(self, dataframe, policy):
+        return self.artifact_key({'name': dataframe.name,
+                                  'dtype': policy.dtype(dataframe.name).str},
+                                 [dataframe.hash])
+
+    def _persist_numpy(self, arr, key):
+        filename = self._store.new_path('.npy')
+        with self.trace('save'), open(filename, 'wb') as f:
             np.save(f, arr)
-        return filename
+        return self._store.commit(key, filename, stage='NumpyNullPreprocessor')
 
-    def _load_numpy(self, name):
-        filename = os.path.join(self._intermediate_directory,
-                                'NumpyNullPreprocessor' + name)
-        with open(filename, 'r') as f:
+    def _load_numpy(self, filename):
+        if self._mmap_mode:
+            return np.load(filename, mmap_mode=self._mmap_mode)
+        with self.trace('load'), open(filename, 'rb') as f:
             arr = np.load(f)
         return arr
 
     def preprocess(self, dataframe):
+        policy = get_dtype_policy()
+        if not dataframe.hash:
+            # frames without a hash (static data) can not be looked
+            # up in the store, they are preprocessed every time
+            def cb_unhashed(name):
+                obj = self
+                inp = dataframe
+                # preprocessing would happen here
+                return policy.cast(inp.name, inp.data)
+            return BrewPipeDataFrame(dataframe.name, lazy_frame=True,
+                                     hash=0, callback=cb_unhashed)
+
+        key = self._key(dataframe, policy)
+        loaded_key = (os.path.abspath(self._intermediate_directory), key,
+                      self._mmap_mode)
+
         def cb(name):
             obj = self
             inp = dataframe
-            h = obj.get(inp.name)
-            tmp = None
-            if not h or h != inp.hash:
+            with obj._loaded_lock:
+                tmp = obj._loaded.get(loaded_key)
+            if tmp is not None:
+                return tmp
+            filename = obj._store.path(key)
+            if filename is None:
                 org = inp.data
                 # preprocessing would happen here and be put to tmp
-                tmp = org
-                h = inp.hash
-                obj._persist_numpy(tmp, inp.name)
-                obj.put(inp.name, h)
+                tmp = policy.cast(inp.name, org)
+                filename = obj._persist_numpy(tmp, key)
+                if obj._mmap_mode:
+                    tmp = obj._load_numpy(filename)
             else:
-                if self._cached and self._cached == inp.hash:
-                    return self._cached_object
-                tmp = obj._load_numpy(inp.name)
-                self._cached_object = tmp
-                self._cached = inp.hash
+                tmp = obj._load_numpy(filename)
+            with obj._loaded_lock:
+                obj._loaded[loaded_key] = tmp
             return tmp
 
-        h = 0
-        if not self.get(dataframe.name) is None:
-            h = self.get(dataframe.name)
-        r = BrewPipeDataFrame(dataframe.name, lazy_frame=True, hash=h, callback=cb)
+        r = self.lazy_frame(dataframe.name, key, cb)
         return r
-
-
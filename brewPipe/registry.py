@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import importlib
+import threading
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+# name -> 'module:Class', the modules are only imported, when a
+# stage of them is looked up
+_stages = {
+    'winton': 'brewPipe.data.winton:WintonStockData',
+    'morse': 'brewPipe.data.morse:MorseData',
+    'numpy_null': 'brewPipe.preprocess.numpy_null:NumpyNullPreprocessor',
+    'numpy_leastsquares': 'brewPipe.models.numpy_leastsquares:NumpyLeastSquares',
+    'random_mean_variance': 'brewPipe.models.numpy_mean_variance:RandomMeanVariance',
+    'tf_leastsquares': 'brewPipe.models.tf_leastsquares:TensorflowLeastSquares',
+    'tf_lstm_intraday': 'brewPipe.models.tf_lstm_intraday:TensorflowLSTMIntraday',
+    'winton_output': 'brewPipe.output.winton:WintonStockDataOutput',
+}
+_lock = threading.Lock()
+
+
+def register_stage(name, path, overwrite=False):
+    """
+    Make a stage available under `name`.
+    :param path: 'module:Class' of the stage, e.g.
+        'mypackage.models:MyModel'. The module is not imported
+        until the stage is used.
+    :param overwrite: replace a stage already registered under
+        `name`.
+    """
+    if ':' not in path:
+        raise RuntimeError("stage path '%s' is not of the form 'module:Class'"
+                           % path)
+    with _lock:
+        if name in _stages and not overwrite and _stages[name] != path:
+            raise RuntimeError("stage '%s' is already registered as '%s'"
+                               % (name, _stages[name]))
+        _stages[name] = path
+
+
+def stage_names():
+    """
+    :return: sorted list of the registered stage names.
+    """
+    with _lock:
+        return sorted(_stages)
+
+
+def stage_path(name):
+    """
+    :return: 'module:Class' of the stage registered under `name`.
+    """
+    with _lock:
+        if name not in _stages:
+            raise RuntimeError("unknown stage '%s', registered are: %s"
+                               % (name, ', '.join(sorted(_stages))))
+        return _stages[name]
+
+
+def stage_class(name):
+    """
+    Import the module of the stage `name`.
+    :return: the class of the stage.
+    """
+    module, cls = stage_path(name).split(':', 1)
+    return getattr(importlib.import_module(module), cls)
+
+
+def create_stage(name, *args, **kwargs):
+    """
+    :return: a new instance of the stage `name`, constructed with
+        the given arguments.
+    """
+    return stage_class(name)(*args, **kwargs)
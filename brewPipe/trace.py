@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import atexit
+import functools
+import json
+import os
+import resource
+import thread
+import threading
+import time
+from contextlib import contextmanager
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def io_counters():
+    """
+    :return: (bytes read, bytes written) by the process, including
+        reads served from the page cache, or (0, 0) where
+        /proc/self/io is not available.
+    """
+    try:
+        with open('/proc/self/io') as f:
+            counters = dict(line.split(':') for line in f)
+        return int(counters['rchar']), int(counters['wchar'])
+    except (IOError, KeyError, ValueError):
+        return 0, 0
+
+
+def _cpu_time():
+    t = os.times()
+    return t[0] + t[1]
+
+
+def peak_rss():
+    """
+    :return: the peak resident memory of the process in bytes.
+    """
+    # kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Tracer(object):
+    """
+    Collects timing and resource usage of the pipeline stages.
+
+    Tracing is off by default and then costs next to nothing. When
+    enabled, every span records its wall and CPU time, the bytes
+    read and written by the process, the growth of the peak resident
+    memory and further arguments such as cache hits. The spans can
+    be written as a structured log (one JSON object per line) while
+    they are recorded and exported as a Chrome trace, which can be
+    inspected on a timeline with chrome://tracing or Perfetto.
+    Spans of stages running in other processes are not recorded.
+
+    Setting the environment variable BREWPIPE_TRACE to a filename
+    enables tracing at import and exports the trace at exit.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self._log = None
+        self._lock = threading.Lock()
+        self._threads = {}
+        self._start = time.time()
+
+    def enable(self, log_file=None):
+        """
+        Start recording spans.
+        :param log_file: optional filename the spans are appended
+            to as JSON lines.
+        """
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+            self._log = open(log_file, 'a') if log_file else None
+            self.enabled = True
+
+    def disable(self):
+        with self._lock:
+            self.enabled = False
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    def clear(self):
+        """
+        Drop the recorded spans.
+        """
+        with self._lock:
+            self.events = []
+
+    def _tid(self):
+        ident = thread.get_ident()
+        if ident not in self._threads:
+            self._threads[ident] = len(self._threads)
+        return self._threads[ident]
+
+    def _record(self, event):
+        with self._lock:
+            event['tid'] = self._tid()
+            self.events.append(event)
+            if self._log is not None:
+                self._log.write(json.dumps(event) + '\n')
+                self._log.flush()
+
+    @contextmanager
+    def span(self, name, category='stage', **args):
+        """
+        Context manager recording the enclosed code as a span.
+        Arguments are stored with the span; the `args` dictionary
+        yielded can be used to add more while it runs.
+        """
+        if not self.enabled:
+            yield args
+            return
+        start = time.time()
+        cpu = _cpu_time()
+        read, written = io_counters()
+        rss = peak_rss()
+        try:
+            yield args
+        finally:
+            end_read, end_written = io_counters()
+            args.update({'cpu_time': _cpu_time() - cpu,
+                         'bytes_read': end_read - read,
+                         'bytes_written': end_written - written,
+                         'peak_rss_delta': peak_rss() - rss})
+            self._record({'name': name,
+                          'cat': category,
+                          'start': start - self._start,
+                          'duration': time.time() - start,
+                          'pid': os.getpid(),
+                          'args': args})
+
+    def instant(self, name, category='stage', **args):
+        """
+        Record an event without duration, e.g. a cache hit.
+        """
+        if not self.enabled:
+            return
+        self._record({'name': name,
+                      'cat': category,
+                      'start': time.time() - self._start,
+                      'duration': None,
+                      'pid': os.getpid(),
+                      'args': args})
+
+    def traced(self, name, category='stage'):
+        """
+        Decorator recording every call of the function as a span.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.span(name, category):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self):
+        """
+        :return: dictionary of the span names with the number of
+            calls and the summed wall time, CPU time and bytes.
+        """
+        result = {}
+        for e in list(self.events):
+            if e['duration'] is None:
+                continue
+            s = result.setdefault(e['name'], {'calls': 0, 'wall_time': 0.0,
+                                              'cpu_time': 0.0, 'bytes_read': 0,
+                                              'bytes_written': 0})
+            s['calls'] += 1
+            s['wall_time'] += e['duration']
+            for k in ('cpu_time', 'bytes_read', 'bytes_written'):
+                s[k] += e['args'].get(k, 0)
+        return result
+
+    def export_chrome_trace(self, filename):
+        """
+        Write the recorded spans in the Chrome trace event format.
+        """
+        trace_events = []
+        for e in list(self.events):
+            event = {'name': e['name'],
+                     'cat': e['cat'],
+                     'ts': e['start'] * 1e6,
+                     'pid': e['pid'],
+                     'tid': e['tid'],
+                     'args': e['args']}
+            if e['duration'] is None:
+                event['ph'] = 'i'
+                event['s'] = 't'
+            else:
+                event['ph'] = 'X'
+                event['dur'] = e['duration'] * 1e6
+            trace_events.append(event)
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': trace_events,
+                       'displayTimeUnit': 'ms'}, f)
+
+
+_tracer = Tracer()
+
+
+def get_tracer():
+    """
+    :return: the tracer of the process.
+    """
+    return _tracer
+
+
+if os.environ.get('BREWPIPE_TRACE'):
+    _tracer.enable()
+    atexit.register(_tracer.export_chrome_trace,
+                    os.path.abspath(os.environ['BREWPIPE_TRACE']))
@@ -1,4 +1,5 @@
 #!/bin/bash
 
 rm pipelinestate.pickle
+rm -f pipelinestate.pickle.lock
 rm -r intermediates/*
@@ -6,34 +6,30 @@ import matplotlib.pyplot as plt
 import os
 from brewPipe.data.winton import WintonStockData
 from brewPipe.data import BrewPipeDataFrame
+from brewPipe.brewPipe import Pipeline
 from brewPipe.output.winton import WintonStockDataOutput
 from brewPipe.preprocess.numpy_null import NumpyNullPreprocessor
-from brewPipe.models.tf_leastsquares import TensorflowLeastSquares
+from brewPipe.models.numpy_leastsquares import NumpyLeastSquares
 
 
 __author__ = 'Dominik Meyer <meyerd@mytum.de>'
 
 
-if __name__ == '__main__':
-    winton_training = WintonStockData(data_directory=os.path.join("data", "winton"),
-                                      intermediate_directory="intermediates/",
-                                      data_source="train")
+def train(x, y):
+    # closed form solution, TensorflowLeastSquares would need
+    # about a million gradient descent steps
+    lsq = NumpyLeastSquares(x.shape[1], y.shape[1],
+                            solver='lstsq', silent=False)
+    lsq.set_data(x, y)
+    lsq.run()
+    return lsq
 
-    x = winton_training.intraday_2_120()
-    y = winton_training.intraday_120_180()
 
-    preproc_x = NumpyNullPreprocessor()
-    preproc_y = NumpyNullPreprocessor()
-    x = preproc_x.preprocess(x)
-    y = preproc_y.preprocess(y)
+def apply_model(lsq, x):
+    return lsq.apply_model(x)
 
-    lsq = TensorflowLeastSquares(x.data.shape[1], y.data.shape[1],
-                                 learn_rate=0.1, batch_size=1000,
-                                 silent=False)
-    lsq.set_data(x, y)
-    lsq.run(max_steps=1000000)
 
-    result = lsq.apply_model(x)
+def training_errors(result, y):
     errors = np.sum(np.abs(result.data - y.data), axis=1)
 
     # # plot
@@ -42,20 +38,10 @@ if __name__ == '__main__':
     # plt.xlabel("sample")
     # plt.ylabel("error")
     # plt.show()
+    return errors
 
-    winton_testing = WintonStockData(data_directory="data/", intermediate_directory="intermediates/",
-                                     data_source="test")
-
-    x1 = winton_testing.intraday_2_120()
-    x2 = winton_testing.returns_last_days()
-
-    preproc_x1 = NumpyNullPreprocessor()
-    preproc_x2 = NumpyNullPreprocessor()
-    x1 = preproc_x1.preprocess(x1)
-    x2 = preproc_x1.preprocess(x2)
 
-    # apply model to generate 121 - 180 data
-    y1 = lsq.apply_model(x1)
+def write_submission(y1, output_file):
     n_samples = y1.data.shape[0]
 
     # fill the rest of the data with zeros
@@ -65,7 +51,39 @@ if __name__ == '__main__':
     yframe = BrewPipeDataFrame('winton_output')
     yframe.data = y
 
-    out = WintonStockDataOutput(output_file="submission_winton.csv",
+    out = WintonStockDataOutput(output_file=output_file,
                                 overwrite=True)
     out.set_data(yframe)
-    out.write()
\ No newline at end of file
+    out.write()
+
+
+if __name__ == '__main__':
+    winton_training = WintonStockData(data_directory=os.path.join("data", "winton"),
+                                      intermediate_directory="intermediates/",
+                                      data_source="train")
+    winton_testing = WintonStockData(data_directory="data/", intermediate_directory="intermediates/",
+                                     data_source="test")
+
+    # the training and test data and their preprocessing are
+    # independent of each other and evaluated concurrently
+    p = Pipeline('leastsquares_winton', workers=4)
+    x = p.add('x', winton_training.intraday_2_120)
+    y = p.add('y', winton_training.intraday_120_180)
+    x = p.add('x_pre', NumpyNullPreprocessor().preprocess, x)
+    y = p.add('y_pre', NumpyNullPreprocessor().preprocess, y)
+
+    lsq = p.add('model', train, x, y)
+    errors = p.add('errors', training_errors,
+                   p.add('result', apply_model, lsq, x), y)
+
+    x1 = p.add('x1', winton_testing.intraday_2_120)
+    x1 = p.add('x1_pre', NumpyNullPreprocessor().preprocess, x1)
+
+    # apply model to generate 121 - 180 data
+    y1 = p.add('y1', apply_model, lsq, x1)
+    submission = p.add('submission', write_submission, y1,
+                       "submission_winton.csv", skip_unchanged=True)
+
+    # only (re-)train and write the submission, if the input data
+    # changed since the last run
+    p.run(submission)
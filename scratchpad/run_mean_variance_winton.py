@@ -1,10 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import numpy as np
 import os
 from brewPipe.data.winton import WintonStockData
-from brewPipe.data import BrewPipeDataFrame
 from brewPipe.output.winton import WintonStockDataOutput
 from brewPipe.models.numpy_mean_variance import RandomMeanVariance
 
@@ -17,17 +15,13 @@ if __name__ == '__main__':
                                       intermediate_directory="intermediates/",
                                       data_source="train")
 
-    x1 = winton_training.intraday_120_180()
-    x2 = winton_training.returns_next_days()
+    # both groups are adjacent, so this is a view without a copy
+    w_x_df = winton_training.columns('intraday_120_180', 'returns_next_days')
 
-    n_samples = x1.data.shape[0]
-    sample_size = x1.data.shape[1] + x2.data.shape[1]
-    whole_x = np.hstack([x1.data, x2.data])
+    n_samples = w_x_df.shape[0]
+    sample_size = w_x_df.shape[1]
 
-    w_x_df = BrewPipeDataFrame("Whole X Input")
-    w_x_df.data = whole_x
-
-    rmv = RandomMeanVariance(sample_size)
+    rmv = RandomMeanVariance(sample_size, silent=False)
     rmv.set_data(w_x_df)
     rmv.run()
 
@@ -14,8 +14,13 @@ config = {
     'author_email': '',
     'version': '0.1',
     'install_requires': ['nose'],
-    'packages': ['brewPipe'],
+    'packages': ['brewPipe', 'brewPipe.data', 'brewPipe.models',
+                 'brewPipe.output', 'brewPipe.pipelineState',
+                 'brewPipe.preprocess'],
     'scripts': [],
+    'entry_points': {
+        'console_scripts': ['brewpipe = brewPipe.cli:main'],
+    },
     'name': 'brewPipe'
 }
 
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from brewPipe.data.winton import WintonStockData
+from benchmarks.synthetic import make_winton_csv
+
+_cwd = None
+_tmpdir = None
+
+
+def setup():
+    # stages create the pipeline state and intermediates in the
+    # working directory, so run all tests in a scratch directory
+    global _cwd, _tmpdir
+    _cwd = os.getcwd()
+    _tmpdir = tempfile.mkdtemp()
+    os.chdir(_tmpdir)
+
+
+def teardown():
+    os.chdir(_cwd)
+    shutil.rmtree(_tmpdir)
+
+
+def winton_csv(directory='winton_data', n_rows=50):
+    """
+    Write a synthetic winton train.csv of `n_rows` rows to
+    `directory`, unless there is one already.
+    :return: `directory`
+    """
+    filename = os.path.join(directory, 'train.csv')
+    if not os.path.exists(filename):
+        make_winton_csv(filename, n_rows)
+    return directory
+
+
+def winton(intermediate_directory, intermediate_format='npy',
+           data_directory=None, **kwargs):
+    """
+    :return: a WintonStockData of the train.csv in `data_directory`,
+        by default the one written by `winton_csv`.
+    """
+    return WintonStockData(data_directory=data_directory or winton_csv(),
+                           intermediate_directory=intermediate_directory,
+                           data_source='train',
+                           intermediate_format=intermediate_format, **kwargs)
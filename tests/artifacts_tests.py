@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+from nose.tools import *
+import numpy as np
+from brewPipe.data import BrewPipeDataFrame
+from brewPipe.pipelineState import ArtifactStore
+from brewPipe.preprocess.numpy_null import NumpyNullPreprocessor
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+def _put(store, key, content):
+    tmp = store.new_path('.bin')
+    with open(tmp, 'wb') as f:
+        f.write(content)
+    return store.commit(key, tmp)
+
+
+def test_versions_and_deduplication():
+    store = ArtifactStore('artifacts_versions')
+    k1 = ArtifactStore.make_key('Stage', {'a': 1}, [42])
+    k2 = ArtifactStore.make_key('Stage', {'a': 2}, [42])
+    k3 = ArtifactStore.make_key('Other', {'a': 1}, [42])
+    assert_equal(len(set([k1, k2, k3])), 3)
+    p1 = _put(store, k1, 'x' * 100)
+    p2 = _put(store, k2, 'y' * 100)
+    p3 = _put(store, k3, 'x' * 100)
+    assert_not_equal(p1, p2)
+    assert_equal(p1, p3)
+    assert_equal(store.path(k2), p2)
+    assert_equal(store.disk_usage(), 200)
+    store.remove(k1)
+    assert_true(os.path.exists(p3))
+    assert_equal(store.path(k1), None)
+
+
+def test_lru_eviction():
+    store = ArtifactStore('artifacts_lru')
+    for i in xrange(3):
+        _put(store, 'k%d' % i, str(i) * 100)
+        time.sleep(0.01)
+    store.path('k0')
+    store.set_max_bytes(250)
+    _put(store, 'k3', '3' * 100)
+    assert_equal(sorted(k for k, _ in store.entries()), ['k0', 'k3'])
+    assert_equal(len(os.listdir(os.path.join('artifacts_lru', 'objects'))), 2)
+
+
+def test_commit_keeps_artifact_larger_than_limit():
+    store = ArtifactStore('artifacts_too_small')
+    _put(store, 'k0', '0' * 100)
+    store.set_max_bytes(50)
+    path = _put(store, 'k1', '1' * 100)
+    assert_true(os.path.exists(path))
+    assert_equal(store.path('k1'), path)
+    assert_equal([k for k, _ in store.entries()], ['k1'])
+
+    directory = 'artifacts_numpy_null_too_small'
+    ArtifactStore(directory).set_max_bytes(10)
+    inp = BrewPipeDataFrame('inp', lazy_frame=True, hash='inp',
+                            callback=lambda name: np.ones((5, 4)))
+    out = NumpyNullPreprocessor(directory, mmap_mode='r').preprocess(inp)
+    assert_equal(out.data.shape, (5, 4))
+
+
+def test_numpy_null_preprocessor_caches_in_store():
+    directory = 'artifacts_numpy_null'
+    data = np.arange(12.0).reshape(3, 4)
+    inp = BrewPipeDataFrame('inp', lazy_frame=True, hash='inp',
+                            callback=lambda name: data)
+    out = NumpyNullPreprocessor(directory).preprocess(inp)
+    assert_true(np.all(out.data == data))
+    inp = BrewPipeDataFrame('inp', lazy_frame=True, hash='inp',
+                            callback=lambda name: None)
+    out = NumpyNullPreprocessor(directory).preprocess(inp)
+    assert_equal(out.data.shape, (3, 4))
+
+
+def test_numpy_null_preprocessor_recomputes_static_frames():
+    directory = 'artifacts_numpy_null_static'
+    inp = BrewPipeDataFrame('inp')
+    inp.data = np.arange(12.0).reshape(3, 4)
+    out = NumpyNullPreprocessor(directory).preprocess(inp)
+    assert_true(np.all(out.data == inp.data))
+    # a different frame of the same name is not served from the store
+    inp = BrewPipeDataFrame('inp')
+    inp.data = np.zeros((2, 2))
+    out = NumpyNullPreprocessor(directory).preprocess(inp)
+    assert_true(np.all(out.data == inp.data))
+    assert_equal(out.data.shape, (2, 2))
+    assert_equal(ArtifactStore(directory).entries(), [])
+
+
+def test_numpy_null_preprocessor_mmap():
+    directory = 'artifacts_numpy_null_mmap'
+    inp = BrewPipeDataFrame('inp', lazy_frame=True, hash='inp',
+                            callback=lambda name: np.arange(20.0).reshape(5, 4))
+    a = NumpyNullPreprocessor(directory, mmap_mode='r').preprocess(inp).data
+    b = NumpyNullPreprocessor(directory, mmap_mode='r').preprocess(inp).data
+    assert_true(isinstance(a, np.memmap))
+    assert_true(a is b)
+    chunks = list(NumpyNullPreprocessor(directory, mmap_mode='r')
+                  .preprocess(inp).iter_chunks(2))
+    assert_equal([c.shape[0] for c in chunks], [2, 2, 1])
+
+
+def test_numpy_null_preprocessors_of_different_stores():
+    inp = BrewPipeDataFrame('inp', lazy_frame=True, hash='shared',
+                            callback=lambda name: np.ones((2, 2)))
+    a = NumpyNullPreprocessor('artifacts_store_a', mmap_mode='r')
+    b = NumpyNullPreprocessor('artifacts_store_b', mmap_mode='r')
+    data_a = a.preprocess(inp).data
+    data_b = b.preprocess(inp).data
+    assert_true(data_a is not data_b)
+    assert_true(data_b.filename.startswith(
+        os.path.abspath('artifacts_store_b')))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import numpy as np
+from nose.tools import *
+from brewPipe.data import BrewPipeDataFrame
+from brewPipe.models.batching import BatchGenerator
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def _epoch(batches, n_batches):
+    return [next(batches) for _ in xrange(n_batches)]
+
+
+def test_sequential_batches():
+    x = np.arange(10).reshape(5, 2)
+    batches = BatchGenerator([x, np.arange(5)], 2, shuffle=False, prefetch=0)
+    epoch = _epoch(batches, 3)
+    assert_equal([len(b[0]) for b in epoch], [2, 2, 1])
+    assert_equal(list(np.concatenate([b[1] for b in epoch])), range(5))
+    assert_true(np.all(next(batches)[0] == x[:2]))
+
+
+def test_shuffled_epochs_visit_every_row():
+    y = np.arange(100)
+    frame = BrewPipeDataFrame('y')
+    frame.data = y
+    batches = BatchGenerator([y, frame], 16, seed=3)
+    first = np.concatenate([b[0] for b in _epoch(batches, 7)])
+    second = np.concatenate([b[1] for b in _epoch(batches, 7)])
+    batches.close()
+    assert_equal(sorted(first), range(100))
+    assert_equal(sorted(second), range(100))
+    assert_not_equal(list(first), list(second))
+
+    again = BatchGenerator([y], 16, seed=3)
+    assert_equal(list(np.concatenate([b[0] for b in _epoch(again, 7)])),
+                 list(first))
+    again.close()
+
+
+def test_start_resumes_the_batch_order():
+    y = np.arange(10)
+    for shuffle in [True, False]:
+        batches = BatchGenerator([y], 3, shuffle=shuffle, seed=5, prefetch=0)
+        expected = [b[0] for b in _epoch(batches, 11)]
+        for start in [0, 2, 4, 9]:
+            resumed = BatchGenerator([y], 3, shuffle=shuffle, seed=5,
+                                     start=start)
+            for b, e in zip(_epoch(resumed, 11 - start), expected[start:]):
+                assert_true(np.array_equal(b[0], e))
+            resumed.close()
+
+
+def test_memory_mapped_input():
+    x = np.arange(60, dtype=np.float64).reshape(20, 3)
+    np.save('batching.npy', x)
+    mapped = np.load('batching.npy', mmap_mode='r')
+    batches = BatchGenerator([mapped], 4, seed=1)
+    rows = np.concatenate([b[0] for b in _epoch(batches, 5)])
+    batches.close()
+    assert_equal(type(rows), np.ndarray)
+    assert_true(np.all(rows[np.argsort(rows[:, 0])] == x))
+
+
+def test_invalid_arguments():
+    assert_raises(RuntimeError, BatchGenerator, [np.zeros(3), np.zeros(4)], 1)
+    assert_raises(RuntimeError, BatchGenerator, [np.zeros(3)], 0)
+    assert_raises(RuntimeError, BatchGenerator, [np.zeros(3)], 1, start=-1)
+
+
+class _FailingArray(object):
+    shape = (10,)
+
+    def __getitem__(self, rows):
+        # only the first batch of rows can be read
+        if rows.start > 0:
+            raise IndexError("failing array")
+        return np.zeros(rows.stop - rows.start)
+
+
+def test_failures_are_raised_and_close_does_not_block():
+    batches = BatchGenerator([_FailingArray()], 5, shuffle=False, prefetch=1)
+    next(batches)
+    assert_raises(IndexError, next, batches)
+    # the producer is gone, later calls fail as well
+    assert_raises(IndexError, next, batches)
+    batches.close()
+
+    # the error can not be put into the full queue, nothing is consumed
+    batches = BatchGenerator([_FailingArray()], 5, shuffle=False, prefetch=1)
+    batches._start()
+    closing = threading.Thread(target=batches.close)
+    closing.daemon = True
+    closing.start()
+    closing.join(5)
+    assert_false(closing.is_alive())
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+from nose.tools import *
+from benchmarks.suite import run_suite, run_benchmark, BENCHMARKS
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def test_suite_runs_on_small_data():
+    workdir = tempfile.mkdtemp()
+    try:
+        config = {'rows': 60, 'morse_files': 3, 'format': 'npy',
+                  'workers': 1, 'tf_steps': 10, 'workdir': workdir,
+                  'winton_directory': os.path.join(workdir, 'winton'),
+                  'morse_directory': os.path.join(workdir, 'morse'),
+                  'intermediates': os.path.join(workdir, 'intermediates')}
+        results = run_suite(config)
+    finally:
+        shutil.rmtree(workdir)
+    assert_equal([r['name'] for r in results], [n for n, _ in BENCHMARKS])
+    for r in results:
+        assert_not_in('error', r)
+        if 'skipped' not in r:
+            assert_true(r['wall_time'] >= 0)
+            assert_in('peak_rss_delta', r)
+
+
+def _die(config, measure):
+    os._exit(3)
+
+
+def _hang(config, measure):
+    while True:
+        time.sleep(1)
+
+
+def test_dead_and_hanging_benchmarks_are_reported():
+    result = run_benchmark(_die, {'workdir': '.'})
+    assert_in('exit code 3', result['error'])
+    result = run_benchmark(_hang, {'workdir': '.', 'timeout': 1})
+    assert_in('timed out', result['error'])
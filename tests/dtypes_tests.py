@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from nose.tools import *
+import numpy as np
+from brewPipe.data import BrewPipeDataFrame
+from brewPipe.dtypes import DtypePolicy, set_dtype_policy, memory_usage
+from brewPipe.preprocess.numpy_null import NumpyNullPreprocessor
+from tests import winton
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def _winton(intermediate_format='npy'):
+    return winton('dtypes_im', intermediate_format)
+
+
+def test_policy():
+    policy = DtypePolicy(np.float32, {'weights': np.float64,
+                                      'winton##test##features': 'float64'})
+    assert_equal(policy.dtype(), np.float32)
+    assert_equal(policy.dtype('winton##train##weights'), np.float64)
+    assert_equal(policy.dtype('winton##test##features'), np.float64)
+    assert_equal(policy.dtype('winton##train##features'), np.float32)
+
+    assert_equal(policy.cast('x', np.zeros(3)).dtype, np.float32)
+    ints = np.zeros(3, dtype=np.int16)
+    assert_is(policy.cast('x', ints), ints)
+    floats = np.zeros(3, dtype=np.float32)
+    assert_is(policy.cast('x', floats), floats)
+    assert_raises(RuntimeError, DtypePolicy, np.int32)
+
+
+def test_winton_follows_policy():
+    former = set_dtype_policy(DtypePolicy(np.float32))
+    try:
+        w = _winton()
+        x32 = w.intraday_2_120()
+        weights32 = w.weights()
+        assert_equal(x32.data.dtype, np.float32)
+        assert_equal(w.columns('intraday_120_180', 'weights').data.dtype,
+                     np.float32)
+
+        set_dtype_policy(DtypePolicy(np.float32, {'weights': np.float64}))
+        for f in ['npy', 'hdf5']:
+            w = _winton(f)
+            weights = w.weights().data
+            assert_equal(weights.dtype, np.float64)
+            assert_equal(w.intraday_2_120().data.dtype, np.float32)
+            # the columns needing float64 are not rounded to float32
+            assert_equal(w._dfptr.dtype, np.float64)
+        x = w.intraday_2_120()
+        assert_equal(x.hash, x32.hash)
+        # only the hash of the frame of another dtype changes
+        assert_not_equal(w.weights().hash, weights32.hash)
+
+        set_dtype_policy(DtypePolicy(np.float64))
+        x64 = _winton().intraday_2_120()
+        assert_not_equal(x64.hash, x32.hash)
+        assert_equal(x64.data.dtype, np.float64)
+        assert_true(np.allclose(x64.data, x32.data, atol=1e-6))
+    finally:
+        set_dtype_policy(former)
+
+
+def test_preprocessor_and_memory_usage():
+    former = set_dtype_policy(DtypePolicy(np.float32, {'x64': np.float64}))
+    try:
+        preproc = NumpyNullPreprocessor('dtypes_preprocess', mmap_mode='r')
+        x = BrewPipeDataFrame('x', lazy_frame=True, hash='x',
+                              callback=lambda name: np.ones((10, 4)))
+        x64 = BrewPipeDataFrame('x64', lazy_frame=True, hash='x64',
+                                callback=lambda name: np.ones((10, 4)))
+        frames = [preproc.preprocess(x), preproc.preprocess(x64)]
+        assert_equal(frames[0].data.dtype, np.float32)
+        assert_equal(frames[1].data.dtype, np.float64)
+
+        usage = memory_usage(frames)
+        assert_equal(usage['frames']['x']['nbytes'], 160)
+        assert_equal(usage['frames']['x']['float64_nbytes'], 320)
+        assert_equal(usage['nbytes'], 160 + 320)
+        assert_equal(usage['saved'], 160)
+    finally:
+        set_dtype_policy(former)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+from nose.tools import *
+from brewPipe.pipelineState import Fingerprinter
+from brewPipe.pipelineState.fingerprint import BLOCK_SIZE, N_BLOCKS
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+_directory = 'fingerprint'
+
+
+def setup():
+    os.mkdir(_directory)
+
+
+def _write(name, content, mtime=1000000000):
+    filename = os.path.join(_directory, name)
+    with open(filename, 'wb') as f:
+        f.write(content)
+    os.utime(filename, (mtime, mtime))
+    return filename
+
+
+def test_content_hash_detects_copies_with_preserved_mtime():
+    fp = Fingerprinter()
+    # larger than the sampled blocks
+    size = BLOCK_SIZE * N_BLOCKS * 2
+    filename = _write('a.csv', 'x' * size)
+    meta = fp.file_digest(filename)
+    content = fp.file_digest(filename, content=True)
+    _write('a.csv', 'y' + 'x' * (size - 1))
+    assert_equal(fp.file_digest(filename), meta)
+    assert_not_equal(fp.file_digest(filename, content=True), content)
+
+
+def test_fingerprints_are_memoized_until_invalidated():
+    fp = Fingerprinter()
+    _write('b.wav', 'b')
+    first = fp.fingerprint_directory(_directory, suffix='.wav')
+    _write('c.wav', 'c')
+    assert_equal(fp.fingerprint_directory(_directory, suffix='.wav'), first)
+    fp.invalidate()
+    assert_not_equal(fp.fingerprint_directory(_directory, suffix='.wav'),
+                     first)
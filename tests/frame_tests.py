@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gc
+from nose.tools import *
+import numpy as np
+from brewPipe.data import BrewPipeDataFrame
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+class _Counter(object):
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, name):
+        self.calls += 1
+        return np.arange(10)
+
+
+def test_lazy_frame_is_memoized():
+    cb = _Counter()
+    f = BrewPipeDataFrame('a', lazy_frame=True, hash=1, callback=cb)
+    assert_equal(f.data.shape, (10,))
+    assert_equal(f.data.shape, (10,))
+    assert_equal(cb.calls, 1)
+    assert_equal(f.stats['hits'], 1)
+    assert_equal(f.stats['misses'], 1)
+
+
+def test_hash_change_and_invalidate_reevaluate():
+    cb = _Counter()
+    f = BrewPipeDataFrame('a', lazy_frame=True, hash=1, callback=cb)
+    f.data
+    f.hash = 2
+    f.data
+    assert_equal(cb.calls, 2)
+    f.invalidate()
+    f.data
+    assert_equal(cb.calls, 3)
+
+
+def test_release_and_weak_cache():
+    cb = _Counter()
+    f = BrewPipeDataFrame('a', lazy_frame=True, hash=1, callback=cb)
+    d = f.data
+    f.release()
+    assert_true(f.data is d)
+    del d
+    gc.collect()
+    f.data
+    assert_equal(cb.calls, 2)
+
+    w = BrewPipeDataFrame('b', lazy_frame=True, hash=1, callback=cb,
+                          weak_cache=True)
+    w.data
+    gc.collect()
+    w.data
+    assert_equal(cb.calls, 4)
+
+
+def test_schema_without_evaluation():
+    static = BrewPipeDataFrame('s')
+    static.data = np.zeros((3, 2), dtype=np.float32)
+    assert_equal(static.shape, (3, 2))
+    assert_equal(static.dtype, np.float32)
+    assert_equal(static.nbytes, 24)
+
+    cb = _Counter()
+    schema = {'shape': (10,), 'dtype': 'int64', 'nbytes': 80,
+              'columns': ['a'], 'hash': 1}
+    f = BrewPipeDataFrame('a', lazy_frame=True, hash=1, callback=cb,
+                          schema=schema)
+    assert_equal(f.shape, (10,))
+    assert_equal(f.columns, ['a'])
+    assert_equal(cb.calls, 0)
+    # the schema belongs to another hash, so the frame is evaluated
+    f.hash = 2
+    assert_equal(f.shape, (10,))
+    assert_equal(cb.calls, 1)
+    assert_equal(f.columns, None)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+from nose.tools import *
+from benchmarks.bench_import import measure_import
+from brewPipe import registry
+from brewPipe.lazy import LazyModule, module_available
+from brewPipe.models.numpy_leastsquares import NumpyLeastSquares
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def test_stage_modules_do_not_import_heavy_backends():
+    # the child runs in the temporary test directory
+    path = os.environ.get('PYTHONPATH')
+    os.environ['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))] +
+        ([path] if path else []))
+    try:
+        result = measure_import()
+    finally:
+        if path is None:
+            del os.environ['PYTHONPATH']
+        else:
+            os.environ['PYTHONPATH'] = path
+    assert_equal(result['loaded'], [])
+
+
+def test_lazy_module():
+    m = LazyModule('json')
+    assert_false(m.loaded)
+    assert_equal(m.loads('[1]'), [1])
+    assert_true(m.loaded)
+    missing = LazyModule('brewpipe_no_such_module')
+    assert_raises(ImportError, getattr, missing, 'x')
+    assert_false(module_available('brewpipe_no_such_module'))
+    assert_true(module_available('numpy'))
+
+
+def test_registry():
+    assert_in('numpy_leastsquares', registry.stage_names())
+    assert_is(registry.stage_class('numpy_leastsquares'), NumpyLeastSquares)
+    lsq = registry.create_stage('numpy_leastsquares', 3, 1)
+    assert_is_instance(lsq, NumpyLeastSquares)
+    assert_raises(RuntimeError, registry.stage_class, 'no_such_stage')
+    assert_raises(RuntimeError, registry.register_stage, 'x', 'no_colon')
+    assert_raises(RuntimeError, registry.register_stage, 'numpy_leastsquares',
+                  'brewPipe.models.numpy_mean_variance:RandomMeanVariance')
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from nose.tools import *
+import numpy as np
+from brewPipe.preprocess.interpolation import interpolate_rows
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def _reference(line):
+    line = line.copy()
+    nans = np.isnan(line)
+    line[nans] = np.interp(nans.nonzero()[0], (~nans).nonzero()[0],
+                           line[~nans])
+    return line
+
+
+def test_matches_numpy_interp():
+    rng = np.random.RandomState(1)
+    data = rng.normal(size=(100, 30))
+    data[rng.uniform(size=data.shape) < 0.3] = np.nan
+    data[:, 5] = 1.0
+    original = data.copy()
+    result = interpolate_rows(data, chunk_rows=7)
+    expected = np.array([_reference(line) for line in data])
+    assert_true(np.allclose(result, expected))
+    assert_true(np.array_equal(np.isnan(data), np.isnan(original)))
+
+
+def test_edge_policies():
+    data = np.array([[np.nan, 1.0, np.nan, 3.0, np.nan],
+                     [np.nan] * 5])
+    assert_true(np.allclose(interpolate_rows(data, edges='nearest'),
+                            [[1, 1, 2, 3, 3], [0] * 5]))
+    assert_true(np.allclose(interpolate_rows(data, edges='zero'),
+                            [[0, 1, 2, 3, 0], [0] * 5]))
+    result = interpolate_rows(data, edges='nan')
+    assert_true(np.allclose(result[0, 1:4], [1, 2, 3]))
+    assert_true(np.isnan(result[0, [0, 4]]).all())
+    assert_true(np.isnan(result[1]).all())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from nose.tools import *
+from numpy.testing import assert_allclose
+from brewPipe.data import BrewPipeDataFrame
+from brewPipe.models.numpy_leastsquares import NumpyLeastSquares
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def _frame(name, data):
+    f = BrewPipeDataFrame(name)
+    f.data = data
+    return f
+
+
+def _problem(n=500, d=7, k=3):
+    rs = np.random.RandomState(0)
+    x = rs.randn(n, d)
+    W = rs.randn(d, k)
+    b = rs.randn(k)
+    y = np.dot(x, W) + b + 1e-3 * rs.randn(n, k)
+    return x, y, W, b
+
+
+def test_solvers_agree():
+    x, y, W, b = _problem()
+    results = []
+    for kwargs in [{'solver': 'lstsq'}, {'solver': 'qr'},
+                   {'solver': 'normal'}, {'chunk_rows': 64}]:
+        lsq = NumpyLeastSquares(x.shape[1], y.shape[1], **kwargs)
+        lsq.set_data(_frame('x', x), _frame('y', y))
+        lsq.run()
+        assert_allclose(lsq._result_W, W, atol=1e-2)
+        assert_allclose(lsq._result_b, b, atol=1e-2)
+        results.append(lsq.apply_model(_frame('x', x), chunk_rows=100).data)
+    for r in results[1:]:
+        assert_allclose(r, results[0], atol=1e-8)
+
+
+def test_invalid_arguments():
+    assert_raises(RuntimeError, NumpyLeastSquares, 2, 1, solver='sgd')
+    lsq = NumpyLeastSquares(2, 1)
+    assert_raises(RuntimeError, lsq.run)
+    assert_raises(RuntimeError, lsq.set_data, _frame('x', np.zeros((3, 2))),
+                  _frame('y', np.zeros((2, 1))))
+
+
+def test_from_coefficients():
+    x, y, W, b = _problem()
+    model = NumpyLeastSquares.from_coefficients(W, b)
+    result = model.apply_model(_frame('x', x), chunk_rows=64)
+    # predicted in float32 by the default dtype policy
+    assert_equal(result.data.dtype, np.float32)
+    assert_allclose(result.data, np.dot(x, W) + b, rtol=1e-4, atol=1e-5)
+    assert_true(model.throughput > 0)
+
+
+def test_parameters_are_persisted():
+    x, y, W, b = _problem()
+
+    def lazy(name, data, h):
+        return BrewPipeDataFrame(name, lazy_frame=True, hash=h,
+                                 callback=lambda n: data)
+
+    lsq = NumpyLeastSquares(x.shape[1], y.shape[1])
+    lsq.set_data(lazy('x', x, 'hx'), lazy('y', y, 'hy'))
+    lsq.run()
+
+    # same hashes: the stored parameters are used, not the data
+    lsq = NumpyLeastSquares(x.shape[1], y.shape[1])
+    lsq.set_data(lazy('x', x, 'hx'), lazy('y', 2 * y, 'hy'))
+    lsq.run()
+    assert_allclose(lsq._result_W, W, atol=1e-2)
+
+    lsq = NumpyLeastSquares(x.shape[1], y.shape[1])
+    lsq.set_data(lazy('x', x, 'hx'), lazy('y', 2 * y, 'hy2'))
+    lsq.run()
+    assert_allclose(lsq._result_W, 2 * W, atol=1e-2)
+
+
+def test_rows_with_missing_values_are_ignored():
+    x, y, W, b = _problem()
+    y[::5, 1] = np.nan
+    x[::7, 0] = np.nan
+    for kwargs in [{'solver': 'qr'}, {'chunk_rows': 64}]:
+        lsq = NumpyLeastSquares(x.shape[1], y.shape[1], **kwargs)
+        lsq.set_data(_frame('x', x), _frame('y', y))
+        lsq.run()
+        assert_allclose(lsq._result_W, W, atol=1e-2)
+
+    # no complete row is left
+    x[:, 1] = np.nan
+    for kwargs in [{'solver': 'lstsq'}, {'solver': 'qr'},
+                   {'solver': 'normal'}, {'chunk_rows': 64}]:
+        lsq = NumpyLeastSquares(x.shape[1], y.shape[1], **kwargs)
+        lsq.set_data(_frame('x', x), _frame('y', y))
+        assert_raises(RuntimeError, lsq.run)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from nose.tools import *
+from numpy.testing import assert_allclose
+from brewPipe.data import BrewPipeDataFrame
+from brewPipe.models.numpy_mean_variance import RandomMeanVariance
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def _frame(data):
+    f = BrewPipeDataFrame('x')
+    f.data = data
+    return f
+
+
+def test_streaming_statistics():
+    rs = np.random.RandomState(0)
+    x = rs.normal(loc=[1., -2., 5.], scale=[1., 3., .5], size=(1000, 3))
+    x[::7, 1] = np.nan
+    rmv = RandomMeanVariance(3, chunk_rows=97)
+    rmv.set_data(_frame(x))
+    rmv.run()
+    assert_allclose(rmv._means, np.nanmean(x, axis=0))
+    assert_allclose(rmv._variances, np.nanvar(x, axis=0))
+
+
+def test_partial_fit_matches_single_chunk():
+    x = np.random.RandomState(1).rand(50, 4)
+    a = RandomMeanVariance(4)
+    a.partial_fit(x)
+    b = RandomMeanVariance(4)
+    for start in xrange(0, 50, 8):
+        b.partial_fit(x[start:start + 8])
+    assert_allclose(a._means, b._means)
+    assert_allclose(a._variances, b._variances)
+
+
+def test_seeded_sampling():
+    x = np.random.RandomState(2).normal(loc=[3., -1.], size=(500, 2))
+    samples = []
+    for _ in xrange(2):
+        rmv = RandomMeanVariance(2, seed=5)
+        rmv.set_data(_frame(x))
+        rmv.run()
+        samples.append(rmv.apply_model(20000).data)
+    assert_equal(samples[0].shape, (20000, 2))
+    assert_true(np.all(samples[0] == samples[1]))
+    assert_allclose(samples[0].mean(axis=0), x.mean(axis=0), atol=0.05)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+from nose.tools import *
+import numpy as np
+from scipy.io import wavfile
+from brewPipe.data.morse import MorseData
+from brewPipe.pipelineState import ArtifactStore
+from benchmarks.synthetic import make_morse_dataset
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+_data = 'morse_data'
+
+
+def setup():
+    make_morse_dataset(_data, 12)
+
+
+def test_parallel_load_keeps_order():
+    expected = [wavfile.read(os.path.join(_data, 'audio_fixed',
+                                          'cw%03i.wav' % i))[1]
+                for i in xrange(1, 13)]
+    for n_workers, executor in [(1, 'thread'), (3, 'thread'), (3, 'process')]:
+        m = MorseData(data_directory=_data,
+                      intermediate_directory='morse_%s%i' % (executor,
+                                                             n_workers),
+                      n_workers=n_workers, executor=executor)
+        assert_equal(list(m.ids().data), range(1, 13))
+        for data, e in zip(m.training().data, expected):
+            assert_true(np.array_equal(data, e))
+
+
+def test_clips_are_memory_mapped_views():
+    m = MorseData(data_directory=_data, intermediate_directory='morse_ragged')
+    m.training().data
+    clips = MorseData(data_directory=_data,
+                      intermediate_directory='morse_ragged').training().data
+    assert_equal(clips.shape, (12,))
+    assert_true(isinstance(clips.values, np.memmap))
+    assert_true(np.may_share_memory(clips[3], clips.values))
+    assert_true(np.array_equal(clips[2:5][1], clips[3]))
+    batch = clips.padded([0, 1])
+    assert_equal(batch.shape, (2, max(len(clips[0]), len(clips[1]))))
+
+
+def test_parts_survive_small_store_limit():
+    directory = 'morse_small_store'
+    ArtifactStore(directory).set_max_bytes(1000)
+    m = MorseData(data_directory=_data, intermediate_directory=directory)
+    assert_equal(m.training().data.shape, (12,))
+    assert_equal(list(m.ids().data), range(1, 13))
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gzip
+from nose.tools import *
+import numpy as np
+from brewPipe.data import BrewPipeDataFrame
+from brewPipe.output.winton import WintonStockDataOutput
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+def _expected(data):
+    lines = ["Id,Predicted"]
+    for i in xrange(data.shape[0]):
+        for j in xrange(data.shape[1]):
+            lines.append("%i_%i,%f" % (i+1, j+1, data[i,j]))
+    return '\n'.join(lines) + '\n'
+
+
+def test_write_plain_and_gzip():
+    frame = BrewPipeDataFrame('predictions')
+    frame.data = np.random.RandomState(0).normal(size=(25, 3))
+    for name, opener in [('out.csv', open), ('out.csv.gz', gzip.open)]:
+        filename = 'output_' + name
+        out = WintonStockDataOutput(filename, block_rows=10)
+        out.set_data(frame)
+        out.write()
+        with opener(filename) as f:
+            assert_equal(f.read(), _expected(frame.data))
+
+
+@raises(RuntimeError)
+def test_refuses_to_overwrite():
+    filename = 'output_exists.csv'
+    open(filename, 'w').close()
+    WintonStockDataOutput(filename)
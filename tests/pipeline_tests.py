@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+import numpy as np
+from nose.tools import *
+from brewPipe.brewPipe import Pipeline
+from brewPipe.data import BrewPipeDataFrame
+from brewPipe.pipelineState import PipelineState
+from brewPipe.pipelineState.state import Singleton
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def setup():
+    Singleton._instances.pop(PipelineState, None)
+
+
+def teardown():
+    Singleton._instances.pop(PipelineState, None)
+
+
+class _Stages(object):
+    def __init__(self, h=1):
+        self.h = h
+        self.calls = []
+
+    def source(self):
+        self.calls.append('source')
+        return BrewPipeDataFrame('source', lazy_frame=True, hash=self.h,
+                                 callback=lambda name: np.arange(4.))
+
+    def double(self, frame):
+        self.calls.append('double')
+        return frame.data * 2
+
+    def unused(self, frame):
+        self.calls.append('unused')
+
+    def write(self, result, scale=1):
+        self.calls.append('write')
+        return result.sum() * scale
+
+
+def _pipeline(stages, name='pipeline_tests'):
+    p = Pipeline(name)
+    src = p.add('source', stages.source)
+    double = p.add('double', stages.double, src)
+    p.add('unused', stages.unused, src)
+    out = p.add('write', stages.write, double, scale=2, skip_unchanged=True)
+    return p, out
+
+
+def test_only_needed_stages_run():
+    stages = _Stages()
+    p, out = _pipeline(stages, 'needed')
+    assert_equal(p.run(out), [24.])
+    assert_equal(stages.calls, ['source', 'double', 'write'])
+    assert_equal([n.name for n in p.dependencies(out)],
+                 ['source', 'double', 'write'])
+
+
+def test_unchanged_stages_are_skipped():
+    stages = _Stages()
+    p, out = _pipeline(stages, 'skip')
+    p.run(out)
+
+    stages = _Stages()
+    p, out = _pipeline(stages, 'skip')
+    assert_equal(p.run(out), [None])
+    assert_equal(p.skipped, set(['write']))
+    # only the source is evaluated to get the hash of the input data
+    assert_equal(stages.calls, ['source'])
+
+    stages = _Stages(h=2)
+    p, out = _pipeline(stages, 'skip')
+    assert_equal(p.run(out), [24.])
+    assert_equal(stages.calls, ['source', 'double', 'write'])
+
+
+def test_unhashed_sources_count_as_changed():
+    data = {'source': np.zeros(10000)}
+
+    def static_source():
+        frame = BrewPipeDataFrame('static')
+        frame.data = data['source']
+        return frame
+
+    for source, changes in [(static_source, [True, True]),
+                            (lambda: data['source'], [True, False])]:
+        calls = []
+        for i in xrange(3):
+            p = Pipeline('unhashed')
+            src = p.add('source', source)
+            out = p.add('out', lambda x: calls.append(i), src,
+                        skip_unchanged=True)
+            p.run(out)
+            if i == 0:
+                # changes only in the middle, invisible to repr
+                data['source'] = data['source'].copy()
+                data['source'][5000] = 1.0
+        assert_equal(calls[0], 0)
+        assert_equal([i in calls for i in (1, 2)], changes)
+        data['source'] = np.zeros(10000)
+
+
+def test_duplicate_and_foreign_stages():
+    p = Pipeline('invalid')
+    src = p.add('source', _Stages().source)
+    assert_raises(RuntimeError, p.add, 'source', _Stages().source)
+    other = Pipeline('other')
+    assert_raises(RuntimeError, other.add, 'double', _Stages().double, src)
+
+
+class _Concurrency(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def stage(self, value):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.2)
+        with self.lock:
+            self.running -= 1
+        return value
+
+
+def _square(frame):
+    return BrewPipeDataFrame('square', lazy_frame=True, hash=frame.hash,
+                             callback=lambda name: frame.data ** 2)
+
+
+def _fail(value):
+    raise ValueError(value)
+
+
+def _exit_worker():
+    os._exit(1)
+
+
+def _unpicklable_result():
+    return threading.Lock()
+
+
+def _branches(workers, **kwargs):
+    c = _Concurrency()
+    p = Pipeline('parallel', workers=workers, **kwargs)
+    a = p.add('a', c.stage, 1, memory=100)
+    b = p.add('b', c.stage, 2, memory=100)
+    out = p.add('sum', lambda x, y: x + y, a, b)
+    return c, p, out
+
+
+def test_independent_stages_run_concurrently():
+    c, p, out = _branches(2)
+    assert_equal(p.run(out), [3])
+    assert_equal(c.max_running, 2)
+
+    c, p, out = _branches(1)
+    assert_equal(p.run(out), [3])
+    assert_equal(c.max_running, 1)
+
+
+def test_memory_throttling():
+    c, p, out = _branches(2, max_memory=150)
+    assert_equal(p.run(out), [3])
+    assert_equal(c.max_running, 1)
+
+
+def test_process_executor():
+    p = Pipeline('process', workers=2)
+    src = p.add('source', _Stages().source)
+    square = p.add('square', _square, src, executor='process')
+    result, = p.run(square)
+    assert_equal(list(result.data), [0., 1., 4., 9.])
+    assert_equal(result.hash, 1)
+    assert_equal(p.get('process##square##nbytes'), 32)
+
+    fail = p.add('fail', _fail, 'stage failed', executor='process')
+    assert_raises(ValueError, p.run, fail)
+    assert_raises(RuntimeError, p.add, 'invalid', _fail, 1, executor='gpu')
+
+
+def test_process_executor_failures_are_raised():
+    p = Pipeline('process_failures', workers=2)
+    # lambdas can not be sent to a process
+    assert_raises(RuntimeError, p.add, 'lambda', lambda: 1, executor='process')
+    assert_raises(RuntimeError, p.add, 'arg', _fail, threading.Lock(),
+                  executor='process')
+
+    died = p.add('died', _exit_worker, executor='process')
+    assert_raises(RuntimeError, p.run, died)
+
+    p = Pipeline('process_failures', workers=2)
+    result = p.add('result', _unpicklable_result, executor='process')
+    assert_raises(Exception, p.run, result)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import cPickle as pickle
+import os
+import warnings
+from nose.tools import *
+from brewPipe.pipelineState import PipelineState, AppendLogBackend
+from brewPipe.pipelineState.state import Singleton
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+def teardown():
+    Singleton._instances.pop(PipelineState, None)
+
+
+def _new_state(name, **kwargs):
+    Singleton._instances.pop(PipelineState, None)
+    return PipelineState('state_' + name, **kwargs)
+
+
+def test_log_roundtrip_and_delete():
+    ps = _new_state('roundtrip')
+    ps['a'] = 1
+    ps['b'] = 2
+    del ps['a']
+    ps = _new_state('roundtrip')
+    assert_false('a' in ps)
+    assert_equal(ps['b'], 2)
+
+
+def test_transaction_writes_once():
+    filename = 'state_transaction'
+    backend = AppendLogBackend(filename)
+    ps = _new_state('transaction', backend=backend)
+    with ps.transaction():
+        ps['a'] = 1
+        ps['b'] = 2
+        assert_false(os.path.exists(filename))
+    assert_equal(_new_state('transaction')['b'], 2)
+
+
+def test_compaction_and_truncated_record():
+    filename = 'state_compaction'
+    backend = AppendLogBackend(filename, compact_ratio=2,
+                               compact_min_records=10)
+    ps = _new_state('compaction', backend=backend)
+    for i in xrange(100):
+        ps['a'] = i
+    with open(filename, 'rb') as f:
+        n_records = 0
+        try:
+            while True:
+                pickle.load(f)
+                n_records += 1
+        except EOFError:
+            pass
+    assert_true(n_records <= 11)
+
+    with open(filename, 'ab') as f:
+        f.write(pickle.dumps(('set', 'b', 1), 2)[:-3])
+    ps = _new_state('compaction')
+    assert_equal(ps['a'], 99)
+    assert_false('b' in ps)
+    ps['c'] = 3
+    assert_equal(_new_state('compaction')['c'], 3)
+
+
+class _Unknown(object):
+    pass
+
+
+def test_undecodable_record_is_kept():
+    filename = 'state_undecodable'
+    ps = _new_state('undecodable')
+    ps['a'] = 1
+    # a record of a class, which the reading process does not know
+    record = pickle.dumps(('set', 'b', _Unknown()), 2)
+    record = record.replace('state_tests', 'no_such_module')
+    with open(filename, 'ab') as f:
+        f.write(record)
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter('always')
+        ps['c'] = 3
+        ps = _new_state('undecodable')
+        ps['d'] = 4
+        ps = _new_state('undecodable')
+    assert_true(w)
+    assert_equal((ps['a'], ps['c'], ps['d']), (1, 3, 4))
+    assert_false('b' in ps)
+    with open(filename, 'rb') as f:
+        assert_in(record, f.read())
+
+    # garbage in the middle of the log is not overwritten
+    with open(filename, 'ab') as f:
+        f.write('\xff' * 8)
+    size = os.path.getsize(filename)
+    with open(filename, 'ab') as f:
+        f.write(pickle.dumps(('set', 'e', 5), 2))
+    with warnings.catch_warnings(record=True):
+        warnings.simplefilter('always')
+        assert_raises(RuntimeError, _new_state, 'undecodable')
+    backend = AppendLogBackend(filename)
+    backend._offset = size - 8
+    assert_raises(RuntimeError, backend.write, [('set', 'f', 6)], {})
+    assert_true(os.path.getsize(filename) > size)
+
+
+def test_reads_legacy_pickle():
+    filename = 'state_legacy'
+    with open(filename, 'w') as f:
+        pickle.dump({'x': 'y'}, f)
+    assert_equal(_new_state('legacy')['x'], 'y')
+
+
+def _increment_in_child(filename, n):
+    Singleton._instances.pop(PipelineState, None)
+    ps = PipelineState(filename)
+    for i in xrange(n):
+        ps.update('counter', lambda v: (v or 0) + 1)
+        ps['child%d' % os.getpid()] = i
+
+
+def test_processes_do_not_lose_entries():
+    import multiprocessing
+    filename = 'state_processes'
+    procs = [multiprocessing.Process(target=_increment_in_child,
+                                     args=(filename, 50))
+             for _ in xrange(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    ps = _new_state('processes')
+    assert_equal(ps['counter'], 200)
+    for p in procs:
+        assert_equal(ps['child%d' % p.pid], 49)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from nose.plugins.skip import SkipTest
+from nose.tools import *
+from numpy.testing import assert_allclose
+from brewPipe.data import BrewPipeDataFrame, frame_schema
+from brewPipe.lazy import module_available
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def setup():
+    if not module_available('tensorflow'):
+        raise SkipTest("tensorflow is not installed")
+
+
+def _model(directory, **kwargs):
+    from brewPipe.models.tf_leastsquares import TensorflowLeastSquares
+    kwargs.setdefault('batch_size', 7)
+    kwargs.setdefault('seed', 3)
+    kwargs.setdefault('checkpoint_interval', 10)
+    return TensorflowLeastSquares(3, 2, intermediate_directory=directory,
+                                  **kwargs)
+
+
+def _data():
+    rs = np.random.RandomState(0)
+    x = rs.randn(50, 3)
+    y = np.dot(x, rs.randn(3, 2))
+    frames = []
+    for name, data in [('x', x), ('y', y)]:
+        f = BrewPipeDataFrame(name, lazy_frame=True, hash=name,
+                              callback=lambda name, data=data: data)
+        frames.append(f)
+    return frames
+
+
+def _record_batches(model, fail_at=None):
+    """
+    :return: list, the batches fed to the model are appended to.
+        With `fail_at` the training is interrupted at that step.
+    """
+    batches = []
+    generate = model._generate_batch
+
+    def recording():
+        if len(batches) == fail_at:
+            raise RuntimeError("interrupted")
+        batches.append(generate())
+        return batches[-1]
+    model._generate_batch = recording
+    return batches
+
+
+def test_set_data_does_not_load():
+    loaded = []
+    x = BrewPipeDataFrame('x', lazy_frame=True, hash='x',
+                          schema=frame_schema(np.zeros((4, 3)), 'x'),
+                          callback=lambda name: loaded.append(name))
+    y = BrewPipeDataFrame('y', lazy_frame=True, hash='y',
+                          schema=frame_schema(np.zeros((4, 2)), 'y'),
+                          callback=lambda name: loaded.append(name))
+    model = _model('tf_lazy')
+    model.set_data(x, y)
+    assert_equal(loaded, [])
+
+
+def test_resumed_training_continues_the_batch_order():
+    uninterrupted = _model('tf_full')
+    uninterrupted.set_data(*_data())
+    expected = _record_batches(uninterrupted)
+    uninterrupted.run(max_steps=30)
+    assert_equal(len(expected), 30)
+
+    for seed in [3, None]:
+        directory = 'tf_resume_%s' % seed
+        interrupted = _model(directory, seed=seed)
+        interrupted.set_data(*_data())
+        _record_batches(interrupted, fail_at=15)
+        assert_raises(RuntimeError, interrupted.run, max_steps=30)
+        interrupted._batches.close()
+
+        resumed = _model(directory, seed=seed)
+        resumed.set_data(*_data())
+        batches = _record_batches(resumed)
+        resumed.run(max_steps=30)
+        # resumed after the checkpoint of step 10
+        assert_equal(len(batches), 19)
+        if seed is not None:
+            for b, e in zip(batches, expected[11:]):
+                assert_allclose(b[0], e[0])
+                assert_allclose(b[1], e[1])
+
+        cached = _model(directory, seed=seed)
+        cached.set_data(*_data())
+        trained = _record_batches(cached)
+        cached.run(max_steps=30)
+        assert_equal(trained, [])
+        assert_allclose(cached._result_W, resumed._result_W)
+        assert_allclose(cached._result_b, resumed._result_b)
+
+
+def test_batched_apply_model_keeps_its_session():
+    model = _model('tf_apply')
+    rs = np.random.RandomState(1)
+    model._result_W = rs.randn(3, 2).astype(model._dtype)
+    model._result_b = rs.randn(2).astype(model._dtype)
+    x = BrewPipeDataFrame('x')
+    x.data = rs.randn(20, 3)
+    expected = np.dot(x.data, model._result_W) + model._result_b
+    assert_allclose(model.apply_model(x, batch_size=6).data, expected,
+                    rtol=1e-4, atol=1e-4)
+    session = model._session
+    assert_allclose(model.apply_model(x).data, expected, rtol=1e-4, atol=1e-4)
+    assert_is(model._session, session)
+    model.close()
+    assert_is(model._session, None)
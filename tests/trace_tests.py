@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import numpy as np
+from nose.tools import *
+from brewPipe.data import BrewPipeDataFrame
+from brewPipe.models.numpy_mean_variance import RandomMeanVariance
+from brewPipe.trace import get_tracer
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def setup():
+    get_tracer().clear()
+    get_tracer().enable(log_file='trace.log')
+
+
+def teardown():
+    get_tracer().disable()
+    get_tracer().clear()
+
+
+def test_stage_and_frame_spans():
+    x = BrewPipeDataFrame('traced', lazy_frame=True, hash=1,
+                          callback=lambda name: np.ones((100, 3)))
+    rmv = RandomMeanVariance(3)
+    rmv.set_data(x)
+    rmv.run()
+    x.data
+
+    events = get_tracer().events
+    names = [e['name'] for e in events]
+    assert_in('RandomMeanVariance.run', names)
+    frame = [e for e in events if e['name'] == 'traced']
+    assert_equal([e['args']['cache'] for e in frame][:2], ['miss', 'hit'])
+    run = [e for e in events if e['name'] == 'RandomMeanVariance.run'][0]
+    for k in ('cpu_time', 'bytes_read', 'bytes_written', 'peak_rss_delta'):
+        assert_in(k, run['args'])
+    assert_equal(get_tracer().summary()['RandomMeanVariance.run']['calls'], 1)
+
+    with open('trace.log') as f:
+        logged = [json.loads(line) for line in f]
+    assert_equal(len(logged), len(events))
+
+    get_tracer().export_chrome_trace('trace.json')
+    with open('trace.json') as f:
+        trace = json.load(f)['traceEvents']
+    assert_equal(set(e['ph'] for e in trace), set(['X', 'i']))
+    assert_true(all(e['dur'] >= 0 for e in trace if e['ph'] == 'X'))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+from nose.tools import *
+import numpy as np
+from tests import winton, winton_csv
+
+__author__ = 'Dominik Meyer <meyerd@mytum.de>'
+
+
+def _winton(intermediate_format):
+    return winton('winton_im', intermediate_format)
+
+
+def test_intermediate_formats_agree():
+    reference = None
+    for f in ['hdf5', 'hdf5_blosc', 'npy']:
+        for _ in xrange(2):
+            w = _winton(f)
+            result = [w.features().data, w.intraday_2_120().data,
+                      w.intraday_120_180().data, w.returns_next_days().data,
+                      w.weights().data]
+            assert_equal(result[1].shape, (50, 119))
+            assert_false(np.isnan(result[1]).any())
+            if reference is None:
+                reference = result
+            for r, e in zip(result, reference):
+                assert_true(np.allclose(r, e, equal_nan=True))
+
+
+def test_chunked_loading_and_iter_rows():
+    reference = _winton('hdf5').intraday_2_120().data
+    for f in ['hdf5_blosc', 'npy']:
+        w = winton('winton_chunked', f, chunksize=7)
+        assert_true(np.allclose(w.intraday_2_120().data, reference))
+
+    w = winton('winton_stream')
+    blocks = list(w.iter_rows(chunksize=20))
+    assert_equal([len(b) for b in blocks], [20, 20, 10])
+    persisted = list(w.iter_rows(chunksize=20))
+    assert_equal(blocks[0].dtype, persisted[0].dtype)
+    for f in ['hdf5', 'npy']:
+        w = winton('winton_dtype_' + f, f)
+        parsed = list(w.iter_rows(chunksize=20))
+        assert_equal(parsed[0].dtype, next(w.iter_rows(chunksize=20)).dtype)
+    assert_true(np.allclose(np.vstack(blocks), np.vstack(persisted),
+                            equal_nan=True))
+
+
+def test_chunked_loading_with_miscounted_lines():
+    data = winton_csv('winton_blank_lines', 30)
+    with open(os.path.join(data, 'train.csv'), 'ab') as f:
+        f.write('\n\n\n')
+    reference = winton(os.path.join(data, 'a'), 'hdf5', data_directory=data)
+    reference = reference.intraday_120_180().data
+    for _ in xrange(2):
+        w = winton(os.path.join(data, 'b'), data_directory=data, chunksize=7)
+        result = w.intraday_120_180().data
+        assert_equal(result.shape, (30, 60))
+        assert_true(np.allclose(result, reference, equal_nan=True))
+    assert_equal(len(os.listdir(os.path.join(data, 'b', 'tmp'))), 0)
+
+
+def test_column_views_and_groups():
+    for f in ['hdf5', 'npy']:
+        w = _winton(f)
+        y1 = w.intraday_120_180().data
+        y2 = w.returns_next_days().data
+        # views into the block of all columns, not copies
+        assert_false(y1.flags.owndata)
+        assert_true(y1.flags.f_contiguous)
+
+        combined = w.columns('intraday_120_180', 'returns_next_days').data
+        assert_false(combined.flags.owndata)
+        assert_true(np.allclose(combined, np.hstack([y1, y2]), equal_nan=True))
+
+        combined = w.columns('returns_next_days', 'intraday_2_120').data
+        assert_equal(combined.shape, (50, 121))
+        assert_true(np.allclose(combined[:, 2:], w.intraday_2_120().data))
+        assert_raises(RuntimeError, w.columns, 'unknown')
+
+
+def test_schema_is_recorded():
+    w = _winton('npy')
+    x = w.intraday_2_120()
+    data = x.data
+    x = _winton('npy').intraday_2_120()
+    assert_equal(x.shape, data.shape)
+    # the default dtype policy
+    assert_equal(x.dtype, np.float32)
+    assert_equal(len(x.columns), 119)
+    assert_equal(x.stats['misses'], 0)
+
+
+def test_columns_on_first_access():
+    # a new file, so no schema is recorded for it yet
+    data = winton_csv('winton_first_access', 20)
+    w = winton(os.path.join(data, 'im'), data_directory=data)
+    x = w.intraday_120_180()
+    assert_equal(x.schema, None)
+    assert_equal(len(x.columns), 60)
+    assert_equal(len(x.columns), 60)